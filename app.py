@@ -3,12 +3,31 @@ A Flask web application for predicting Construction Costs based on input data.
 This application provides a web interface and endpoints for users
 to submit data and receive predictions.
 """
-from flask import Flask,request,render_template
-import dill
-import numpy as np
-import pandas as pd
+import json
+import time
+from flask import Flask,request,render_template,g
+from src.pipeline.request_parser import RequestValidationError
+from src.pipeline.metrics import REGISTRY,CONTENT_TYPE
+from src.pipeline.predict_pipeline import (MAX_BATCH_SIZE,INSTRUMENTED_ENDPOINTS,
+                                           inference_service,record_request,collect_stats,
+                                           stage_timer,process_and_predict,parse_batch_body,
+                                           parse_batch_file,process_batch)
 
 app=Flask('__name__')
+
+@app.before_request
+def start_request_timer():
+    """Record the arrival time of the request."""
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the prediction requests by status and record their latency."""
+    if request.path in INSTRUMENTED_ENDPOINTS:
+        record_request(request.path,request.method,response.status_code,
+                       time.perf_counter() - g.request_start)
+    return response
+
 @app.route('/')
 def read_main():
     """Render the main index page."""
@@ -22,59 +41,78 @@ def generate_output():
     returns a prediction for PCOS.
 
     Returns:
-        dict: A dictionary containing the prediction result.
+        Response: The JSON prediction result, or the validation errors with a 400 status.
     """
     json_data = False
     input_data = request.args.get('data')
     if input_data is None:
-        input_data = request.get_json()
+        input_data = request.get_json(silent=True)
         json_data = True
-    pcos = process_and_predict(input_text=input_data,json_data=json_data)
-    return {'predicted':pcos}
+    try:
+        pcos = process_and_predict(input_text=input_data,json_data=json_data)
+    except RequestValidationError as e:
+        return e.to_dict(),400
+    return json_response({'predicted':pcos})
 
-def process_and_predict(input_text,json_data):
+@app.route('/predict/stats',methods=['GET'])
+def generate_stats():
+    """Report the micro-batching and prediction cache statistics of the single-row endpoint.
+
+    Returns:
+        dict: The batch-size distribution, queueing-delay statistics and cache counters.
     """
-    Process input text and make a prediction.
+    return collect_stats()
+
+@app.route('/predict/batch',methods=['POST'])
+def generate_batch_output():
+    """Generate predictions for a whole batch of rows in one pass.
+
+    The batch is either a JSON body of the form {"data": [[...], [...]]} with one list of
+    input values per row, or a CSV file uploaded as the `file` form field whose header
+    contains the input columns.
+
+    Returns:
+        Response: The JSON predictions, one per input row in input order.
+    """
+    try:
+        if 'file' in request.files:
+            batch = parse_batch_file(request.files['file'])
+        else:
+            batch = parse_batch_body(request.get_json(silent=True))
+        if batch.n_rows > MAX_BATCH_SIZE:
+            return {'error':f"Batch of {batch.n_rows} rows exceeds the maximum of "
+                             f"{MAX_BATCH_SIZE}."},413
+        prices = process_batch(batch)
+    except RequestValidationError as e:
+        return e.to_dict(),400
+    except ValueError as e:
+        return {'error':str(e)},400
+    return json_response({'predicted':prices,'count':len(prices)})
+
+@app.route('/metrics',methods=['GET'])
+def generate_metrics():
+    """Expose the request counters, stage latencies and batch sizes in the Prometheus format.
+
+    Returns:
+        Response: The metrics in the Prometheus text format.
+    """
+    return app.response_class(REGISTRY.render(),content_type=CONTENT_TYPE)
+
+def json_response(payload,status=200):
+    """
+    Serialize a response body, timing the serialization.
 
     Args:
-        input_text (str or dict): The input data for prediction.
-        json_data (bool): Flag indicating if the input is in JSON format.
+        payload (dict): The body.
+        status (int): The HTTP status.
 
     Returns:
-        str: Construction cost
+        Response: The JSON response.
     """
-    input_columns = [
-    'Commodity Code','Item Description','Qty','PE Amount','BM Amount',
-    'LB hrs','LB Amount','CE Amount','Major SC Amount','Fuel usage (L)',
-    'Attribute 1','Attribute 2','Attribute 3','project_number','total_new',
-    'Single Unit Price','epic_embodied_carbon','aus_lci_embodied_carbon',
-    'carbon_allowance','construction_carbon','Default PE Unit Price',
-    'Default BM Unit Price','Default LB Unit Hrs','Default SC Unit Rate',
-    'Project Name','Greenfield/ Brownfield','Client','Market Sector/Industry',
-    'Latitude','Longitude','Delivery Method','Item Type','Flag','coordinates',
-    'state','city','suburb'
-]
-    categorical_columns = ['Commodity Code', 'Item Description', 'Project Name',
-                                    'Greenfield/ Brownfield', 'Client', 'Market Sector/Industry', 
-                                    'Delivery Method', 'Item Type', 'coordinates', 'state', 'city', 
-                                    'suburb']
-    if json_data is True:
-        output_text = [item for item in input_text['data']]
-    else:
-        output_text = [item for item in input_text.split(',')]
-    input_dict = {}
-    for i in range(len(input_columns)):
-        input_dict[input_columns[i]] = output_text[i]
-    with open('src/models/categorical_encoder.pkl', 'rb') as p:
-        preprocessor = dill.load(p)
-    df = pd.DataFrame([input_dict])
-    df[categorical_columns] = preprocessor.transform(df[categorical_columns])
-    input_array = np.array(df)
-    with open(r'src/models/best_model.pkl', 'rb') as m:
-        model = dill.load(m)
-    input_array = input_array.reshape(1,-1)
-    prices = model.predict(input_array)
-    prices = prices.tolist()
-    return str(prices[0])
+    with stage_timer('serialize'):
+        body = json.dumps(payload)
+    return app.response_class(body,status=status,mimetype='application/json')
+
 if __name__=='__main__':
+    inference_service.load()
     app.run(host='0.0.0.0',port=5000)
\ No newline at end of file
@@ -0,0 +1 @@
+"""Benchmark suite of the serving and training paths (see `benchmarks.run_benchmarks`)."""
@@ -0,0 +1,192 @@
+"""
+This module holds the shared parts of the benchmark suite: the configuration, the result \
+    format, latency summaries, peak memory measurement, process isolation and the comparison \
+        against a stored baseline.
+
+Every result is a flat dictionary of named measurements. Each measurement has a value, a \
+    unit and a direction ('lower' or 'higher' is better), so two result files can be compared \
+        metric by metric without knowing what produced them.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import multiprocessing
+from dataclasses import dataclass, field, asdict
+import numpy as np
+
+@dataclass
+class BenchmarkConfig(): # pylint: disable=R0902
+    """
+    Configuration class for the benchmark suite.
+
+    Attributes:
+        data_path (str): The bundled dataset the benchmarks replay.
+        single_row_requests (int): Number of sequential single-row requests timed.
+        concurrent_requests (int): Number of single-row requests sent by concurrent clients.
+        concurrency (int): Number of concurrent clients.
+        batch_sizes (list): Batch sizes whose throughput is measured.
+        min_batch_time_s (float): Minimum time spent scoring each batch size.
+        cold_start_runs (int): Number of fresh processes started to time the cold start.
+        models (list): Models whose search is timed, or None for every candidate model.
+        search_strategy (str): Search strategy of the training benchmark.
+        search_n_iter (int): Candidates sampled per model by the sampling strategies.
+        warmup_requests (int): Untimed requests sent before the latency measurements.
+    """
+    data_path:str = os.path.join('notebooks','cleaned_data.csv')
+    single_row_requests:int = 500
+    concurrent_requests:int = 500
+    concurrency:int = 8
+    batch_sizes:list = field(default_factory=lambda: [1,10,100,1000,10000])
+    min_batch_time_s:float = 0.5
+    cold_start_runs:int = 3
+    models:list = None
+    search_strategy:str = 'random'
+    search_n_iter:int = 6
+    warmup_requests:int = 20
+
+def measurement(value,unit,better='lower'):
+    """
+    Builds one measurement of a result.
+
+    Args:
+        value (float): The measured value.
+        unit (str): Its unit.
+        better (str): 'lower' or 'higher', the direction of an improvement.
+
+    Returns:
+        dict: The measurement.
+    """
+    return {'value':float(value),'unit':unit,'better':better}
+
+def latency_summary(prefix,latencies_s):
+    """
+    Summarizes a list of latencies into percentile measurements in milliseconds.
+
+    Args:
+        prefix (str): Name prefix of the measurements.
+        latencies_s (list): The latencies in seconds.
+
+    Returns:
+        dict: The p50, p90, p99 and mean latencies (the maximum is too noisy to compare).
+    """
+    latencies_ms = np.asarray(latencies_s)*1000
+    summary = {f"{prefix}.p{q}_ms":measurement(np.percentile(latencies_ms,q),'ms')
+               for q in (50,90,99)}
+    summary[f"{prefix}.mean_ms"] = measurement(latencies_ms.mean(),'ms')
+    return summary
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process.
+
+    Returns:
+        float: The peak RSS in MiB, or NaN where `resource` is not available.
+    """
+    try:
+        import resource # pylint: disable=C0415
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak/1024**2 if sys.platform == 'darwin' else peak/1024
+
+def _isolated_call(function,args):
+    """Runs a benchmark function and appends the peak RSS of the worker process."""
+    return function(*args),peak_rss_mb()
+
+def run_isolated(function,*args):
+    """
+    Runs a benchmark function in a fresh process, so that its imports, caches and peak \
+        memory are not shared with the other benchmarks.
+
+    Args:
+        function (callable): A module-level function returning a dictionary of measurements.
+        *args: Its arguments.
+
+    Returns:
+        tuple: The result of the function and the peak RSS of its process in MiB.
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1,maxtasksperchild=1) as pool:
+        return pool.apply(_isolated_call,(function,args))
+
+def environment():
+    """
+    Describes the machine and the code the results were measured on.
+
+    Returns:
+        dict: The platform, Python version, CPU count and git commit.
+    """
+    try:
+        commit = subprocess.run(['git','rev-parse','--short','HEAD'],capture_output=True,
+                                text=True,check=True,timeout=10).stdout.strip()
+    except (OSError,subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'platform':platform.platform(),
+        'python':platform.python_version(),
+        'cpu_count':os.cpu_count(),
+        'git_commit':commit
+    }
+
+def save_results(filepath,results):
+    """
+    Saves benchmark results as JSON.
+
+    Args:
+        filepath (str): The file to write.
+        results (dict): The results built by the runner.
+    """
+    dirpath = os.path.dirname(filepath)
+    if dirpath:
+        os.makedirs(dirpath,exist_ok=True)
+    with open(filepath,'w',encoding='utf-8') as f:
+        json.dump(results,f,indent=4)
+
+def load_results(filepath):
+    """
+    Loads benchmark results saved with `save_results`.
+
+    Args:
+        filepath (str): The saved results.
+
+    Returns:
+        dict: The results.
+    """
+    with open(filepath,'r',encoding='utf-8') as f:
+        return json.load(f)
+
+def compare_results(current,baseline,threshold):
+    """
+    Compares every measurement present in both results.
+
+    Args:
+        current (dict): The new results.
+        baseline (dict): The stored baseline.
+        threshold (float): Relative change in the wrong direction above which a \
+            measurement is a regression (0.2 means 20% worse).
+
+    Returns:
+        list: One dictionary per common measurement with the baseline and current values, \
+            the relative change and whether it regressed, worst change first.
+    """
+    rows = []
+    for name,entry in current['metrics'].items():
+        base = baseline['metrics'].get(name)
+        if base is None or not np.isfinite(base['value']) or not np.isfinite(entry['value']) \
+                or base['value'] == 0:
+            continue
+        change = (entry['value'] - base['value'])/abs(base['value'])
+        worse = change if entry['better'] == 'lower' else -change
+        rows.append({'metric':name,'unit':entry['unit'],'baseline':base['value'],
+                     'current':entry['value'],'change':change,'regression':worse > threshold,
+                     'worse_by':worse})
+    return sorted(rows,key=lambda row: -row['worse_by'])
+
+def config_dict(config):
+    """Returns the configuration as a JSON-serializable dictionary."""
+    return asdict(config)
@@ -0,0 +1,105 @@
+"""
+This module runs the benchmark suite and compares the results against a stored baseline.
+
+Run it from the repository root with `python -m benchmarks.run_benchmarks`. The results \
+    are written as JSON (by default to `artifacts/benchmarks/results.json`). When a baseline \
+        exists (by default `benchmarks/baseline.json`), every common measurement is compared \
+            with it and the command exits with status 1 if one is worse by more than the \
+                threshold. `--update-baseline` stores the new results as the baseline.
+"""
+import os
+import sys
+import argparse
+from benchmarks.harness import (BenchmarkConfig,measurement,run_isolated,environment,
+                                save_results,load_results,compare_results,config_dict)
+from benchmarks.serving import benchmark_serving,benchmark_cold_start
+from benchmarks.training import benchmark_model_search,metric_name
+from src.components.model_trainer import candidate_models
+
+DEFAULT_OUTPUT = os.path.join('artifacts','benchmarks','results.json')
+DEFAULT_BASELINE = os.path.join('benchmarks','baseline.json')
+QUICK_CONFIG = {'single_row_requests':100,'concurrent_requests':100,
+                'batch_sizes':[1,100,1000],'min_batch_time_s':0.2,'cold_start_runs':1,
+                'search_n_iter':2}
+
+def run_serving(config,metrics):
+    """Runs the serving benchmarks in a fresh process and adds their measurements."""
+    print("Benchmarking the serving path...",flush=True)
+    results,rss = run_isolated(benchmark_serving,config)
+    metrics.update(results)
+    metrics['serving.peak_rss_mb'] = measurement(rss,'MiB')
+    print("Benchmarking the cold start...",flush=True)
+    metrics.update(benchmark_cold_start(config))
+
+def run_training(config,metrics):
+    """Runs the search of every selected model in its own fresh process."""
+    total = 0.0
+    for model_name in config.models or list(candidate_models()):
+        print(f"Benchmarking the search of {model_name}...",flush=True)
+        results,rss = run_isolated(benchmark_model_search,model_name,config)
+        metrics.update(results)
+        metrics[f"training.{metric_name(model_name)}.peak_rss_mb"] = measurement(rss,'MiB')
+        total += results[f"training.{metric_name(model_name)}.search_s"]['value']
+    metrics['training.total_search_s'] = measurement(total,'s')
+
+def print_comparison(rows,threshold):
+    """Prints the comparison table, worst change first."""
+    print(f"\n{'metric':<48}{'baseline':>14}{'current':>14}{'change':>10}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['metric']:<48}{row['baseline']:>14.4g}{row['current']:>14.4g}"
+              f"{row['change']:>+10.1%}{flag}")
+    regressions = sum(row['regression'] for row in rows)
+    print(f"\n{regressions} of {len(rows)} measurements regressed by more than {threshold:.0%}.")
+
+def parse_args(argv):
+    """Parses the command-line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite',choices=['serving','training','all'],default='all')
+    parser.add_argument('--output',default=DEFAULT_OUTPUT,help='Results file to write.')
+    parser.add_argument('--baseline',default=DEFAULT_BASELINE,help='Baseline to compare with.')
+    parser.add_argument('--threshold',type=float,
+                        default=float(os.environ.get('BENCHMARK_THRESHOLD','0.2')),
+                        help='Relative change counted as a regression (default 0.2).')
+    parser.add_argument('--models',nargs='+',help='Models of the training benchmark.')
+    parser.add_argument('--quick',action='store_true',help='Fewer requests and candidates.')
+    parser.add_argument('--update-baseline',action='store_true',
+                        help='Store the results as the new baseline.')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Command-line entry point of the benchmark suite.
+
+    Returns:
+        int: 1 if a measurement regressed beyond the threshold, else 0.
+    """
+    args = parse_args(argv)
+    config = BenchmarkConfig(**(QUICK_CONFIG if args.quick else {}))
+    config.models = args.models
+    metrics = {}
+    if args.suite in ('serving','all'):
+        run_serving(config,metrics)
+    if args.suite in ('training','all'):
+        run_training(config,metrics)
+    results = {'environment':environment(),'config':config_dict(config),'metrics':metrics}
+    save_results(args.output,results)
+    print(f"Wrote {len(metrics)} measurements to {args.output}.")
+    if args.update_baseline:
+        save_results(args.baseline,results)
+        print(f"Stored them as the baseline {args.baseline}.")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}; run with --update-baseline to store one.")
+        return 0
+    baseline = load_results(args.baseline)
+    changed = sorted(key for key,value in results['config'].items()
+                     if key != 'models' and baseline.get('config',{}).get(key) != value)
+    if changed:
+        print(f"Warning: the baseline was measured with other settings {changed}.")
+    rows = compare_results(results,baseline,args.threshold)
+    print_comparison(rows,args.threshold)
+    return 1 if any(row['regression'] for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+This module benchmarks the serving path: single-row latency of `process_and_predict`, \
+    latency and throughput under concurrent clients, batch throughput across batch sizes and \
+        the cold start of a fresh serving process.
+
+The requests replay the rows of the bundled dataset. The prediction cache is turned off so \
+    that every request is parsed, encoded and scored.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from src.components.feature_schema import TARGET_COLUMN,DROPPED_COLUMNS
+from benchmarks.harness import measurement,latency_summary
+
+COLD_START_SCRIPT = (
+    "import json,time\n"
+    "started=time.perf_counter()\n"
+    "import app\n"
+    "imported=time.perf_counter()\n"
+    "app.inference_service.load()\n"
+    "print(json.dumps({'import_s':imported-started,'load_s':time.perf_counter()-imported}))\n"
+)
+
+def load_request_rows(data_path):
+    """
+    Reads the rows of the dataset as request payloads.
+
+    Args:
+        data_path (str): The dataset.
+
+    Returns:
+        list: One list of input values per row, in model order.
+    """
+    df = pd.read_csv(data_path).drop(columns=[TARGET_COLUMN] + DROPPED_COLUMNS)
+    return json.loads(df.to_json(orient='values'))
+
+def _timed_request(serving_app,row):
+    """Scores one row through the single-row endpoint logic and returns the latency."""
+    started = time.perf_counter()
+    serving_app.process_and_predict(input_text={'data':row},json_data=True)
+    return time.perf_counter() - started
+
+def benchmark_serving(config):
+    """
+    Measures the single-row latency, the concurrent throughput and the batch throughput.
+
+    Meant to run in a fresh process (see `run_isolated`), as it imports the application.
+
+    Args:
+        config (BenchmarkConfig): The benchmark configuration.
+
+    Returns:
+        dict: The measurements.
+    """
+    os.environ['PREDICTION_CACHE_BACKEND'] = 'off'
+    import app as serving_app # pylint: disable=C0415
+    rows = load_request_rows(config.data_path)
+    serving_app.inference_service.load()
+    for row in rows[:config.warmup_requests]:
+        _timed_request(serving_app,row)
+
+    metrics = {}
+    latencies = [_timed_request(serving_app,rows[i % len(rows)])
+                 for i in range(config.single_row_requests)]
+    metrics.update(latency_summary('serving.single_row',latencies))
+
+    requests = [rows[i % len(rows)] for i in range(config.concurrent_requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config.concurrency) as pool:
+        latencies = list(pool.map(lambda row: _timed_request(serving_app,row),requests))
+    elapsed = time.perf_counter() - started
+    metrics.update(latency_summary('serving.concurrent',latencies))
+    metrics['serving.concurrent.requests_per_s'] = measurement(
+        len(requests)/elapsed,'requests/s','higher')
+
+    for size in config.batch_sizes:
+        payload = {'data':[rows[i % len(rows)] for i in range(size)]}
+        batches = 0
+        started = time.perf_counter()
+        while True:
+            serving_app.process_batch(serving_app.parse_batch_body(payload))
+            batches += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= config.min_batch_time_s:
+                break
+        metrics[f"serving.batch_{size}.rows_per_s"] = measurement(
+            size*batches/elapsed,'rows/s','higher')
+        metrics[f"serving.batch_{size}.latency_ms"] = measurement(1000*elapsed/batches,'ms')
+    return metrics
+
+def benchmark_cold_start(config):
+    """
+    Times fresh processes that import the application and load the model artifacts.
+
+    Args:
+        config (BenchmarkConfig): The benchmark configuration.
+
+    Returns:
+        dict: The median total, import and load times.
+    """
+    totals,imports,loads = [],[],[]
+    for _ in range(config.cold_start_runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable,'-c',COLD_START_SCRIPT],capture_output=True,
+                                   text=True,check=True,
+                                   env={**os.environ,'PREDICTION_CACHE_BACKEND':'off'})
+        totals.append(time.perf_counter() - started)
+        timings = json.loads(completed.stdout.strip().splitlines()[-1])
+        imports.append(timings['import_s'])
+        loads.append(timings['load_s'])
+    return {
+        'serving.cold_start.total_s':measurement(np.median(totals),'s'),
+        'serving.cold_start.import_s':measurement(np.median(imports),'s'),
+        'serving.cold_start.load_s':measurement(np.median(loads),'s')
+    }
@@ -0,0 +1,121 @@
+"""
+This module profiles the cold start of the serving process: the import time of every module \
+    (as reported by `python -X importtime`) and the time until the model artifacts are loaded.
+
+Run it from the repository root with `python -m benchmarks.startup_profile`. It starts a \
+    fresh interpreter that imports the application and loads the artifacts, then prints the \
+        import time per top-level package and the slowest modules. The command exits with \
+            status 1 when the process is not ready within `--budget` seconds or when it imported \
+                one of the training libraries, which the serving path must not need.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+from benchmarks.serving import COLD_START_SCRIPT
+
+TRAINING_LIBRARIES = ['pandas','sklearn','scipy','xgboost','catboost','category_encoders']
+
+def parse_importtime(stderr):
+    """
+    Parses the output of `python -X importtime`.
+
+    Args:
+        stderr (str): The standard error of the profiled process.
+
+    Returns:
+        list: One (module, self seconds, cumulative seconds) tuple per imported module.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us,cumulative_us,name = line[len('import time:'):].split('|')
+        modules.append((name.strip(),int(self_us)/1e6,int(cumulative_us)/1e6))
+    return modules
+
+def profile_startup(env=None):
+    """
+    Starts a fresh serving process with the import profiler on.
+
+    Args:
+        env (dict): Extra environment variables of the process.
+
+    Returns:
+        dict: The wall time of the process, its import and load times and the imported modules.
+    """
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable,'-X','importtime','-c',COLD_START_SCRIPT],
+                               capture_output=True,text=True,check=True,
+                               env={**os.environ,'PREDICTION_CACHE_BACKEND':'off',**(env or {})})
+    total = time.perf_counter() - started
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {'total_s':total,'import_s':timings['import_s'],'load_s':timings['load_s'],
+            'ready_s':timings['import_s'] + timings['load_s'],
+            'modules':parse_importtime(completed.stderr)}
+
+def package_times(modules):
+    """
+    Sums the self import time of the modules of every top-level package.
+
+    Args:
+        modules (list): The modules returned by `parse_importtime`.
+
+    Returns:
+        dict: Seconds per top-level package, slowest first.
+    """
+    totals = defaultdict(float)
+    for name,self_s,_ in modules:
+        totals[name.split('.')[0]] += self_s
+    return dict(sorted(totals.items(),key=lambda item: -item[1]))
+
+def print_profile(profile,top):
+    """Prints the timings, the slowest packages and the slowest modules."""
+    print(f"Ready in {profile['ready_s']:.3f}s (import {profile['import_s']:.3f}s, "
+          f"artifact load {profile['load_s']:.3f}s); process wall time {profile['total_s']:.3f}s.")
+    print(f"\n{'package':<40}{'self import ms':>16}")
+    for name,seconds in list(package_times(profile['modules']).items())[:top]:
+        print(f"{name:<40}{1000*seconds:>16.1f}")
+    print(f"\n{'module':<56}{'self ms':>10}{'cumulative ms':>16}")
+    for name,self_s,cumulative_s in sorted(profile['modules'],key=lambda m: -m[1])[:top]:
+        print(f"{name:<56}{1000*self_s:>10.1f}{1000*cumulative_s:>16.1f}")
+
+def parse_args(argv):
+    """Parses the command-line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--top',type=int,default=15,help='Packages and modules listed.')
+    parser.add_argument('--budget',type=float,
+                        default=float(os.environ.get('STARTUP_BUDGET_S','1.0')),
+                        help='Seconds within which the process must be ready (default 1.0).')
+    parser.add_argument('--output',help='Also write the profile as JSON to this file.')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Command-line entry point of the startup profile.
+
+    Returns:
+        int: 1 if the process was too slow or imported a training library, else 0.
+    """
+    args = parse_args(argv)
+    profile = profile_startup()
+    print_profile(profile,args.top)
+    if args.output:
+        with open(args.output,'w',encoding='utf-8') as f:
+            json.dump({**profile,'packages':package_times(profile['modules'])},f,indent=4)
+    status = 0
+    imported = {name.split('.')[0] for name,_,_ in profile['modules']}
+    training = [library for library in TRAINING_LIBRARIES if library in imported]
+    if training:
+        print(f"\nThe serving process imported training libraries: {training}.")
+        status = 1
+    if profile['ready_s'] > args.budget:
+        print(f"\nThe serving process was not ready within {args.budget:.3f}s.")
+        status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+This module benchmarks the training path: the wall time of the hyperparameter search of \
+    every candidate model of the training stage, on the bundled dataset.
+
+The features are prepared in memory exactly as the ingestion and transformation stages do \
+    (hash split, target encoding, out-of-fold encoding of the CV folds), so nothing under \
+        `artifacts/` or `src/models/` is touched.
+"""
+import re
+import time
+import numpy as np
+import pandas as pd
+import category_encoders as ce
+from src.utils import with_explicit_dtypes
+from src.components.data_ingestion import DataIngestion
+from src.components.feature_schema import CATEGORICAL_COLUMNS,TARGET_COLUMN,DROPPED_COLUMNS
+from src.components.fold_encoding import FoldEncoding
+from src.components.hyperparameter_search import HyperparameterSearchConfig,search_model
+from src.components.model_trainer import candidate_models,candidate_params
+from benchmarks.harness import measurement
+
+def metric_name(model_name):
+    """Turns a model name into the part of a measurement name, such as 'random_forest'."""
+    return re.sub(r'[^a-z0-9]+','_',model_name.lower()).strip('_')
+
+def prepare_training_data(data_path):
+    """
+    Builds the encoded training features and target from the dataset.
+
+    Args:
+        data_path (str): The dataset.
+
+    Returns:
+        tuple: The float64 training features and target, and the out-of-fold encoding.
+    """
+    df = with_explicit_dtypes(pd.read_csv(data_path)).drop(columns=DROPPED_COLUMNS)
+    train_df,_ = DataIngestion().hash_split(df)
+    x = train_df.drop(columns=[TARGET_COLUMN])
+    x[CATEGORICAL_COLUMNS] = x[CATEGORICAL_COLUMNS].astype(object)
+    y = train_df[TARGET_COLUMN]
+    fold_encoding = FoldEncoding.from_frame(x,y,list(CATEGORICAL_COLUMNS))
+    encoder = ce.TargetEncoder(cols=list(CATEGORICAL_COLUMNS))
+    x[CATEGORICAL_COLUMNS] = encoder.fit_transform(x[CATEGORICAL_COLUMNS],y)
+    return (np.ascontiguousarray(x.to_numpy(dtype='float64')),y.to_numpy(dtype='float64'),
+            fold_encoding)
+
+def benchmark_model_search(model_name,config):
+    """
+    Times the hyperparameter search and refit of one candidate model.
+
+    Meant to run in a fresh process (see `run_isolated`), so that its peak memory is its own.
+
+    Args:
+        model_name (str): A model returned by `candidate_models`.
+        config (BenchmarkConfig): The benchmark configuration.
+
+    Returns:
+        dict: The measurements.
+    """
+    x,y,fold_encoding = prepare_training_data(config.data_path)
+    estimator = candidate_models()[model_name]
+    if 'verbose' in estimator.get_params():
+        estimator.set_params(verbose=0)
+    search_config = HyperparameterSearchConfig(strategy=config.search_strategy,
+                                               n_iter=config.search_n_iter,n_jobs=1)
+    started = time.perf_counter()
+    result = search_model(model_name,estimator,candidate_params()[model_name],x,y,search_config,
+                          fold_encoding=fold_encoding)
+    elapsed = time.perf_counter() - started
+    name = metric_name(model_name)
+    return {
+        f"training.{name}.search_s":measurement(elapsed,'s'),
+        f"training.{name}.seconds_per_candidate":measurement(
+            result.search_s/max(result.n_candidates,1),'s')
+    }
@@ -10,34 +10,64 @@ The module raises custom exceptions in case of errors during \
 import os
 import sys
 from dataclasses import dataclass
-from sklearn.model_selection import train_test_split
 import pandas as pd
 from src.logger import logging
 from src.exception import CustomException
-from src.components.data_transformation import DataTransformation
-from src.components.model_trainer import ModelTrainer
+from src.utils import save_frame,append_frame,load_frame_columns,check_append
+from src.components.feature_schema import CATEGORICAL_COLUMNS
+
+ARTIFACT_FORMAT = os.environ.get('ARTIFACT_FORMAT','parquet')
+HASH_SPLIT_BUCKETS = 10000
 
 @dataclass
-class DataIngestionConfig():
+class DataIngestionConfig(): # pylint: disable=R0902
     """
     Configuration class for data ingestion paths.
+
+    The split datasets are stored in `ARTIFACT_FORMAT` ('parquet', 'feather' or 'csv', \
+        set through the environment variable of the same name).
     
     Attributes:
+        source_path (str): Path of the cleaned source dataset.
         raw_path (str): Path to save the raw dataset.
         train_path (str): Path to save the training dataset.
         test_path (str): Path to save the testing dataset.
+        train_delta_path (str): Path to save the training rows of the latest incremental delta.
+        test_delta_path (str): Path to save the testing rows of the latest incremental delta.
+        test_size (float): Fraction of the rows held out for testing.
+        random_state (int): Seed of the train-test split.
+        chunk_size (int): Number of source rows read at a time by the streaming ingestion \
+            (set through `INGESTION_CHUNK_SIZE`); 0 reads the whole source at once.
+    """
+    source_path:str = os.path.join('notebooks','cleaned_data.csv')
+    raw_path:str = os.path.join('artifacts',f'raw.{ARTIFACT_FORMAT}')
+    train_path:str = os.path.join('artifacts',f'train.{ARTIFACT_FORMAT}')
+    test_path:str = os.path.join('artifacts',f'test.{ARTIFACT_FORMAT}')
+    train_delta_path:str = os.path.join('artifacts',f'train_delta.{ARTIFACT_FORMAT}')
+    test_delta_path:str = os.path.join('artifacts',f'test_delta.{ARTIFACT_FORMAT}')
+    test_size:float = 0.1
+    random_state:int = 0
+    chunk_size:int = int(os.environ.get('INGESTION_CHUNK_SIZE','0'))
+
+def source_dtypes(columns):
+    """
+    Returns the dtypes the source columns are read with, taken from the feature schema.
+
+    Args:
+        columns (list): The source columns.
+
+    Returns:
+        dict: `str` for the categorical columns and 'float64' for every other column.
     """
-    raw_path:str = os.path.join('artifacts','raw.csv')
-    train_path:str = os.path.join('artifacts','train.csv')
-    test_path:str = os.path.join('artifacts','test.csv')
+    return {column:(str if column in CATEGORICAL_COLUMNS else 'float64') for column in columns}
 
 class DataIngestion():
     """
     Class responsible for data ingestion.
 
     This class reads data from a source CSV file, performs a train-test split, and saves
-    the split datasets to specified file paths. It logs the process and raises custom exceptions
-    in case of any issues.
+    the split datasets to specified file paths in the configured artifact format. It logs the
+    process and raises custom exceptions in case of any issues.
 
     Attributes:
         data_ingestion_config (DataIngestionConfig): Configuration object that holds the paths 
@@ -55,20 +85,29 @@ class DataIngestion():
                 file paths. The steps are logged for better monitoring, and \
                     custom exceptions are raised for any errors.
 
+        When `chunk_size` is configured, the source is streamed instead \
+            (see `initiate_streaming_ingestion`).
+
         Returns:
             tuple: Paths to the training and testing datasets.
         """
+        if self.data_ingestion_config.chunk_size > 0:
+            return self.initiate_streaming_ingestion(self.data_ingestion_config.chunk_size)
         try:
             logging.info('Started Data Ingestion.')
-            df = pd.read_csv(r'notebooks\cleaned_data.csv')
+            source_path = self.data_ingestion_config.source_path
+            df = pd.read_csv(source_path,
+                             dtype=source_dtypes(pd.read_csv(source_path,nrows=0).columns))
             logging.info("Read the dataset.")
-            os.makedirs(os.path.dirname(self.data_ingestion_config.raw_path),exist_ok=True)
-            df.to_csv(self.data_ingestion_config.raw_path,index=False,header=True)
+            save_frame(self.data_ingestion_config.raw_path,df)
             logging.info("Train Test Split initiated.")
-            train_set,test_set = train_test_split(df,test_size=0.1,random_state=0)
+            config = self.data_ingestion_config
+            from sklearn.model_selection import train_test_split # pylint: disable=C0415
+            train_set,test_set = train_test_split(df,test_size=config.test_size,
+                                                  random_state=config.random_state)
 
-            train_set.to_csv(self.data_ingestion_config.train_path,index=False,header=True)
-            test_set.to_csv(self.data_ingestion_config.test_path,index=False,header=True)
+            save_frame(self.data_ingestion_config.train_path,train_set)
+            save_frame(self.data_ingestion_config.test_path,test_set)
 
             logging.info("Ingestion of data is completed.")
 
@@ -79,12 +118,121 @@ class DataIngestion():
         except Exception as e:
             raise CustomException(e,sys) from e
 
-if __name__ == '__main__':
-    obj = DataIngestion()
-    trainset,testset = obj.initiate_data_ingestion()
-    transform_obj = DataTransformation()
-    train_array,test_array,_= transform_obj.initiate_data_transformation(
-        train_path=trainset,test_path=testset
-    )
-    model_obj = ModelTrainer()
-    model_obj.initiate_model_trainer(train_arr=train_array,test_arr=test_array)
+    def hash_split(self,df):
+        """
+        Splits rows into training and testing sets from a hash of their content.
+
+        Every row is assigned on its own, seeded by `random_state`, so the split does not \
+            depend on how the source is chunked or ordered and is the same on every run.
+
+        Args:
+            df (pd.DataFrame): The rows to split.
+
+        Returns:
+            tuple: The training rows and the testing rows.
+        """
+        config = self.data_ingestion_config
+        hashes = pd.util.hash_pandas_object(df,index=False,hash_key=f'{config.random_state:016d}')
+        is_test = (hashes.to_numpy() % HASH_SPLIT_BUCKETS) < config.test_size*HASH_SPLIT_BUCKETS
+        return df[~is_test],df[is_test]
+
+    def initiate_streaming_ingestion(self,chunk_size):
+        """
+        Ingests the source dataset in chunks so that peak memory does not grow with its size.
+
+        Each chunk is split with `hash_split` and written to the raw, train and test \
+            datasets before the next one is read. The dtypes come from the feature schema, \
+                the categorical columns as strings and every other column as float64, so that \
+                    every part of an artifact has the same schema whatever the first chunk holds.
+
+        Args:
+            chunk_size (int): Number of source rows read at a time.
+
+        Returns:
+            tuple: Paths to the training and testing datasets.
+
+        Raises:
+            CustomException: If the artifact format cannot be appended to in place, or if \
+                reading or writing a chunk fails.
+        """
+        try:
+            config = self.data_ingestion_config
+            if ARTIFACT_FORMAT == 'feather':
+                raise ValueError("Streaming ingestion needs the 'parquet' or 'csv' "
+                                 "artifact format.")
+            logging.info(f'Started streaming Data Ingestion in chunks of {chunk_size} rows.')
+            dtypes = source_dtypes(pd.read_csv(config.source_path,nrows=0).columns)
+            write = save_frame
+            n_train = n_test = 0
+            for chunk in pd.read_csv(config.source_path,dtype=dtypes,chunksize=chunk_size):
+                train_set,test_set = self.hash_split(chunk)
+                for frame,path in ((chunk,config.raw_path),(train_set,config.train_path),
+                                   (test_set,config.test_path)):
+                    write(path,frame)
+                write = append_frame
+                n_train += len(train_set)
+                n_test += len(test_set)
+
+            logging.info(f"Streaming ingestion completed: {n_train} train and {n_test} test rows.")
+
+            return(
+                config.train_path,
+                config.test_path
+            )
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def initiate_incremental_ingestion(self,new_data_path):
+        """
+        Appends a delta of new project rows to the existing datasets.
+
+        The new rows are split with the same test size and seed as the full ingestion and \
+            appended to the raw, train and test datasets; only the delta is read and written. \
+                The train and test rows of the delta are also saved on their own so the \
+                    following stages can update the encoder and the model from them.
+
+        The delta is read with the dtypes of the feature schema and checked against the \
+            columns and stored types of the existing datasets before anything is appended, \
+                so a malformed delta (a missing column, text in a numeric column) leaves them \
+                    untouched.
+
+        Args:
+            new_data_path (str): Path of a CSV file holding only the new rows.
+
+        Returns:
+            tuple: Paths to the training and testing rows of the delta.
+        """
+        try:
+            logging.info(f'Started incremental Data Ingestion of {new_data_path}.')
+            config = self.data_ingestion_config
+            header = list(pd.read_csv(new_data_path,nrows=0).columns)
+            columns = load_frame_columns(config.raw_path) if os.path.exists(config.raw_path) \
+                else header
+            missing = [column for column in columns if column not in header]
+            if missing:
+                raise ValueError(f"The new rows lack the columns {missing}.")
+            df = pd.read_csv(new_data_path,dtype=source_dtypes(header))[columns]
+            if len(df) > 1:
+                from sklearn.model_selection import train_test_split # pylint: disable=C0415
+                train_set,test_set = train_test_split(df,test_size=config.test_size,
+                                                      random_state=config.random_state)
+            else:
+                train_set,test_set = df,df.iloc[0:0]
+
+            parts = ((df,config.raw_path),(train_set,config.train_path),
+                     (test_set,config.test_path))
+            for frame,path in parts:
+                check_append(path,frame)
+            for frame,path in parts:
+                append_frame(path,frame)
+            save_frame(config.train_delta_path,train_set)
+            save_frame(config.test_delta_path,test_set)
+
+            logging.info(f"Appended {len(train_set)} train and {len(test_set)} test rows.")
+
+            return(
+                config.train_delta_path,
+                config.test_delta_path
+            )
+        except Exception as e:
+            raise CustomException(e,sys) from e
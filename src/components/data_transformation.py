@@ -4,17 +4,22 @@ This module handles the data transformation process, particularly focusing on en
 
 It reads the training and testing datasets, applies a target encoding to the specified categorical\
     columns, and returns the transformed datasets along with the saved encoder object \
-        for future use.
+        for future use. It also saves the out-of-fold encoded training matrices \
+            (`FoldEncoding`) the hyperparameter search cross-validates on.
 """
 import sys
 import os
 from dataclasses import dataclass
-import numpy as np
-import pandas as pd
-import category_encoders as ce
 from src.exception import CustomException
 from src.logger import logging
-from src.utils import save_object
+from src.utils import save_object,load_object,load_frame,load_frame_columns
+from src.components.incremental_encoder import TargetEncodingStatistics
+from src.components.feature_matrix import FeatureMatrix
+from src.components.fold_encoding import FoldEncoding
+from src.components.encoding_tables import TargetEncodingTable
+from src.components.stage_cache import hash_file
+from src.components.feature_schema import (FeatureSchema,CATEGORICAL_COLUMNS,TARGET_COLUMN,
+                                           DROPPED_COLUMNS)
 
 @dataclass
 class DataTransformationConfig:
@@ -26,9 +31,29 @@ class DataTransformationConfig:
             (not used in the current code).
         categorical_encoder_obj_file_path (str): Path to save the categorical encoder \
             object (Target Encoder).
+        target_encoding_stats_obj_file_path (str): Path to save the per-category statistics \
+            used to update the categorical encoder incrementally.
+        encoding_table_obj_file_path (str): Path to save the lookup tables exported from the \
+            categorical encoder for serving.
+        train_matrix_path (str): Directory of the memory-mapped training feature matrix.
+        test_matrix_path (str): Directory of the memory-mapped testing feature matrix.
+        feature_dtype (str): Storage type of the features, 'float64' or 'float32' \
+            (set through `FEATURE_DTYPE`).
+        feature_schema_file_path (str): Path to save the feature schema shared with serving.
+        fold_encoding_path (str): Directory of the memory-mapped out-of-fold encoded \
+            training matrices.
+        fold_encoding_n_splits (int): Number of cross-validation folds of the fold encoding.
     """
     preprocessor_obj_file_path=os.path.join('src/models',"preprocessor.pkl")
     categorical_encoder_obj_file_path = os.path.join('src/models','categorical_encoder.pkl')
+    target_encoding_stats_obj_file_path = os.path.join('src/models','target_encoding_stats.pkl')
+    encoding_table_obj_file_path = os.path.join('src/models','encoding_table.pkl')
+    train_matrix_path = os.path.join('artifacts','train_matrix')
+    test_matrix_path = os.path.join('artifacts','test_matrix')
+    feature_dtype = os.environ.get('FEATURE_DTYPE','float64')
+    feature_schema_file_path = os.path.join('src/models','feature_schema.json')
+    fold_encoding_path = os.path.join('artifacts','fold_encoding')
+    fold_encoding_n_splits = 3
 
 class DataTransformation:
     """
@@ -47,19 +72,58 @@ class DataTransformation:
     def __init__(self):
         self.data_transformation_config=DataTransformationConfig()
 
-    def initiate_data_transformation(self,train_path,test_path):
+    @staticmethod
+    def _load_split(path,categorical_columns,columns=None):
+        """
+        Loads a split artifact and turns its categorical columns back into plain strings.
+
+        Args:
+            path (str): The file path to the split (Parquet, Feather or CSV).
+            categorical_columns (list): The categorical columns of the split.
+            columns (list): The columns to read, or None to read every column but the \
+                dropped columns of the feature schema.
+
+        Returns:
+            pd.DataFrame: The split, with object dtype categorical columns as the target \
+                encoder expects.
+        """
+        if columns is None:
+            columns = [c for c in load_frame_columns(path) if c not in DROPPED_COLUMNS]
+        df = load_frame(path,columns=columns)
+        present = [c for c in categorical_columns if c in df.columns]
+        df[present] = df[present].astype(object)
+        return df
+
+    def export_encoding_table(self):
+        """
+        Exports the saved categorical encoder into the lookup tables used for serving.
+
+        Returns:
+            TargetEncodingTable: The exported tables, tagged with the hash of the encoder file.
+        """
+        config = self.data_transformation_config
+        table = TargetEncodingTable.from_encoder(
+            load_object(config.categorical_encoder_obj_file_path),
+            source_digest=hash_file(config.categorical_encoder_obj_file_path))
+        save_object(filepath=config.encoding_table_obj_file_path,obj=table)
+        return table
+
+    def initiate_data_transformation(self,train_path,test_path): # pylint: disable=R0914
         """
         Initiates the data transformation process by applying target encoding \
             on the categorical columns.
 
         Args:
-            train_path (str): The file path to the training dataset (CSV).
-            test_path (str): The file path to the testing dataset (CSV).
+            train_path (str): The file path to the training dataset (Parquet, Feather or CSV).
+            test_path (str): The file path to the testing dataset (Parquet, Feather or CSV).
+
+        The encoded features are written once into contiguous feature matrices that are \
+            saved as `.npy` files and handed on memory-mapped.
 
         Returns:
             tuple: A tuple containing the following:
-                - numpy.ndarray: Transformed training dataset as a NumPy array.
-                - numpy.ndarray: Transformed testing dataset as a NumPy array.
+                - FeatureMatrix: Memory-mapped transformed training dataset.
+                - FeatureMatrix: Memory-mapped transformed testing dataset.
                 - str: The file path where the categorical encoder object is saved.
         
         Raises:
@@ -67,36 +131,46 @@ class DataTransformation:
                 it raises a custom exception.
         """
         try:
-            categorical_columns = ['Commodity Code', 'Item Description', 'Project Name',
-                                    'Greenfield/ Brownfield', 'Client', 'Market Sector/Industry', 
-                                    'Delivery Method', 'Item Type', 'coordinates', 'state', 'city', 
-                                    'suburb']
-            train_df=pd.read_csv(train_path)
-            test_df=pd.read_csv(test_path)
+            categorical_columns = list(CATEGORICAL_COLUMNS)
+            train_df=self._load_split(train_path,categorical_columns)
+            test_df=self._load_split(test_path,categorical_columns)
 
             logging.info("Read train and test data completed")
 
-            target_column_name="Total"
+            target_column_name=TARGET_COLUMN
 
-            input_feature_train_df=train_df.drop(columns=[target_column_name,'Attribute 4'],axis=1)
+            input_feature_train_df=train_df.drop(columns=[target_column_name])
             target_feature_train_df=train_df[target_column_name]
 
-            input_feature_test_df=test_df.drop(columns=[target_column_name,'Attribute 4'],axis=1)
+            input_feature_test_df=test_df.drop(columns=[target_column_name])
             target_feature_test_df=test_df[target_column_name]
+            feature_schema = FeatureSchema.from_frame(input_feature_train_df,categorical_columns,
+                                                      target_column=target_column_name)
+
+            config = self.data_transformation_config
+            FoldEncoding.from_frame(
+                input_feature_train_df,target_feature_train_df,categorical_columns,
+                n_splits=config.fold_encoding_n_splits,dtype=config.feature_dtype
+            ).save(config.fold_encoding_path)
+            logging.info(f"Saved the out-of-fold encoding of the {config.fold_encoding_n_splits} "
+                         "cross-validation folds.")
 
             logging.info(
                 "Applying preprocessing object on training dataframe and testing dataframe."
             )
+            import category_encoders as ce # pylint: disable=C0415
             target_encoder = ce.TargetEncoder(cols=categorical_columns)
             input_feature_train_df[categorical_columns] = target_encoder.fit_transform(
                 input_feature_train_df[categorical_columns],target_feature_train_df)
             input_feature_test_df[categorical_columns] = target_encoder.transform(
                 input_feature_test_df[categorical_columns])
 
-            train_arr = np.c_[
-                np.array(input_feature_train_df), np.array(target_feature_train_df)
-            ]
-            test_arr = np.c_[np.array(input_feature_test_df), np.array(target_feature_test_df)]
+            train_matrix = FeatureMatrix.from_frame(
+                input_feature_train_df,target_feature_train_df,dtype=config.feature_dtype
+            ).save(config.train_matrix_path)
+            test_matrix = FeatureMatrix.from_frame(
+                input_feature_test_df,target_feature_test_df,dtype=config.feature_dtype
+            ).save(config.test_matrix_path)
 
             logging.info("Saved preprocessing object.")
 
@@ -104,11 +178,86 @@ class DataTransformation:
                 filepath=self.data_transformation_config.categorical_encoder_obj_file_path,
                 obj=target_encoder
             )
+            save_object(
+                filepath=self.data_transformation_config.target_encoding_stats_obj_file_path,
+                obj=TargetEncodingStatistics.from_frame(
+                    train_df[categorical_columns],target_feature_train_df,categorical_columns)
+            )
+            self.export_encoding_table()
+            feature_schema.save(self.data_transformation_config.feature_schema_file_path)
 
             return (
-                train_arr,
-                test_arr,
+                train_matrix,
+                test_matrix,
                 self.data_transformation_config.categorical_encoder_obj_file_path
             )
         except Exception as e:
             raise CustomException(e,sys) from e
+
+    def initiate_incremental_transformation(self,train_delta_path,test_path,train_path=None): # pylint: disable=R0914
+        """
+        Updates the fitted target encoder with a delta of new training rows and encodes them.
+
+        The per-category statistics saved by the full transformation are updated with the \
+            delta only, and the encoder mappings are rewritten from them, so the cost scales \
+                with the size of the delta. When no statistics were saved yet they are rebuilt \
+                    once from `train_path`, which already contains the delta.
+
+        Args:
+            train_delta_path (str): The file path to the new training rows.
+            test_path (str): The file path to the whole testing dataset.
+            train_path (str): The file path to the whole training dataset, only read \
+                (projected on the categorical and target columns) when the statistics have \
+                    to be rebuilt.
+
+        Returns:
+            tuple: A tuple containing the following:
+                - FeatureMatrix: Transformed new training rows.
+                - FeatureMatrix: Transformed testing dataset.
+                - str: The file path where the updated categorical encoder object is saved.
+
+        Raises:
+            CustomException: If any exception occurs during the data transformation process, \
+                it raises a custom exception.
+        """
+        try:
+            config = self.data_transformation_config
+            target_column_name=TARGET_COLUMN
+            target_encoder = load_object(config.categorical_encoder_obj_file_path)
+            categorical_columns = target_encoder.cols
+
+            train_delta_df=self._load_split(train_delta_path,categorical_columns)
+            test_df=self._load_split(test_path,categorical_columns)
+            logging.info(f"Read {len(train_delta_df)} new training rows.")
+
+            if os.path.exists(config.target_encoding_stats_obj_file_path):
+                stats = load_object(config.target_encoding_stats_obj_file_path)
+                stats.update(train_delta_df[categorical_columns],train_delta_df[target_column_name])
+            else:
+                logging.info("No target encoding statistics found, rebuilding them once.")
+                train_df=self._load_split(train_path,categorical_columns,
+                                          columns=categorical_columns + [target_column_name])
+                stats = TargetEncodingStatistics.from_frame(
+                    train_df[categorical_columns],train_df[target_column_name],categorical_columns)
+            stats.apply_to(target_encoder)
+
+            matrices = []
+            for df in (train_delta_df,test_df):
+                input_feature_df=df.drop(columns=[target_column_name])
+                input_feature_df[categorical_columns] = target_encoder.transform(
+                    input_feature_df[categorical_columns])
+                matrices.append(FeatureMatrix.from_frame(
+                    input_feature_df,df[target_column_name],dtype=config.feature_dtype))
+
+            save_object(filepath=config.categorical_encoder_obj_file_path,obj=target_encoder)
+            save_object(filepath=config.target_encoding_stats_obj_file_path,obj=stats)
+            self.export_encoding_table()
+            logging.info("Saved incrementally updated preprocessing object.")
+
+            return (
+                matrices[0],
+                matrices[1],
+                config.categorical_encoder_obj_file_path
+            )
+        except Exception as e:
+            raise CustomException(e,sys) from e
@@ -0,0 +1,140 @@
+"""
+This module exports the fitted target encoder into compact lookup tables for serving.
+
+`category_encoders.TargetEncoder.transform` runs an ordinal encoding and a target mapping \
+    through pandas for every request, while the result only depends on one dictionary lookup \
+        per categorical value. The tables below compose both mappings into plain dictionaries \
+            from category to encoded value, with the unknown and missing fallbacks precomputed, \
+                and give bit-identical results to the encoder they were built from.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+
+def _is_missing(value):
+    """Returns True for the values the ordinal encoder treats as missing (None, NaN, pd.NA)."""
+    if value is None:
+        return True
+    try:
+        return bool(value != value) # pylint: disable=R0124
+    except TypeError:
+        return True
+
+def _plain(value):
+    """Turns NumPy scalars into the equivalent Python values so the tables pickle without NumPy."""
+    return value.item() if isinstance(value,np.generic) else value
+
+@dataclass
+class TargetEncodingTable():
+    """
+    Category to encoded value lookup tables of a fitted target encoder.
+
+    Attributes:
+        cols (list): The target-encoded columns.
+        values (dict): Encoded value of every known category, keyed by column then category.
+        unknown (dict): Encoded value of an unseen category per column, or None when the \
+            encoder rejects unseen categories.
+        missing (dict): Encoded value of a missing category per column, or None when the \
+            encoder rejects missing values.
+        source_digest (str): Hash of the encoder file the tables were exported from.
+    """
+    cols:list
+    values:dict = field(default_factory=dict)
+    unknown:dict = field(default_factory=dict)
+    missing:dict = field(default_factory=dict)
+    source_digest:Optional[str] = None
+
+    @classmethod
+    def from_encoder(cls,target_encoder,source_digest=None):
+        """
+        Composes the ordinal and target mappings of a fitted encoder into lookup tables.
+
+        Args:
+            target_encoder (ce.TargetEncoder): The fitted encoder.
+            source_digest (str): Hash of the encoder file, to detect a stale export.
+
+        Returns:
+            TargetEncodingTable: The lookup tables.
+        """
+        ordinal_encoder = target_encoder.ordinal_encoder
+        table = cls(cols=list(target_encoder.cols),source_digest=source_digest)
+        for switch in ordinal_encoder.mapping:
+            col = switch['col']
+            target = {int(k):float(v) for k,v in target_encoder.mapping[col].items()}
+            nan = float('nan')
+            ordinal = {}
+            nan_index = None
+            for category,index in switch['mapping'].items():
+                if _is_missing(category):
+                    nan_index = int(index)
+                else:
+                    ordinal[_plain(category)] = int(index)
+            table.values[col] = {category:target.get(index,nan)
+                                 for category,index in ordinal.items()}
+
+            if 'error' in (ordinal_encoder.handle_unknown,target_encoder.handle_unknown):
+                unknown = None
+            elif ordinal_encoder.handle_unknown == 'value':
+                unknown = target.get(-1,nan)
+            else:
+                unknown = nan
+            table.unknown[col] = unknown
+
+            if nan_index is None:
+                missing = unknown
+            elif nan_index == -2 and ordinal_encoder.handle_missing == 'return_nan':
+                missing = nan
+            else:
+                missing = target.get(nan_index,nan)
+            table.missing[col] = missing
+        return table
+
+    def encode_value(self,col,value):
+        """
+        Encodes one categorical value.
+
+        Args:
+            col (str): The column of the value.
+            value: The raw category.
+
+        Returns:
+            float: The encoded value.
+
+        Raises:
+            ValueError: If the category is unseen (or missing) and the encoder rejects it.
+        """
+        if _is_missing(value):
+            encoded = self.missing[col]
+        else:
+            encoded = self.values[col].get(value,self.unknown[col])
+        if encoded is None:
+            raise ValueError(f"Unexpected category {value!r} found in column {col!r}.")
+        return encoded
+
+    def encode_column(self,col,values):
+        """
+        Encodes a sequence of categorical values of one column.
+
+        Args:
+            col (str): The column of the values.
+            values (iterable): The raw categories.
+
+        Returns:
+            np.ndarray: The float64 encoded values.
+        """
+        return np.array([self.encode_value(col,value) for value in values],dtype='float64')
+
+    def transform(self,df):
+        """
+        Encodes the categorical columns of a frame, like `TargetEncoder.transform` does.
+
+        Args:
+            df (pd.DataFrame): Rows containing at least the encoded columns.
+
+        Returns:
+            pd.DataFrame: A copy of the frame with the encoded columns replaced.
+        """
+        df = df.copy()
+        for col in self.cols:
+            df[col] = self.encode_column(col,df[col].tolist())
+        return df
@@ -0,0 +1,163 @@
+"""
+This module provides the typed feature matrix handed from the data transformation stage to \
+    the model trainer and to the hyperparameter search workers.
+
+The features are stored once as a C-contiguous float array, next to a separate target \
+    vector and the column metadata. A matrix saved to disk is reopened as memory-mapped \
+        `.npy` files, and pickling a memory-mapped matrix (or array) only sends its path, so \
+            the worker processes map the same pages instead of receiving a copy of the data.
+"""
+import os
+import sys
+import json
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from src.exception import CustomException
+
+FEATURES_FILE = 'features.npy'
+TARGET_FILE = 'target.npy'
+METADATA_FILE = 'metadata.json'
+
+@dataclass
+class FeatureMatrix():
+    """
+    Feature matrix with its target vector and column metadata.
+
+    Attributes:
+        features (np.ndarray): C-contiguous float32 or float64 array of shape \
+            (n_rows, n_features).
+        target (np.ndarray): Target vector of length n_rows.
+        columns (list): Names of the feature columns, in storage order.
+        target_column (str): Name of the target column.
+        path (str): Directory the matrix is memory-mapped from, or None when it lives \
+            only in memory.
+    """
+    features:np.ndarray
+    target:np.ndarray
+    columns:list
+    target_column:str = 'Total'
+    path:Optional[str] = None
+
+    @classmethod
+    def from_frame(cls,feature_df,target,dtype='float64'):
+        """
+        Builds a matrix from a fully numeric feature frame with a single copy of the data.
+
+        Args:
+            feature_df (pd.DataFrame): The encoded feature columns.
+            target (pd.Series): The target column.
+            dtype (str): 'float64' or 'float32', the storage type of the features.
+
+        Returns:
+            FeatureMatrix: The in-memory matrix.
+
+        Raises:
+            ValueError: If a feature column is not numeric.
+        """
+        features = np.empty((len(feature_df),feature_df.shape[1]),dtype=dtype,order='C')
+        for i,column in enumerate(feature_df.columns):
+            features[:,i] = feature_df[column].to_numpy(dtype=dtype)
+        return cls(features=features,target=target.to_numpy(dtype='float64'),
+                   columns=list(feature_df.columns),target_column=target.name)
+
+    @property
+    def n_rows(self):
+        """int: Number of rows."""
+        return self.features.shape[0]
+
+    @property
+    def n_features(self):
+        """int: Number of feature columns."""
+        return self.features.shape[1]
+
+    def save(self,directory):
+        """
+        Writes the matrix as `.npy` files and returns it reopened as a memory-mapped matrix.
+
+        Args:
+            directory (str): The directory to write the matrix to.
+
+        Returns:
+            FeatureMatrix: The matrix memory-mapped from `directory`.
+
+        Raises:
+            CustomException: If the matrix cannot be written.
+        """
+        try:
+            os.makedirs(directory,exist_ok=True)
+            np.save(os.path.join(directory,FEATURES_FILE),self.features)
+            np.save(os.path.join(directory,TARGET_FILE),self.target)
+            with open(os.path.join(directory,METADATA_FILE),'w',encoding='utf-8') as f:
+                json.dump({'columns':self.columns,'target_column':self.target_column,
+                           'dtype':self.features.dtype.name,'n_rows':self.n_rows},f)
+            return FeatureMatrix.load(directory)
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    @classmethod
+    def load(cls,directory):
+        """
+        Memory-maps a matrix written by `save`.
+
+        Args:
+            directory (str): The directory the matrix was saved to.
+
+        Returns:
+            FeatureMatrix: The read-only, memory-mapped matrix.
+
+        Raises:
+            CustomException: If the matrix cannot be read.
+        """
+        try:
+            with open(os.path.join(directory,METADATA_FILE),encoding='utf-8') as f:
+                metadata = json.load(f)
+            return cls(
+                features=np.load(os.path.join(directory,FEATURES_FILE),mmap_mode='r'),
+                target=np.load(os.path.join(directory,TARGET_FILE),mmap_mode='r'),
+                columns=metadata['columns'],target_column=metadata['target_column'],
+                path=directory)
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def __reduce__(self):
+        """Pickles a memory-mapped matrix as its path, and an in-memory one by value."""
+        if self.path is not None:
+            return (FeatureMatrix.load,(self.path,))
+        return (FeatureMatrix,(self.features,self.target,self.columns,self.target_column))
+
+def _map_array(path):
+    """Reopens a whole `.npy` file read-only as a memory-mapped array."""
+    return np.load(path,mmap_mode='r')
+
+class MappedArray(): # pylint: disable=R0903
+    """
+    Picklable reference to a whole `.npy` file, unpickled as the memory-mapped array itself.
+
+    Attributes:
+        path (str): The `.npy` file.
+    """
+    def __init__(self,path):
+        self.path = path
+
+    def __reduce__(self):
+        return (_map_array,(self.path,))
+
+def shareable(array):
+    """
+    Returns what to send to a worker process for an array without copying its data.
+
+    Args:
+        array (np.ndarray): The array to send.
+
+    Returns:
+        MappedArray or np.ndarray: A reference to the file when the array is a whole \
+            memory-mapped `.npy` file, otherwise the array itself.
+    """
+    if not isinstance(array,np.memmap) or not array.filename:
+        return array
+    mapped = _map_array(array.filename)
+    if (mapped.shape,mapped.dtype,mapped.strides,mapped.offset) != \
+            (array.shape,array.dtype,array.strides,array.offset):
+        return array
+    return MappedArray(array.filename)
@@ -0,0 +1,146 @@
+"""
+This module defines the feature schema shared by the training pipeline and the serving path.
+
+The schema records the model's feature columns in order, their dtypes, the target-encoded \
+    categorical columns, the target and the dropped columns, and the names the serving \
+        endpoints use for the source columns whose names are awkward in a request (`Lat`, \
+            `Long`, `Flag `). The transformation stage saves it next to the model artifacts, \
+                and the inference service loads it once and checks it against the model and \
+                    the encoder, so the serving feature order can never drift from training.
+"""
+import os
+import json
+from dataclasses import dataclass, field, asdict
+
+CATEGORICAL_COLUMNS = ['Commodity Code','Item Description','Project Name',
+                       'Greenfield/ Brownfield','Client','Market Sector/Industry',
+                       'Delivery Method','Item Type','coordinates','state','city','suburb']
+TARGET_COLUMN = 'Total'
+DROPPED_COLUMNS = ['Attribute 4']
+SERVING_NAMES = {'Lat':'Latitude','Long':'Longitude','Flag ':'Flag'}
+
+@dataclass
+class FeatureSchema():
+    """
+    Column order, dtypes and roles of the model's features.
+
+    Attributes:
+        columns (list): The feature columns, in model order, under their training names.
+        dtypes (dict): Dtype of every feature column ('category' or a NumPy dtype name).
+        categorical_columns (list): The target-encoded columns.
+        target_column (str): The predicted column.
+        dropped_columns (list): Source columns that are not used by the model.
+        serving_names (dict): Name used by the serving endpoints for a training column, \
+            when it differs.
+        positions (dict): Position of every feature, keyed by its training and its serving \
+            name; derived from `columns`, not saved.
+    """
+    columns:list
+    dtypes:dict
+    categorical_columns:list
+    target_column:str = TARGET_COLUMN
+    dropped_columns:list = field(default_factory=lambda: list(DROPPED_COLUMNS))
+    serving_names:dict = field(default_factory=lambda: dict(SERVING_NAMES))
+    positions:dict = field(init=False,repr=False,compare=False)
+
+    def __post_init__(self):
+        self.positions = {}
+        for position,column in enumerate(self.columns):
+            self.positions[column] = position
+            self.positions[self.serving_names.get(column,column)] = position
+
+    @classmethod
+    def from_frame(cls,feature_df,categorical_columns=None,**kwargs):
+        """
+        Builds the schema of the feature columns of a training frame.
+
+        Args:
+            feature_df (pd.DataFrame): The training features, before encoding, in model order.
+            categorical_columns (list): The target-encoded columns (`CATEGORICAL_COLUMNS` \
+                by default).
+            **kwargs: Overrides of the target column, dropped columns or serving names.
+
+        Returns:
+            FeatureSchema: The schema.
+        """
+        categorical = list(categorical_columns or CATEGORICAL_COLUMNS)
+        columns = [str(column) for column in feature_df.columns]
+        dtypes = {column:'category' if column in categorical else str(feature_df[column].dtype)
+                  for column in columns}
+        return cls(columns=columns,dtypes=dtypes,
+                   categorical_columns=[c for c in columns if c in categorical],**kwargs)
+
+    @property
+    def n_features(self):
+        """int: Number of feature columns."""
+        return len(self.columns)
+
+    @property
+    def serving_columns(self):
+        """list: The feature columns, in model order, under their serving names."""
+        return [self.serving_names.get(column,column) for column in self.columns]
+
+    def serving_name(self,column):
+        """Returns the serving name of a training column."""
+        return self.serving_names.get(column,column)
+
+    def check(self,categorical_columns,n_features=None):
+        """
+        Checks that the encoder and the model were trained on this schema.
+
+        Args:
+            categorical_columns (list): The columns of the fitted target encoder.
+            n_features (int): Number of features the model expects, if known.
+
+        Raises:
+            ValueError: If the encoded columns or the number of features disagree.
+        """
+        if set(categorical_columns) != set(self.categorical_columns):
+            raise ValueError(f"The encoder columns {list(categorical_columns)} do not match the "
+                             f"feature schema {self.categorical_columns}.")
+        if n_features is not None and n_features != self.n_features:
+            raise ValueError(f"The model expects {n_features} features, the feature schema "
+                             f"has {self.n_features}.")
+
+    def align_frame(self,df):
+        """
+        Selects the feature columns of a frame in model order, under their training names.
+
+        Args:
+            df (pd.DataFrame): Rows whose columns use the training or the serving names.
+
+        Returns:
+            pd.DataFrame: The feature columns, in model order.
+        """
+        renames = {self.serving_name(column):column for column in self.columns
+                   if column not in df.columns and self.serving_name(column) in df.columns}
+        return df.rename(columns=renames)[self.columns]
+
+    def save(self,filepath):
+        """
+        Saves the schema as JSON.
+
+        Args:
+            filepath (str): The file to write.
+        """
+        dirpath = os.path.dirname(filepath)
+        if dirpath:
+            os.makedirs(dirpath,exist_ok=True)
+        content = asdict(self)
+        del content['positions']
+        with open(filepath,'w',encoding='utf-8') as f:
+            json.dump(content,f,indent=4)
+
+    @classmethod
+    def load(cls,filepath):
+        """
+        Loads a schema saved with `save`.
+
+        Args:
+            filepath (str): The saved schema.
+
+        Returns:
+            FeatureSchema: The schema.
+        """
+        with open(filepath,'r',encoding='utf-8') as f:
+            return cls(**json.load(f))
@@ -0,0 +1,187 @@
+"""
+This module provides the out-of-fold target encoding shared by all the model searches.
+
+Target encoding the whole training split before cross-validation leaks the target of the \
+    validation rows into their own features. Instead, the training rows are split once into \
+        fixed folds and, for every fold, a target encoder is fitted on the other folds only. \
+            Each fold gets its own copy of the training matrix whose categorical columns are \
+                encoded by that encoder, so its validation rows are encoded out of fold.
+
+The per-fold matrices are computed once by the transformation stage and saved as `.npy` \
+    files. Every model and every candidate of the hyperparameter search reuses them, so \
+        honest cross-validation costs one encoder fit per fold instead of one per CV fit.
+"""
+import os
+import sys
+import json
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from src.exception import CustomException
+from src.components.stage_cache import hash_array,hash_key
+
+FOLD_IDS_FILE = 'fold_ids.npy'
+FOLD_FEATURES_FILE = 'fold_{}_features.npy'
+METADATA_FILE = 'metadata.json'
+
+def kfold_ids(n_rows,n_splits):
+    """
+    Assigns every row to its validation fold like an unshuffled `KFold`.
+
+    The first `n_rows % n_splits` folds get one row more than the others, as in scikit-learn.
+
+    Args:
+        n_rows (int): Number of rows.
+        n_splits (int): Number of folds.
+
+    Returns:
+        np.ndarray: The fold index of every row.
+    """
+    if not 2 <= n_splits <= n_rows:
+        raise ValueError(f"Cannot split {n_rows} rows into {n_splits} folds.")
+    sizes = np.full(n_splits,n_rows//n_splits)
+    sizes[:n_rows % n_splits] += 1
+    return np.repeat(np.arange(n_splits,dtype='int8'),sizes)
+
+@dataclass
+class FoldEncoding():
+    """
+    Out-of-fold target-encoded training matrices, one per cross-validation fold.
+
+    Attributes:
+        fold_ids (np.ndarray): The validation fold of every training row.
+        features (list): One C-contiguous float array of shape (n_rows, n_features) per fold, \
+            whose categorical columns are encoded by an encoder fitted on the other folds.
+        columns (list): Names of the feature columns, in storage order.
+        categorical_columns (list): The target-encoded columns.
+        path (str): Directory the matrices are memory-mapped from, or None when they live \
+            only in memory.
+    """
+    fold_ids:np.ndarray
+    features:list
+    columns:list
+    categorical_columns:list
+    path:Optional[str] = None
+
+    @classmethod
+    def from_frame(cls,feature_df,target,categorical_columns,n_splits=3,dtype='float64'): # pylint: disable=R0913,R0917,R0914
+        """
+        Fits one target encoder per fold and builds the per-fold training matrices.
+
+        Args:
+            feature_df (pd.DataFrame): The training features, with the categorical columns \
+                not encoded yet (object dtype).
+            target (pd.Series): The training target.
+            categorical_columns (list): The columns to target encode.
+            n_splits (int): Number of cross-validation folds.
+            dtype (str): 'float64' or 'float32', the storage type of the features.
+
+        Returns:
+            FoldEncoding: The in-memory fold encoding.
+
+        Raises:
+            CustomException: If an encoder cannot be fitted.
+        """
+        try:
+            import category_encoders as ce # pylint: disable=C0415
+            columns = list(feature_df.columns)
+            positions = [columns.index(column) for column in categorical_columns]
+            base = np.empty((len(feature_df),len(columns)),dtype=dtype,order='C')
+            for i,column in enumerate(columns):
+                if column not in categorical_columns:
+                    base[:,i] = feature_df[column].to_numpy(dtype=dtype)
+            fold_ids = kfold_ids(len(feature_df),n_splits)
+            categories = feature_df[list(categorical_columns)]
+            features = []
+            for fold in range(n_splits):
+                in_fold = fold_ids != fold
+                encoder = ce.TargetEncoder(cols=list(categorical_columns))
+                encoder.fit(categories[in_fold],target[in_fold])
+                fold_features = base.copy(order='C')
+                fold_features[:,positions] = encoder.transform(categories).to_numpy(dtype=dtype)
+                features.append(fold_features)
+            return cls(fold_ids=fold_ids,features=features,columns=columns,
+                       categorical_columns=list(categorical_columns))
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    @property
+    def n_folds(self):
+        """int: Number of folds."""
+        return len(self.features)
+
+    def folds(self):
+        """
+        Returns the training and validation rows of every fold, like `KFold.split`.
+
+        Returns:
+            list: One (train indices, validation indices) tuple per fold.
+        """
+        return [(np.flatnonzero(self.fold_ids != fold),np.flatnonzero(self.fold_ids == fold))
+                for fold in range(self.n_folds)]
+
+    def digest(self):
+        """
+        Hashes the folds and the encoded matrices, for the cache keys of the model searches.
+
+        Returns:
+            str: The hex digest.
+        """
+        return hash_key(hash_array(self.fold_ids),*[hash_array(f) for f in self.features])
+
+    def save(self,directory):
+        """
+        Writes the fold encoding as `.npy` files and returns it reopened memory-mapped.
+
+        Args:
+            directory (str): The directory to write the fold encoding to.
+
+        Returns:
+            FoldEncoding: The fold encoding memory-mapped from `directory`.
+
+        Raises:
+            CustomException: If the fold encoding cannot be written.
+        """
+        try:
+            os.makedirs(directory,exist_ok=True)
+            np.save(os.path.join(directory,FOLD_IDS_FILE),self.fold_ids)
+            for fold,features in enumerate(self.features):
+                np.save(os.path.join(directory,FOLD_FEATURES_FILE.format(fold)),features)
+            with open(os.path.join(directory,METADATA_FILE),'w',encoding='utf-8') as f:
+                json.dump({'columns':self.columns,'categorical_columns':self.categorical_columns,
+                           'n_folds':self.n_folds},f)
+            return FoldEncoding.load(directory)
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    @classmethod
+    def load(cls,directory):
+        """
+        Memory-maps a fold encoding written by `save`.
+
+        Args:
+            directory (str): The directory the fold encoding was saved to.
+
+        Returns:
+            FoldEncoding: The read-only, memory-mapped fold encoding.
+
+        Raises:
+            CustomException: If the fold encoding cannot be read.
+        """
+        try:
+            with open(os.path.join(directory,METADATA_FILE),encoding='utf-8') as f:
+                metadata = json.load(f)
+            return cls(
+                fold_ids=np.load(os.path.join(directory,FOLD_IDS_FILE)),
+                features=[np.load(os.path.join(directory,FOLD_FEATURES_FILE.format(fold)),
+                                  mmap_mode='r') for fold in range(metadata['n_folds'])],
+                columns=metadata['columns'],categorical_columns=metadata['categorical_columns'],
+                path=directory)
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def __reduce__(self):
+        """Pickles a memory-mapped fold encoding as its path, and an in-memory one by value."""
+        if self.path is not None:
+            return (FoldEncoding.load,(self.path,))
+        return (FoldEncoding,(self.fold_ids,self.features,self.columns,self.categorical_columns))
@@ -0,0 +1,445 @@
+"""
+This module provides the hyperparameter search engine used to tune the candidate models.
+
+The search strategy is pluggable (exhaustive grid, randomized, successive halving and \
+    Hyperband). Every model is searched in its own worker process so that the seven model \
+        searches run concurrently, and inside a worker the candidates are cross-validated in \
+            small parallel batches, every candidate fit on a single thread so that models with \
+                their own thread pool do not oversubscribe the cores. Each model search is \
+                    bounded by an optional wall-clock budget and an optional early-stopping \
+                        patience.
+
+When the training features come with a `FoldEncoding`, its fixed folds replace the `cv` \
+    KFold splits and every fold is scored on its out-of-fold target-encoded matrix, so the \
+        cross-validation scores are not inflated by target leakage.
+"""
+import os
+import sys
+import math
+import inspect
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+from src.components.feature_matrix import shareable
+from src.components.stage_cache import hash_array, hash_key
+from src.exception import CustomException
+from src.logger import logging
+
+THREAD_PARAMS = ('n_jobs','thread_count')
+
+@dataclass
+class HyperparameterSearchConfig(): # pylint: disable=R0902
+    """
+    Configuration class for the hyperparameter search engine.
+
+    Attributes:
+        strategy (str): Name of the search strategy, one of `SEARCH_STRATEGIES`.
+        n_jobs (int): Number of CPU cores shared by all the model searches.
+        cv (int): Number of cross-validation folds.
+        n_iter (int): Number of sampled candidates for the random, halving and \
+            Hyperband strategies (capped by the size of the grid).
+        halving_factor (int): Fraction of candidates kept (1/factor) and growth of the \
+            training sample (x factor) between two successive-halving rounds.
+        min_resources (int): Smallest number of training rows used in a halving round.
+        time_budget_s (float): Wall-clock budget of one model search in seconds, checked \
+            between candidate batches. None means unlimited.
+        early_stopping_rounds (int): Stop a model search after this many candidates without \
+            improving the best score. None disables early stopping.
+        random_state (int): Seed for candidate sampling and halving subsamples.
+    """
+    strategy:str = os.environ.get('SEARCH_STRATEGY','grid')
+    n_jobs:int = int(os.environ.get('SEARCH_N_JOBS',str(os.cpu_count() or 1)))
+    cv:int = 3
+    n_iter:int = 60
+    halving_factor:int = 3
+    min_resources:int = 100
+    time_budget_s:float = None
+    early_stopping_rounds:int = None
+    random_state:int = 0
+
+@dataclass
+class SearchResult(): # pylint: disable=R0902
+    """
+    Outcome of the hyperparameter search of one model.
+
+    Attributes:
+        best_params (dict): Parameters of the best candidate.
+        best_score (float): Mean cross-validated R2 score of the best candidate.
+        best_estimator: The best candidate refit on the whole training set.
+        n_candidates (int): Number of candidate evaluations performed.
+        search_s (float): Wall time of the candidate evaluations in seconds.
+        refit_s (float): Wall time of the refit of the best candidate in seconds.
+        stopped_reason (str): Why the search ended ('completed', 'time_budget' or \
+            'early_stopping').
+        history (list): Parameters, score and training rows of every evaluation.
+    """
+    best_params:dict
+    best_score:float
+    best_estimator:object = None
+    n_candidates:int = 0
+    search_s:float = 0.0
+    refit_s:float = 0.0
+    stopped_reason:str = 'completed'
+    history:list = field(default_factory=list)
+
+def with_threads(estimator,n_threads):
+    """
+    Clones an estimator limited to a number of threads.
+
+    The cores of a search worker are already shared by the candidates it cross-validates \
+        concurrently, so models with their own thread pool (`n_jobs` of XGBoost and \
+            scikit-learn, `thread_count` of CatBoost) must not also use every core.
+
+    Args:
+        estimator: The unfitted estimator.
+        n_threads (int): Number of threads the clone may use.
+
+    Returns:
+        The unfitted clone.
+    """
+    names = set(estimator.get_params()) | set(inspect.signature(type(estimator)).parameters)
+    return clone(estimator).set_params(**{name:n_threads for name in THREAD_PARAMS
+                                          if name in names})
+
+class SearchStopped(Exception):
+    """Raised inside a model search when its time budget or patience is exhausted."""
+
+class ModelSearch(): # pylint: disable=R0902
+    """
+    Cross-validated evaluation of the candidates of one model.
+
+    It keeps track of the best candidate seen so far and enforces the time budget and the \
+        early-stopping patience of the search.
+
+    Attributes:
+        estimator: The unfitted estimator whose parameters are searched.
+        config (HyperparameterSearchConfig): The search configuration.
+        folds (list): The training and validation rows of every fold.
+        fold_x (list): The features every fold is scored on: the out-of-fold encoded matrix \
+            of the fold with a `FoldEncoding`, else `x` itself.
+    """
+    def __init__(self,estimator,x,y,config,n_threads=1,fold_encoding=None): # pylint: disable=R0913,R0917
+        self.estimator = estimator
+        self.config = config
+        self.x = x
+        self.y = y
+        self.n_threads = max(1,n_threads)
+        if fold_encoding is None:
+            self.folds = list(KFold(n_splits=config.cv).split(x))
+            self.fold_x = [x]*len(self.folds)
+        else:
+            if len(fold_encoding.fold_ids) != len(y):
+                raise ValueError(f"The fold encoding has {len(fold_encoding.fold_ids)} rows, "
+                                 f"the training set {len(y)}.")
+            self.folds = fold_encoding.folds()
+            self.fold_x = fold_encoding.features
+        self.started = time.perf_counter()
+        self.best_params = None
+        self.best_score = -np.inf
+        self.n_candidates = 0
+        self.since_improvement = 0
+        self.history = []
+        self.stopped_reason = None
+
+    def _score_candidate(self,params,n_samples):
+        """
+        Cross-validates one candidate, optionally on a subsample of every training fold.
+
+        Args:
+            params (dict): The candidate parameters.
+            n_samples (int): Number of training rows per fold, or None for all of them.
+
+        Returns:
+            float: The mean R2 score over the folds, or NaN if a fit failed.
+        """
+        scores = []
+        rng = np.random.default_rng(self.config.random_state)
+        for x,(train_idx,val_idx) in zip(self.fold_x,self.folds):
+            if n_samples is not None and n_samples < len(train_idx):
+                train_idx = np.sort(rng.choice(train_idx,n_samples,replace=False))
+            try:
+                model = with_threads(self.estimator,1).set_params(**params)
+                model.fit(x[train_idx],self.y[train_idx])
+                scores.append(r2_score(self.y[val_idx],model.predict(x[val_idx])))
+            except Exception as e: # pylint: disable=W0718
+                logging.info(f"Fit failed for {type(self.estimator).__name__} {params}: {e}")
+                return np.nan
+        return float(np.mean(scores))
+
+    def evaluate(self,candidates,n_samples=None,track_best=True):
+        """
+        Evaluates candidates in parallel batches while enforcing budget and patience.
+
+        Args:
+            candidates (list): The candidate parameter dictionaries.
+            n_samples (int): Number of training rows per fold, or None for all of them.
+            track_best (bool): Whether the scores count towards the best candidate and \
+                the early-stopping patience (False for partial-resource halving rounds).
+
+        Returns:
+            list: One score per evaluated candidate; shorter than `candidates` if the search \
+                was stopped.
+
+        Raises:
+            SearchStopped: If the time budget or the patience was exhausted before any \
+                candidate of this call could be evaluated.
+        """
+        scores = []
+        with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            for start in range(0,len(candidates),self.n_threads):
+                reason = self.stop_reason()
+                if reason is not None:
+                    self.stopped_reason = reason
+                    if not scores:
+                        raise SearchStopped(reason)
+                    break
+                batch = candidates[start:start + self.n_threads]
+                batch_scores = list(pool.map(lambda p: self._score_candidate(p,n_samples),batch))
+                for params,score in zip(batch,batch_scores):
+                    self.n_candidates += 1
+                    self.history.append({'params':params,'score':score,'n_samples':n_samples})
+                    if track_best:
+                        self._track(params,score)
+                scores.extend(batch_scores)
+        return scores
+
+    def _track(self,params,score):
+        """Updates the best candidate and the early-stopping counter."""
+        if not np.isnan(score) and score > self.best_score:
+            self.best_score = score
+            self.best_params = params
+            self.since_improvement = 0
+        else:
+            self.since_improvement += 1
+
+    def stop_reason(self):
+        """
+        Returns why the search must stop, if it must.
+
+        Returns:
+            str: 'time_budget' or 'early_stopping', or None if the search may continue.
+        """
+        budget = self.config.time_budget_s
+        if budget is not None and time.perf_counter() - self.started > budget:
+            return 'time_budget'
+        patience = self.config.early_stopping_rounds
+        if patience is not None and self.best_params is not None \
+                and self.since_improvement >= patience:
+            return 'early_stopping'
+        return None
+
+def _sample_candidates(params,config):
+    """
+    Draws the candidates of the sampling-based strategies.
+
+    Args:
+        params (dict): The parameter grid.
+        config (HyperparameterSearchConfig): The search configuration.
+
+    Returns:
+        list: At most `config.n_iter` distinct candidates from the grid.
+    """
+    grid = ParameterGrid(params)
+    if len(grid) <= config.n_iter:
+        return list(grid)
+    return list(ParameterSampler(params,n_iter=config.n_iter,random_state=config.random_state))
+
+def grid_search(search,params):
+    """Exhaustive strategy: evaluates every point of the grid."""
+    search.evaluate(list(ParameterGrid(params)))
+
+def random_search(search,params):
+    """Randomized strategy: evaluates `n_iter` candidates sampled from the grid."""
+    search.evaluate(_sample_candidates(params,search.config))
+
+def _successive_halving(search,candidates,min_resources):
+    """
+    Runs one successive-halving bracket.
+
+    The candidates are cross-validated on a growing subsample of the training folds; after \
+        each round only the best 1/factor of them survive. The last round uses all the rows \
+            and is the only one that competes for the best candidate.
+
+    Args:
+        search (ModelSearch): The model search the bracket belongs to.
+        candidates (list): The candidates entering the bracket.
+        min_resources (int): Training rows per fold in the first round.
+    """
+    factor = search.config.halving_factor
+    max_resources = min(len(train_idx) for train_idx,_ in search.folds)
+    n_samples = min(max(min_resources,1),max_resources)
+    while len(candidates) > 1 and n_samples < max_resources:
+        scores = search.evaluate(candidates,n_samples=n_samples,track_best=False)
+        ranked = sorted(zip(scores,range(len(scores))),
+                        key=lambda item: -np.inf if np.isnan(item[0]) else item[0],reverse=True)
+        keep = max(1,math.ceil(len(candidates)/factor))
+        candidates = [candidates[i] for _,i in ranked[:keep]]
+        n_samples *= factor
+    search.evaluate(candidates)
+
+def halving_search(search,params):
+    """Successive-halving strategy over `n_iter` sampled candidates."""
+    candidates = _sample_candidates(params,search.config)
+    _successive_halving(search,candidates,search.config.min_resources)
+
+def hyperband_search(search,params):
+    """
+    Hyperband strategy: successive-halving brackets trading candidates for resources.
+
+    Aggressive brackets start many candidates on few rows, conservative ones start few \
+        candidates on all the rows; the best candidate over all brackets wins.
+    """
+    config = search.config
+    factor = config.halving_factor
+    max_resources = min(len(train_idx) for train_idx,_ in search.folds)
+    s_max = max(0,int(math.log(max(max_resources/max(config.min_resources,1),1),factor)))
+    pool = _sample_candidates(params,config)
+    rng = np.random.default_rng(config.random_state)
+    for s in range(s_max,-1,-1):
+        n_candidates = min(len(pool),math.ceil((s_max + 1)/(s + 1)*factor**s))
+        chosen = rng.choice(len(pool),n_candidates,replace=False)
+        _successive_halving(search,[pool[i] for i in chosen],int(max_resources/factor**s))
+
+SEARCH_STRATEGIES = {
+    'grid':grid_search,
+    'random':random_search,
+    'halving':halving_search,
+    'hyperband':hyperband_search
+}
+
+def search_model(name,estimator,params,x,y,config,n_threads=1,fold_encoding=None): # pylint: disable=R0913,R0917,R0914
+    """
+    Searches the hyperparameters of one model and refits the best candidate.
+
+    Args:
+        name (str): Name of the model, for logging.
+        estimator: The unfitted estimator.
+        params (dict): The parameter grid of the model.
+        x (np.ndarray): The training features.
+        y (np.ndarray): The training target.
+        config (HyperparameterSearchConfig): The search configuration.
+        n_threads (int): Number of candidates cross-validated concurrently, each fit on \
+            one thread, and number of threads of the refit of the best candidate.
+        fold_encoding (FoldEncoding): Optional out-of-fold encoded matrices the candidates \
+            are cross-validated on; the best candidate is still refit on `x`.
+
+    Returns:
+        SearchResult: The outcome of the search.
+    """
+    try:
+        strategy = SEARCH_STRATEGIES[config.strategy]
+        search = ModelSearch(estimator,x,y,config,n_threads=n_threads,fold_encoding=fold_encoding)
+        logging.info(f"{config.strategy} search initiated for {name}.")
+        try:
+            strategy(search,params)
+        except SearchStopped:
+            pass
+        stopped_reason = search.stopped_reason or 'completed'
+        if search.best_params is None:
+            raise ValueError(f"No candidate of {name} could be fit.")
+        search_s = time.perf_counter() - search.started
+        logging.info(f"Search for {name} {stopped_reason} after {search.n_candidates} "
+                     f"candidates in {search_s:.1f}s with CV score {search.best_score}.")
+        refit_started = time.perf_counter()
+        best_estimator = with_threads(estimator,n_threads).set_params(**search.best_params)
+        best_estimator.fit(x,y)
+        refit_s = time.perf_counter() - refit_started
+        return SearchResult(
+            best_params=search.best_params,best_score=search.best_score,
+            best_estimator=best_estimator,n_candidates=search.n_candidates,
+            search_s=search_s,refit_s=refit_s,stopped_reason=stopped_reason,history=search.history)
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def search_cache_key(name,estimator,params,data_key,config):
+    """
+    Builds the stage-cache key of the search of one model.
+
+    The key covers the training data, the model and its grid, and every search setting \
+        that can change the outcome; `n_jobs` only changes the speed and is left out.
+
+    Args:
+        name (str): Name of the model.
+        estimator: The unfitted estimator.
+        params (dict): The parameter grid of the model.
+        data_key (str): Hash of the training features and target.
+        config (HyperparameterSearchConfig): The search configuration.
+
+    Returns:
+        str: The cache key.
+    """
+    settings = {k:v for k,v in asdict(config).items() if k != 'n_jobs'}
+    return hash_key(data_key,name,type(estimator).__name__,estimator.get_params(),params,settings)
+
+def run_model_searches(models,params,x,y,config=None,cache=None,fold_encoding=None): # pylint: disable=R0913,R0917,R0914
+    """
+    Searches all the models concurrently across a process pool.
+
+    The cores in `config.n_jobs` are split between the models: one worker process per model \
+        (up to `n_jobs`), each cross-validating its candidates on its share of the cores. \
+            With a stage cache, models whose data, grid and settings are unchanged are not \
+                searched again. Memory-mapped training arrays are sent to the workers by \
+                    path, so every worker maps the same file instead of receiving a copy.
+
+    Args:
+        models (dict): The unfitted estimators keyed by model name.
+        params (dict): The parameter grids keyed by model name.
+        x (np.ndarray): The training features.
+        y (np.ndarray): The training target.
+        config (HyperparameterSearchConfig): The search configuration.
+        cache (StageCache): Optional cache of previous search results.
+        fold_encoding (FoldEncoding): Optional out-of-fold encoded matrices of the training \
+            rows, shared by every model search (memory-mapped ones are sent by path).
+
+    Returns:
+        dict: The `SearchResult` of every model, keyed by model name.
+
+    Raises:
+        CustomException: If the strategy is unknown or a search fails.
+    """
+    try:
+        config = config or HyperparameterSearchConfig()
+        if config.strategy not in SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown search strategy {config.strategy!r}, "
+                             f"expected one of {sorted(SEARCH_STRATEGIES)}.")
+        results = {}
+        keys = {}
+        if cache is not None:
+            data_key = hash_key(hash_array(x),hash_array(y))
+            if fold_encoding is not None:
+                data_key = hash_key(data_key,fold_encoding.digest())
+            for name,model in models.items():
+                keys[name] = search_cache_key(name,model,params[name],data_key,config)
+                hit,result = cache.get('model_search',keys[name])
+                if hit:
+                    logging.info(f"Reusing the cached search result of {name}.")
+                    results[name] = result
+        pending = {name:model for name,model in models.items() if name not in results}
+        if pending:
+            n_workers = max(1,min(config.n_jobs,len(pending)))
+            n_threads = max(1,config.n_jobs//n_workers)
+            if n_workers == 1:
+                searched = {name:search_model(name,model,params[name],x,y,config,n_threads,
+                                              fold_encoding)
+                            for name,model in pending.items()}
+            else:
+                context = multiprocessing.get_context('spawn')
+                shared_x,shared_y = shareable(x),shareable(y)
+                with ProcessPoolExecutor(max_workers=n_workers,mp_context=context) as executor:
+                    futures = {name:executor.submit(search_model,name,model,params[name],
+                                                    shared_x,shared_y,config,n_threads,
+                                                    fold_encoding)
+                               for name,model in pending.items()}
+                    searched = {name:future.result() for name,future in futures.items()}
+            for name,result in searched.items():
+                results[name] = result
+                if cache is not None:
+                    cache.put('model_search',keys[name],result)
+        return {name:results[name] for name in models}
+    except Exception as e:
+        raise CustomException(e,sys) from e
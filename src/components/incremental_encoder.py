@@ -0,0 +1,151 @@
+"""
+This module keeps the sufficient statistics of the target encoding so that the fitted \
+    `category_encoders.TargetEncoder` can be updated incrementally with new project rows.
+
+The target encoding of a category only depends on the number of rows and the sum of the \
+    target for that category, plus the global mean of the target. Keeping those counts \
+        makes it possible to fold in a delta of new rows and rewrite the encoder mappings \
+            without re-reading the training history.
+"""
+import sys
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from scipy.special import expit # pylint: disable=E0611
+from src.exception import CustomException
+
+MISSING = '__missing__'
+
+@dataclass
+class TargetEncodingStatistics():
+    """
+    Per-category row counts and target sums of the target-encoded columns.
+
+    Attributes:
+        cols (list): The target-encoded columns.
+        counts (dict): Number of rows per category, keyed by column then category.
+        sums (dict): Sum of the target per category, keyed by column then category.
+        n_rows (int): Total number of rows seen.
+        target_sum (float): Total of the target over all the rows seen.
+    """
+    cols:list
+    counts:dict = field(default_factory=dict)
+    sums:dict = field(default_factory=dict)
+    n_rows:int = 0
+    target_sum:float = 0.0
+
+    @classmethod
+    def from_frame(cls,x,y,cols):
+        """
+        Builds the statistics from a full training frame.
+
+        Args:
+            x (pd.DataFrame): The training rows, containing at least `cols`.
+            y (pd.Series): The target of the training rows.
+            cols (list): The target-encoded columns.
+
+        Returns:
+            TargetEncodingStatistics: The statistics of the training rows.
+        """
+        stats = cls(cols=list(cols),counts={c:{} for c in cols},sums={c:{} for c in cols})
+        stats.update(x,y)
+        return stats
+
+    def update(self,x,y):
+        """
+        Folds a batch of new rows into the statistics.
+
+        Args:
+            x (pd.DataFrame): The new rows, containing at least the encoded columns.
+            y (pd.Series): The target of the new rows.
+        """
+        y = pd.Series(np.asarray(y,dtype=float),index=x.index)
+        self.n_rows += len(y)
+        self.target_sum += float(y.sum())
+        for col in self.cols:
+            keys = x[col].astype('object').where(x[col].notna(),MISSING)
+            grouped = y.groupby(keys).agg(['count','sum'])
+            counts = self.counts.setdefault(col,{})
+            sums = self.sums.setdefault(col,{})
+            for category,count,total in zip(grouped.index,grouped['count'],grouped['sum']):
+                counts[category] = counts.get(category,0) + int(count)
+                sums[category] = sums.get(category,0.0) + float(total)
+
+    @property
+    def prior(self):
+        """float: Global mean of the target over all the rows seen."""
+        return self.target_sum/self.n_rows
+
+    def apply_to(self,target_encoder):
+        """
+        Rewrites the mappings of a fitted `TargetEncoder` from the current statistics.
+
+        Known categories keep their ordinal index, new categories are appended after the \
+            existing ones, and every encoded value is recomputed with the encoder's own \
+                smoothing so the result matches a fresh fit on all the rows seen.
+
+        Args:
+            target_encoder (ce.TargetEncoder): The fitted encoder to update in place.
+
+        Returns:
+            ce.TargetEncoder: The updated encoder.
+
+        Raises:
+            CustomException: If the encoder does not match the statistics.
+        """
+        try:
+            prior = self.prior
+            ordinal_mapping = []
+            for switch in target_encoder.ordinal_encoder.mapping:
+                col = switch['col']
+                indices = {MISSING if pd.isna(k) else k:int(v) for k,v in switch['mapping'].items()}
+                next_index = max((v for v in indices.values() if v > 0),default=0) + 1
+                for category in self.counts[col]:
+                    if indices.get(category,-2) < 0:
+                        indices[category] = next_index
+                        next_index += 1
+                if MISSING not in indices:
+                    indices[MISSING] = -2
+                ordinal_mapping.append({
+                    'col':col,
+                    'mapping':pd.Series(
+                        data=list(indices.values()),
+                        index=[np.nan if k == MISSING else k for k in indices]),
+                    'data_type':switch.get('data_type')
+                })
+                target_encoder.mapping[col] = self._smoothed_mapping(
+                    target_encoder,col,indices,prior)
+            target_encoder.ordinal_encoder.mapping = ordinal_mapping
+            target_encoder._mean = prior # pylint: disable=W0212
+            return target_encoder
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def _smoothed_mapping(self,target_encoder,col,indices,prior):
+        """
+        Computes the ordinal index to encoded value mapping of one column.
+
+        Args:
+            target_encoder (ce.TargetEncoder): The encoder whose smoothing is reproduced.
+            col (str): The column.
+            indices (dict): Ordinal index of every category of the column.
+            prior (float): Global mean of the target.
+
+        Returns:
+            pd.Series: The encoded value of every ordinal index, including the unknown (-1) \
+                and missing (-2) entries.
+        """
+        categories = list(self.counts[col])
+        counts = np.array([self.counts[col][c] for c in categories],dtype=float)
+        means = np.array([self.sums[col][c] for c in categories])/counts
+        smoove = expit((counts - target_encoder.min_samples_leaf)/target_encoder.smoothing)
+        values = prior*(1 - smoove) + means*smoove
+        mapping = pd.Series(data=values,index=[indices[c] for c in categories])
+        unknown = np.nan if target_encoder.handle_unknown == 'return_nan' else prior
+        if target_encoder.handle_unknown in ('return_nan','value'):
+            mapping.loc[-1] = unknown
+        if target_encoder.handle_missing == 'return_nan':
+            mapping.loc[indices[MISSING]] = np.nan
+        elif target_encoder.handle_missing == 'value' and indices[MISSING] == -2:
+            mapping.loc[-2] = prior
+        return mapping
@@ -0,0 +1,133 @@
+"""
+This module saves serving artifacts as `dill` pickles whose large NumPy arrays live in \
+    `.npy` files next to them, so that they can be memory-mapped read-only when loaded.
+
+A memory-mapped array is backed by the page cache instead of the private memory of the \
+    process: every serving worker mapping the same file shares one physical copy of it, \
+        including the workers forked by the pre-fork launcher and a worker that hot-reloads \
+            the artifacts after the fork.
+
+The arrays of one save are written to `<artifact>.arrays/` under a fresh prefix and the pickle \
+    is replaced last, atomically. Array files are never rewritten in place: the files of the \
+        previous save are kept until the next save, so a process that opened the previous \
+            pickle just before the replace can still load its arrays, and only the files of \
+                older saves are unlinked. Pickles without externalized arrays load like any \
+                    other `dill` pickle.
+"""
+import os
+import sys
+import uuid
+import tempfile
+import dill
+import numpy as np
+from src.exception import CustomException
+
+ARRAYS_SUFFIX = '.arrays'
+PREFIX_FILE = 'PREFIX'
+MIN_MAPPED_BYTES = 4096
+
+def arrays_dir(filepath):
+    """Returns the directory holding the externalized arrays of a pickle."""
+    return filepath + ARRAYS_SUFFIX
+
+def _read_prefix(directory):
+    """Returns the array prefix of the last save into a directory, or None if unknown."""
+    try:
+        with open(os.path.join(directory,PREFIX_FILE),encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _write_prefix(directory,prefix):
+    """Atomically records the array prefix of the last save into a directory."""
+    fd,tmp_path = tempfile.mkstemp(dir=directory,suffix='.tmp')
+    with os.fdopen(fd,'w',encoding='utf-8') as f:
+        f.write(prefix)
+    os.replace(tmp_path,os.path.join(directory,PREFIX_FILE))
+
+class _ArrayPickler(dill.Pickler):
+    """Pickler writing every large plain NumPy array to its own `.npy` file."""
+    def __init__(self,file,directory,prefix,min_bytes):
+        super().__init__(file)
+        self.directory = directory
+        self.prefix = prefix
+        self.min_bytes = min_bytes
+        self.n_arrays = 0
+
+    def persistent_id(self,obj):
+        if type(obj) not in (np.ndarray,np.memmap) or obj.dtype.hasobject \
+                or obj.nbytes < self.min_bytes:
+            return None
+        name = f"{self.prefix}-{self.n_arrays:04d}.npy"
+        np.save(os.path.join(self.directory,name),np.ascontiguousarray(obj))
+        self.n_arrays += 1
+        return ('npy',name)
+
+class _ArrayUnpickler(dill.Unpickler):
+    """Unpickler loading the externalized arrays, memory-mapped when `mmap_mode` is set."""
+    def __init__(self,file,directory,mmap_mode):
+        super().__init__(file)
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+
+    def persistent_load(self,pid):
+        kind,name = pid
+        if kind != 'npy':
+            raise dill.UnpicklingError(f"Unsupported persistent id {pid!r}.")
+        return np.load(os.path.join(self.directory,name),mmap_mode=self.mmap_mode)
+
+def save_mapped_object(filepath,obj,min_bytes=MIN_MAPPED_BYTES):
+    """
+    Saves a Python object with `dill`, writing its large NumPy arrays as `.npy` files.
+
+    Args:
+        filepath (str): The path where the object will be saved.
+        obj: The Python object to be saved.
+        min_bytes (int): Size from which an array is written to its own file.
+
+    Returns:
+        int: The number of externalized arrays.
+
+    Raises:
+        CustomException: If the object or its arrays cannot be written.
+    """
+    try:
+        directory = arrays_dir(filepath)
+        os.makedirs(directory,exist_ok=True)
+        previous = _read_prefix(directory)
+        prefix = uuid.uuid4().hex[:12]
+        fd,tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or '.',suffix='.tmp')
+        with os.fdopen(fd,'wb') as f:
+            pickler = _ArrayPickler(f,directory,prefix,min_bytes)
+            pickler.dump(obj)
+        os.chmod(tmp_path,0o644)
+        os.replace(tmp_path,filepath)
+        _write_prefix(directory,prefix)
+        if previous is not None:
+            for name in os.listdir(directory):
+                if name.endswith('.npy') and not name.startswith((prefix,previous)):
+                    os.remove(os.path.join(directory,name))
+        return pickler.n_arrays
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def load_mapped_object(filepath,mmap_mode='r'):
+    """
+    Loads a Python object saved with `save_mapped_object` (or a plain `dill` pickle).
+
+    Args:
+        filepath (str): The path of the saved object.
+        mmap_mode (str): `np.load` mode of the externalized arrays; 'r' maps them read-only \
+            and None reads them into private memory.
+
+    Returns:
+        The loaded object.
+
+    Raises:
+        CustomException: If the object or one of its arrays cannot be read.
+    """
+    try:
+        with open(filepath,'rb') as f:
+            return _ArrayUnpickler(f,arrays_dir(filepath),mmap_mode).load()
+    except Exception as e:
+        raise CustomException(e,sys) from e
@@ -0,0 +1,335 @@
+"""
+This module provides a local registry of immutable, versioned model artifacts.
+
+Every training run publishes the model, the compiled model, the encoder, its lookup tables, \
+    the feature schema and the metric reports together into a new directory \
+        `versions/<version>/`, which is never modified afterwards. The version being served is \
+            named by the pointer file `CURRENT`, which is replaced atomically, so a reader sees \
+                either the old or the new version and never a half-written artifact.
+
+The inference service watches the pointer: promoting a version, or rolling back to the one \
+    it replaced, switches the serving processes over without a restart, and requests in \
+        flight finish on the snapshot they started with. Every promotion is appended to \
+            `history.jsonl`, and the cold load time of every artifact is recorded in the \
+                `manifest.json` of its version when it is published.
+
+Manage the registry with `python -m src.components.model_registry list|publish|promote|rollback`.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import dill
+from src.exception import CustomException
+from src.logger import logging
+from src.components.stage_cache import hash_file,hash_key
+from src.components.mapped_pickle import arrays_dir,load_mapped_object
+
+VERSIONS_DIR = 'versions'
+CURRENT_FILE = 'CURRENT'
+HISTORY_FILE = 'history.jsonl'
+MANIFEST_FILE = 'manifest.json'
+REQUIRED_FILES = ('best_model.pkl','categorical_encoder.pkl','feature_schema.json')
+MODEL_FILES = REQUIRED_FILES + (
+    'compiled_model.pkl','compiled_model_report.json','encoding_table.pkl',
+    'target_encoding_stats.pkl','train_model_report_score.json','train_model_report_mae.json',
+    'train_model_report_mse.json','test_model_report_score.json','test_model_report_mae.json',
+    'test_model_report_mse.json','training_time_report.json','incremental_training_report.json',
+    'model_selection_report.json')
+
+@dataclass
+class ModelRegistryConfig():
+    """
+    Configuration class for the model registry.
+
+    Attributes:
+        registry_dir (str): Directory holding the versions, the pointer and the history.
+        keep_versions (int): Number of most recent versions kept when a new one is published \
+            (0 keeps them all); the current version and the one it replaced are always kept.
+        auto_promote (bool): Whether the training pipeline serves the version it publishes \
+            right away.
+    """
+    registry_dir:str = os.environ.get('MODEL_REGISTRY_DIR',os.path.join('src/models','registry'))
+    keep_versions:int = int(os.environ.get('MODEL_REGISTRY_KEEP','10'))
+    auto_promote:bool = os.environ.get('MODEL_AUTO_PROMOTE','1') != '0'
+
+def _write_json_atomically(path,obj):
+    """Replaces a JSON file without exposing a partially written file."""
+    fd,tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),suffix='.tmp')
+    with os.fdopen(fd,'w',encoding='utf-8') as f:
+        json.dump(obj,f,indent=4)
+    os.chmod(tmp_path,0o644)
+    os.replace(tmp_path,path)
+
+def _load_seconds(path):
+    """Times the deserialization of one pickled artifact."""
+    started = time.perf_counter()
+    if os.path.isdir(arrays_dir(path)):
+        load_mapped_object(path,mmap_mode=None)
+    else:
+        with open(path,'rb') as f:
+            dill.load(f)
+    return time.perf_counter() - started
+
+class ModelRegistry():
+    """
+    Versioned store of model artifacts with an atomically switched current version.
+
+    Attributes:
+        model_registry_config (ModelRegistryConfig): Configuration object holding the \
+            registry directory and the retention.
+    """
+    def __init__(self,config=None):
+        self.model_registry_config = config or ModelRegistryConfig()
+
+    def version_dir(self,version):
+        """Returns the directory of a version."""
+        return os.path.join(self.model_registry_config.registry_dir,VERSIONS_DIR,version)
+
+    def _path(self,name):
+        """Returns the path of a file at the top of the registry."""
+        return os.path.join(self.model_registry_config.registry_dir,name)
+
+    def current(self):
+        """
+        Reads the pointer to the version being served.
+
+        Returns:
+            dict: The current version, the version it replaced, and when and how it was \
+                promoted; None when no version was promoted yet.
+        """
+        try:
+            with open(self._path(CURRENT_FILE),encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def current_version(self):
+        """
+        Returns the version being served.
+
+        Returns:
+            str: The current version, or None when no version was promoted yet.
+        """
+        pointer = self.current()
+        return pointer['version'] if pointer else None
+
+    def manifest(self,version):
+        """
+        Reads the manifest of a version.
+
+        Args:
+            version (str): The version.
+
+        Returns:
+            dict: The files, metrics and load times recorded when the version was published.
+
+        Raises:
+            ValueError: If the version does not exist.
+        """
+        path = os.path.join(self.version_dir(version),MANIFEST_FILE)
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown model version {version!r}.")
+        with open(path,encoding='utf-8') as f:
+            return json.load(f)
+
+    def versions(self):
+        """
+        Lists the published versions, oldest first.
+
+        Returns:
+            list: The version names.
+        """
+        directory = self._path(VERSIONS_DIR)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory)
+                      if os.path.exists(os.path.join(directory,name,MANIFEST_FILE)))
+
+    def history(self):
+        """
+        Reads the promotion history.
+
+        Returns:
+            list: One record per promotion or rollback, oldest first.
+        """
+        if not os.path.exists(self._path(HISTORY_FILE)):
+            return []
+        with open(self._path(HISTORY_FILE),encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def publish(self,files,metrics=None,source='training'): # pylint: disable=R0914
+        """
+        Copies a set of artifact files into a new immutable version.
+
+        The version is assembled in a temporary directory and renamed into place, so it \
+            appears complete or not at all. Missing optional files are skipped.
+
+        Args:
+            files (list): Paths of the artifact files; memory-mapped arrays saved next to a \
+                pickle are copied with it.
+            metrics (dict): Scores of the model, recorded in the manifest.
+            source (str): What produced the version, for example 'training' or 'incremental'.
+
+        Returns:
+            str: The new version.
+
+        Raises:
+            CustomException: If a required file is missing or the version cannot be written.
+        """
+        try:
+            present = [path for path in files if os.path.exists(path)]
+            names = {os.path.basename(path) for path in present}
+            missing = [name for name in REQUIRED_FILES if name not in names]
+            if missing:
+                raise ValueError(f"Cannot publish a model version without {missing}.")
+            versions_dir = self._path(VERSIONS_DIR)
+            os.makedirs(versions_dir,exist_ok=True)
+            staging = tempfile.mkdtemp(dir=versions_dir,prefix='.publish-')
+            digests = {}
+            for path in present:
+                name = os.path.basename(path)
+                shutil.copy2(path,os.path.join(staging,name))
+                if os.path.isdir(arrays_dir(path)):
+                    shutil.copytree(arrays_dir(path),arrays_dir(os.path.join(staging,name)))
+                digests[name] = hash_file(path)
+            load_seconds = {name:_load_seconds(os.path.join(staging,name))
+                            for name in sorted(names) if name.endswith('.pkl')}
+            created = datetime.now(timezone.utc)
+            version = f"{created:%Y%m%dT%H%M%S%fZ}-{hash_key(digests)[:8]}"
+            with open(os.path.join(staging,MANIFEST_FILE),'w',encoding='utf-8') as f:
+                json.dump({'version':version,'created_at':created.isoformat(timespec='seconds'),
+                           'source':source,'files':digests,'metrics':metrics or {},
+                           'load_seconds':load_seconds},f,indent=4)
+            os.chmod(staging,0o755)
+            os.rename(staging,self.version_dir(version))
+            logging.info(f"Published model version {version} ({source}); cold load times "
+                         f"{load_seconds}.")
+            self.prune(protect=version)
+            return version
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def promote(self,version,action='promote'):
+        """
+        Makes a version the one being served by replacing the pointer atomically.
+
+        Args:
+            version (str): The version to serve.
+            action (str): 'promote' or 'rollback', recorded in the history.
+
+        Returns:
+            dict: The new pointer.
+
+        Raises:
+            CustomException: If the version does not exist.
+        """
+        try:
+            self.manifest(version)
+            previous = self.current_version()
+            pointer = {'version':version,'previous':previous,'action':action,
+                       'promoted_at':datetime.now(timezone.utc).isoformat(timespec='seconds')}
+            if action == 'rollback':
+                promotions = [record for record in self.history()
+                              if record['version'] == version]
+                pointer['previous'] = promotions[-1]['previous'] if promotions else None
+            _write_json_atomically(self._path(CURRENT_FILE),pointer)
+            with open(self._path(HISTORY_FILE),'a',encoding='utf-8') as f:
+                f.write(json.dumps({**pointer,'replaced':previous}) + '\n')
+            logging.info(f"Model version {version} is now current ({action}, replacing "
+                         f"{previous}).")
+            return pointer
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def rollback(self,version=None):
+        """
+        Serves again the version the current one replaced, or a given older version.
+
+        Rolling back repeatedly walks further back through the promotions.
+
+        Args:
+            version (str): The version to roll back to; by default the one the current \
+                version replaced.
+
+        Returns:
+            dict: The new pointer.
+
+        Raises:
+            CustomException: If there is no version to roll back to.
+        """
+        try:
+            target = version or (self.current() or {}).get('previous')
+            if target is None:
+                raise ValueError("There is no previous model version to roll back to.")
+            return self.promote(target,action='rollback')
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def prune(self,protect=None):
+        """
+        Deletes the oldest versions beyond `keep_versions` (none when it is 0 or less), keeping \
+            the current version and the one it replaced.
+
+        Args:
+            protect (str): A version to keep as well, such as the one just published and not \
+                promoted yet.
+
+        Returns:
+            list: The deleted versions.
+        """
+        keep = self.model_registry_config.keep_versions
+        if keep <= 0:
+            return []
+        pointer = self.current() or {}
+        protected = {pointer.get('version'),pointer.get('previous'),protect}
+        stale = [version for version in self.versions()[:-keep]
+                 if version not in protected]
+        for version in stale:
+            shutil.rmtree(self.version_dir(version),ignore_errors=True)
+        return stale
+
+def parse_args(argv):
+    """Parses the command-line arguments."""
+    parser = argparse.ArgumentParser(description='Manage the versions of the model registry.')
+    commands = parser.add_subparsers(dest='command',required=True)
+    commands.add_parser('list',help='List the versions and the current one.')
+    publish = commands.add_parser('publish',help='Publish the artifacts of a model directory.')
+    publish.add_argument('--source-dir',default='src/models',
+                         help='Directory of the artifacts (default src/models).')
+    publish.add_argument('--promote',action='store_true',help='Also serve the new version.')
+    promote = commands.add_parser('promote',help='Serve a version.')
+    promote.add_argument('version')
+    rollback = commands.add_parser('rollback',help='Serve the previous version again.')
+    rollback.add_argument('version',nargs='?',help='Version to roll back to.')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Command-line entry point of the model registry."""
+    args = parse_args(argv)
+    registry = ModelRegistry()
+    if args.command == 'list':
+        current = registry.current_version()
+        for version in registry.versions():
+            manifest = registry.manifest(version)
+            load_seconds = sum(manifest['load_seconds'].values())
+            print(f"{'*' if version == current else ' '} {version}  {manifest['source']:<12}"
+                  f"  load {load_seconds:.3f}s  {json.dumps(manifest['metrics'])}")
+    elif args.command == 'publish':
+        version = registry.publish([os.path.join(args.source_dir,name) for name in MODEL_FILES],
+                                   source='manual')
+        print(version)
+        if args.promote:
+            registry.promote(version)
+    elif args.command == 'promote':
+        registry.promote(args.version)
+    else:
+        print(registry.rollback(args.version)['version'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+This module profiles the serving cost of the trained candidates and selects the model to serve.
+
+Every candidate is timed the way the inference service would run it: single rows and small \
+    batches go through the compiled node arrays when the model can be compiled, larger batches \
+        through the native `predict`. The p50 and p99 latency of single-row and batch calls, the \
+            size of the pickled model and its load time are recorded next to the test scores.
+
+The model is then chosen by a policy (`MODEL_SELECTION_POLICY`):
+- `best_score`: the best test R2, whatever its cost;
+- `latency_budget`: the best test R2 among the candidates whose latency (by default the \
+    single-row p99) is within `MODEL_LATENCY_BUDGET_MS`, or the fastest one when none is;
+- `pareto`: the fastest candidate of the score/latency Pareto front whose test R2 is within \
+    `score_tolerance` of the best.
+
+Candidates whose test R2 is below `min_score` are never selected. The Pareto front is \
+    computed and reported whatever the policy.
+"""
+import os
+import sys
+import time
+from dataclasses import dataclass
+import dill
+import numpy as np
+from src.exception import CustomException
+from src.logger import logging
+from src.components.tree_compiler import compile_model,check_parity,latencies_ms
+
+@dataclass
+class ModelSelectionConfig(): # pylint: disable=R0902
+    """
+    Configuration class for the latency-aware model selection.
+
+    Attributes:
+        policy (str): Name of the selection policy, one of `SELECTION_POLICIES`.
+        latency_budget_ms (float): Largest accepted latency of the `latency_budget` policy.
+        latency_metric (str): Profile entry the budget and the Pareto front use, for example \
+            'single_p99_ms' or 'batch_p99_ms'.
+        score_tolerance (float): Test R2 a `pareto` selection may give up for speed.
+        min_score (float): Lowest test R2 of a model that may be selected.
+        single_repeats (int): Timed single-row calls per candidate.
+        batch_rows (int): Rows of the timed batch calls.
+        batch_repeats (int): Timed batch calls per candidate.
+        compiled_max_rows (int): Largest batch served by the compiled model, as in the \
+            inference service.
+    """
+    policy:str = os.environ.get('MODEL_SELECTION_POLICY','best_score')
+    latency_budget_ms:float = float(os.environ.get('MODEL_LATENCY_BUDGET_MS','5'))
+    latency_metric:str = os.environ.get('MODEL_LATENCY_METRIC','single_p99_ms')
+    score_tolerance:float = 0.005
+    min_score:float = 0.6
+    single_repeats:int = 200
+    batch_rows:int = 1000
+    batch_repeats:int = 20
+    compiled_max_rows:int = int(os.environ.get('COMPILED_MAX_ROWS','64'))
+
+def _percentiles_ms(predict,x,repeats):
+    """Returns the p50 and p99 wall time of `predict(x)` after a warm-up call, in milliseconds."""
+    predict(x)
+    timings = latencies_ms(predict,x,repeats)
+    return float(np.percentile(timings,50)),float(np.percentile(timings,99))
+
+def serving_profile(model,x,config=None):
+    """
+    Measures what a model costs to serve.
+
+    Args:
+        model: The fitted model.
+        x (np.ndarray): Testing rows; the first `batch_rows` are the timed batch.
+        config (ModelSelectionConfig): The number of timed calls and the batch size.
+
+    Returns:
+        dict: Latency percentiles in milliseconds of single-row and batch calls, whether the \
+            small batches are served compiled, and the size and load time of the pickled model.
+    """
+    config = config or ModelSelectionConfig()
+    x = np.asarray(x)
+    batch = x[:config.batch_rows]
+    single_predict = model.predict
+    compiled = None
+    try:
+        compiled = compile_model(model)
+        if check_parity(compiled,model,batch)['passed']:
+            single_predict = compiled.predict
+        else:
+            compiled = None
+    except CustomException:
+        compiled = None
+    batch_predict = compiled.predict if compiled is not None \
+        and len(batch) <= config.compiled_max_rows else model.predict
+    single_p50,single_p99 = _percentiles_ms(single_predict,x[:1],config.single_repeats)
+    batch_p50,batch_p99 = _percentiles_ms(batch_predict,batch,config.batch_repeats)
+    payload = dill.dumps(model)
+    started = time.perf_counter()
+    dill.loads(payload)
+    return {'single_p50_ms':single_p50,'single_p99_ms':single_p99,
+            'batch_p50_ms':batch_p50,'batch_p99_ms':batch_p99,'batch_rows':len(batch),
+            'compiled':compiled is not None,'size_bytes':len(payload),
+            'load_s':time.perf_counter() - started}
+
+def pareto_front(scores,costs):
+    """
+    Finds the candidates that no other candidate beats on both score and cost.
+
+    Args:
+        scores (dict): Score of every candidate, higher is better.
+        costs (dict): Cost of every candidate, lower is better.
+
+    Returns:
+        list: The candidates of the front, fastest first.
+    """
+    front = [name for name in scores
+             if not any(scores[other] >= scores[name] and costs[other] <= costs[name]
+                        and (scores[other],costs[other]) != (scores[name],costs[name])
+                        for other in scores)]
+    return sorted(front,key=lambda name: costs[name])
+
+def _best_score(scores,_costs,_config):
+    """Selects the best score."""
+    return max(scores,key=scores.get)
+
+def _latency_budget(scores,costs,config):
+    """Selects the best score within the latency budget, or the fastest candidate."""
+    within = [name for name in scores if costs[name] <= config.latency_budget_ms]
+    if not within:
+        fastest = min(costs,key=costs.get)
+        logging.error(f"No model meets the {config.latency_metric} budget of "
+                      f"{config.latency_budget_ms}ms, selecting the fastest one, {fastest}.")
+        return fastest
+    return max(within,key=scores.get)
+
+def _pareto(scores,costs,config):
+    """Selects the fastest candidate of the Pareto front close enough to the best score."""
+    best = max(scores.values())
+    return next(name for name in pareto_front(scores,costs)
+                if scores[name] >= best - config.score_tolerance)
+
+SELECTION_POLICIES = {
+    'best_score':_best_score,
+    'latency_budget':_latency_budget,
+    'pareto':_pareto
+}
+
+def select_model(scores,profiles,config=None,metrics=None):
+    """
+    Selects the model to serve from the test scores and serving profiles of the candidates.
+
+    Args:
+        scores (dict): Test R2 of every candidate.
+        profiles (dict): Serving profile of every candidate, as returned by `serving_profile`.
+        config (ModelSelectionConfig): The policy and its parameters.
+        metrics (dict): Other test metrics of every candidate keyed by metric name, for \
+            example {'test_mae': {...}, 'test_mse': {...}}, copied into the report.
+
+    Returns:
+        tuple: The name of the selected model and the selection report (policy, latency \
+            metric and budget, Pareto front, and the metrics and profile of every candidate).
+
+    Raises:
+        CustomException: If the policy is unknown or no candidate reaches `min_score`.
+    """
+    try:
+        config = config or ModelSelectionConfig()
+        if config.policy not in SELECTION_POLICIES:
+            raise ValueError(f"Unknown selection policy {config.policy!r}, "
+                             f"expected one of {sorted(SELECTION_POLICIES)}.")
+        eligible = {name:score for name,score in scores.items() if score >= config.min_score}
+        if not eligible:
+            raise ValueError(f"No model reaches the minimum test R2 of {config.min_score}.")
+        costs = {name:profiles[name][config.latency_metric] for name in eligible}
+        selected = SELECTION_POLICIES[config.policy](eligible,costs,config)
+        metrics = {'test_r2':scores,**(metrics or {})}
+        report = {
+            'policy':config.policy,
+            'latency_metric':config.latency_metric,
+            'latency_budget_ms':config.latency_budget_ms,
+            'selected':selected,
+            'pareto_front':pareto_front(eligible,costs),
+            'candidates':{name:{**{metric:values[name] for metric,values in metrics.items()},
+                                **profiles[name],'eligible':name in eligible,
+                                'within_budget':(profiles[name][config.latency_metric]
+                                                 <= config.latency_budget_ms)}
+                          for name in scores}
+        }
+        logging.info(f"Selected {selected} with the {config.policy} policy: test R2 "
+                     f"{scores[selected]:.4f}, {config.latency_metric} {costs[selected]:.3f}ms.")
+        return selected,report
+    except Exception as e:
+        raise CustomException(e,sys) from e
@@ -7,20 +7,88 @@ This module is responsible for training machine learning models and selecting \
 """
 import os
 import sys
+import time
 from dataclasses import dataclass
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor,GradientBoostingRegressor,AdaBoostRegressor
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.metrics import r2_score
-from catboost import CatBoostRegressor
-from xgboost import XGBRegressor
+import numpy as np
 from src.exception import CustomException
 from src.logger import logging
-from src.utils import evaluate_models,save_object,save_json_object
+from src.components.hyperparameter_search import HyperparameterSearchConfig
+from src.components.stage_cache import hash_file
+from src.components.tree_compiler import compile_model,check_parity,benchmark
+from src.components.mapped_pickle import save_mapped_object
+from src.components.model_selection import ModelSelectionConfig,serving_profile,select_model
+from src.utils import evaluate_models,save_object,save_json_object,load_object
 
 
+def candidate_models():
+    """
+    Returns the models compared by the training stage.
+
+    Returns:
+        dict: Unfitted estimators keyed by model name.
+    """
+    # The model libraries are only imported when a training stage needs them.
+    from sklearn.linear_model import LinearRegression # pylint: disable=C0415
+    from sklearn.ensemble import (RandomForestRegressor,GradientBoostingRegressor, # pylint: disable=C0415
+                                  AdaBoostRegressor)
+    from sklearn.tree import DecisionTreeRegressor # pylint: disable=C0415
+    from catboost import CatBoostRegressor # pylint: disable=C0415
+    from xgboost import XGBRegressor # pylint: disable=C0415
+    return {
+        "Linear Regression" : LinearRegression(),
+        "Random Forest":RandomForestRegressor(verbose=1),
+        "Decision Tree":DecisionTreeRegressor(),
+        "Gradient Boosting":GradientBoostingRegressor(verbose=1),
+        "XGBRegressor" : XGBRegressor(),
+        "CatBoosting Regressor" : CatBoostRegressor(verbose=True),
+        "AdaBoost Regressor" : AdaBoostRegressor()
+    }
+
+def candidate_params():
+    """
+    Returns the hyperparameter grids searched by the training stage.
+
+    Returns:
+        dict: Parameter grid of every model returned by `candidate_models`, keyed by model name.
+    """
+    return {
+        "Decision Tree": {
+            'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
+            'splitter':['best','random'],
+            'max_features':['sqrt','log2'],
+        },
+        "Random Forest":{
+            'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
+            'max_features':['sqrt','log2',None],
+            'n_estimators': [8,16,32,64,128,256]
+        },
+        "Gradient Boosting":{
+            'loss':['squared_error', 'huber', 'absolute_error', 'quantile'],
+            'learning_rate':[.1,.01,.05,.001],
+            'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
+            'criterion':['squared_error', 'friedman_mse'],
+            'max_features':['1.0','sqrt','log2'],
+            'n_estimators': [8,16,32,64,128,256]
+        },
+        "Linear Regression":{},
+        "XGBRegressor":{
+            'learning_rate':[.1,.01,.05,.001],
+            'n_estimators': [8,16,32,64,128,256]
+        },
+        "CatBoosting Regressor":{
+            'depth': [6,8,10],
+            'learning_rate': [0.01, 0.05, 0.1],
+            'iterations': [30, 50, 100]
+        },
+        "AdaBoost Regressor":{
+            'learning_rate':[.1,.01,0.5,.001],
+            'loss':['linear','square','exponential'],
+            'n_estimators': [8,16,32,64,128,256]
+        }
+    }
+
 @dataclass
-class ModelTrainerConfig():
+class ModelTrainerConfig(): # pylint: disable=R0902
     """
     Configuration class for model training paths.
 
@@ -32,6 +100,17 @@ class ModelTrainerConfig():
         train_model_report_score_path (str): Path to save the train dataset's model score report.
         train_model_report_mae_path (str): Path to save the train dataset's MAE report.
         train_model_report_mse_path (str): Path to save the train dataset's MSE report.
+        training_time_report_path (str): Path to save the wall time spent per model and per \
+            phase (search, refit, predict, metrics).
+        incremental_training_report_path (str): Path to save the report of the latest \
+            incremental (warm-started) training.
+        warm_start_rounds (int): Number of trees or boosting rounds added to the best model \
+            by an incremental training.
+        compiled_model_path (str): Path to save the best model compiled into flat node arrays.
+        compiled_model_report_path (str): Path to save the parity check and latency benchmark \
+            of the compiled model.
+        model_selection_report_path (str): Path to save the serving latency, size and load \
+            time of every candidate, the Pareto front and the selected model.
     """
     model_path:str = os.path.join('src/models','best_model.pkl')
 
@@ -43,10 +122,57 @@ class ModelTrainerConfig():
     train_model_report_mae_path:str = os.path.join('src/models','train_model_report_mae.json')
     train_model_report_mse_path:str = os.path.join('src/models','train_model_report_mse.json')
 
+    training_time_report_path:str = os.path.join('src/models','training_time_report.json')
+    incremental_training_report_path:str = os.path.join(
+        'src/models','incremental_training_report.json')
+
+    warm_start_rounds:int = 32
+
+    compiled_model_path:str = os.path.join('src/models','compiled_model.pkl')
+    compiled_model_report_path:str = os.path.join('src/models','compiled_model_report.json')
+    model_selection_report_path:str = os.path.join('src/models','model_selection_report.json')
+
+def warm_start_model(model,x,y,rounds):
+    """
+    Continues the training of an already fitted tree ensemble on new rows.
+
+    XGBoost and CatBoost models continue boosting from the existing booster, while the \
+        scikit-learn ensembles use `warm_start` to add trees fitted on the new rows only.
+
+    Args:
+        model: The fitted model to continue.
+        x (np.ndarray): The features of the new rows.
+        y (np.ndarray): The target of the new rows.
+        rounds (int): Number of trees or boosting rounds to add.
+
+    Returns:
+        The model with the additional trees.
+
+    Raises:
+        ValueError: If the model type cannot be trained incrementally.
+    """
+    from sklearn.ensemble import RandomForestRegressor,GradientBoostingRegressor # pylint: disable=C0415
+    from catboost import CatBoostRegressor # pylint: disable=C0415
+    from xgboost import XGBRegressor # pylint: disable=C0415
+    if isinstance(model,XGBRegressor):
+        updated = XGBRegressor(**{**model.get_params(),'n_estimators':rounds})
+        updated.fit(x,y,xgb_model=model.get_booster())
+        return updated
+    if isinstance(model,CatBoostRegressor):
+        updated = CatBoostRegressor(**{**model.get_params(),'iterations':rounds})
+        updated.fit(x,y,init_model=model)
+        return updated
+    if isinstance(model,(RandomForestRegressor,GradientBoostingRegressor)):
+        model.set_params(warm_start=True,n_estimators=model.n_estimators + rounds)
+        model.fit(x,y)
+        return model
+    raise ValueError(f"{type(model).__name__} cannot be trained incrementally, "
+                     "run a full retrain instead.")
+
 class ModelTrainer():
     """
     A class that handles model training, hyperparameter tuning, and selection of the best model 
-    based on performance metrics such as R2 score, MAE, and MSE.
+    based on performance metrics such as R2 score, MAE, and MSE, and on its serving latency.
 
     This class evaluates multiple regression models, tunes their hyperparameters, and selects 
     the best-performing model. It saves the best model and performance reports.
@@ -54,19 +180,65 @@ class ModelTrainer():
     Attributes:
         model_trainer_config (ModelTrainerConfig): Configuration object for saving model \
              and report paths.
+        search_config (HyperparameterSearchConfig): Strategy, parallelism and budget of the \
+            hyperparameter search.
+        stage_cache (StageCache): Optional cache of per-model search results.
+        selection_config (ModelSelectionConfig): Policy choosing the served model from the \
+            scores and serving latencies of the candidates.
     """
-    def __init__(self):
+    def __init__(self,search_config=None,stage_cache=None,selection_config=None):
         self.model_trainer_config = ModelTrainerConfig()
+        self.search_config = search_config or HyperparameterSearchConfig()
+        self.stage_cache = stage_cache
+        self.selection_config = selection_config or ModelSelectionConfig()
+
+    def export_compiled_model(self,model,x_test):
+        """
+        Compiles the saved best model into flat node arrays for serving.
+
+        The compiled model is only saved when its predictions on the testing rows match the \
+            original model; it is tagged with the hash of the saved model file so the \
+                inference service never pairs it with another model. Models that are not tree \
+                    ensembles are served as they are.
+
+        Args:
+            model: The best model, already saved to `model_path`.
+            x_test (np.ndarray): The testing features, used for the parity check and benchmark.
+
+        Returns:
+            CompiledTreeEnsemble: The saved compiled model, or None if it was not exported.
+        """
+        config = self.model_trainer_config
+        try:
+            compiled = compile_model(model)
+        except CustomException as e:
+            logging.info(f"{type(model).__name__} is served without compilation: {e}")
+            return None
+        x_test = np.asarray(x_test)
+        parity = check_parity(compiled,model,x_test)
+        if not parity['passed']:
+            logging.error(f"Compiled {type(model).__name__} failed the parity check: {parity}")
+            return None
+        compiled.report = {'model':type(model).__name__,'trees':compiled.n_trees,
+                           'max_depth':compiled.max_depth,'parity':parity,
+                           'benchmark':benchmark(compiled,model,x_test)}
+        compiled.source_digest = hash_file(config.model_path)
+        save_mapped_object(filepath=config.compiled_model_path,obj=compiled)
+        save_json_object(file_path=config.compiled_model_report_path,obj=compiled.report)
+        logging.info(f"Exported compiled {type(model).__name__}: {compiled.report['benchmark']}")
+        return compiled
 
-    def initiate_model_trainer(self,train_arr,test_arr):
+    def initiate_model_trainer(self,train_matrix,test_matrix,fold_encoding=None): # pylint: disable=R0914
         """
         Initiates the model training process, evaluates various models, tunes their hyperparameters,
         and selects the best model. The performance reports for both training and testing datasets 
         are saved in JSON files.
 
         Args:
-            train_arr (np.ndarray): The training data array with features and target.
-            test_arr (np.ndarray): The testing data array with features and target.
+            train_matrix (FeatureMatrix): The training features and target.
+            test_matrix (FeatureMatrix): The testing features and target.
+            fold_encoding (FoldEncoding): Optional out-of-fold target-encoded training matrices \
+                the hyperparameter search cross-validates on.
 
         Returns:
             tuple: A tuple containing the R2 score of the best model and the name of the best model.
@@ -77,56 +249,13 @@ class ModelTrainer():
         """
         try:
             x_train,y_train,x_test,y_test = (
-                train_arr[:,:-1],
-                train_arr[:,-1],
-                test_arr[:,:-1],
-                test_arr[:,-1]
+                train_matrix.features,
+                train_matrix.target,
+                test_matrix.features,
+                test_matrix.target
             )
-            models = {
-                "Linear Regression" : LinearRegression(),
-                "Random Forest":RandomForestRegressor(verbose=1),
-                "Decision Tree":DecisionTreeRegressor(),
-                "Gradient Boosting":GradientBoostingRegressor(verbose=1),
-                "XGBRegressor" : XGBRegressor(),
-                "CatBoosting Regressor" : CatBoostRegressor(verbose=True),
-                "AdaBoost Regressor" : AdaBoostRegressor()
-            }
-            params = {
-                "Decision Tree": {
-                    'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
-                    'splitter':['best','random'],
-                    'max_features':['sqrt','log2'],
-                },
-                "Random Forest":{
-                    'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
-                    'max_features':['sqrt','log2',None],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Gradient Boosting":{
-                    'loss':['squared_error', 'huber', 'absolute_error', 'quantile'],
-                    'learning_rate':[.1,.01,.05,.001],
-                    'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
-                    'criterion':['squared_error', 'friedman_mse'],
-                    'max_features':['1.0','sqrt','log2'],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Linear Regression":{},
-                "XGBRegressor":{
-                    'learning_rate':[.1,.01,.05,.001],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "CatBoosting Regressor":{
-                    'depth': [6,8,10],
-                    'learning_rate': [0.01, 0.05, 0.1],
-                    'iterations': [30, 50, 100]
-                },
-                "AdaBoost Regressor":{
-                    'learning_rate':[.1,.01,0.5,.001],
-                    'loss':['linear','square','exponential'],
-                    'n_estimators': [8,16,32,64,128,256]
-                }
-
-            }
+            models = candidate_models()
+            params = candidate_params()
             train_model_report_mae = {}
             train_model_report_mse = {}
             train_model_report_score = {}
@@ -137,18 +266,17 @@ class ModelTrainer():
 
             train_model_report_mae,train_model_report_mse,train_model_report_score, \
                 test_model_report_mae,test_model_report_mse,\
-                    test_model_report_score = evaluate_models(
+                    test_model_report_score,fitted_models,training_time_report = evaluate_models(
                 x_train=x_train,y_train=y_train, x_test=x_test,y_test=y_test,
-                models=models,params=params)
-            best_model_score = max(sorted(test_model_report_score.values()))
-            best_model_name = list(test_model_report_score.keys())[
-                list(test_model_report_score.values()).index(best_model_score)
-            ]
+                models=models,params=params,search_config=self.search_config,
+                stage_cache=self.stage_cache,fold_encoding=fold_encoding)
+            serving_profiles = {name:serving_profile(model,x_test,self.selection_config)
+                                for name,model in fitted_models.items()}
+            best_model_name,selection_report = select_model(
+                test_model_report_score,serving_profiles,self.selection_config,
+                metrics={'test_mae':test_model_report_mae,'test_mse':test_model_report_mse})
 
-            best_model = models[best_model_name]
-
-            if best_model_score < 0.6:
-                raise CustomException("No best model found",sys)
+            best_model = fitted_models[best_model_name]
 
             logging.info(f"Best found model: {best_model_name} both on \
                          training and testing dataset.")
@@ -157,8 +285,8 @@ class ModelTrainer():
                 filepath=self.model_trainer_config.model_path,
                 obj=best_model
             )
-            predicted = best_model.predict(x_test)
-            r2_square = r2_score(predicted,y_test)
+            self.export_compiled_model(best_model,x_test)
+            r2_square = test_model_report_score[best_model_name]
 
             save_json_object(
                 file_path=self.model_trainer_config.train_model_report_score_path,
@@ -179,7 +307,71 @@ class ModelTrainer():
             save_json_object(
                 file_path=self.model_trainer_config.test_model_report_mse_path,
                 obj=test_model_report_mse)
+            save_json_object(
+                file_path=self.model_trainer_config.training_time_report_path,
+                obj=training_time_report)
+            save_json_object(
+                file_path=self.model_trainer_config.model_selection_report_path,
+                obj=selection_report)
             return (r2_square,best_model_name)
 
         except Exception as e:
             raise CustomException(e,sys) from e
+
+    def initiate_incremental_training(self,train_delta_matrix,test_matrix):
+        """
+        Warm-starts the saved best model on a delta of new training rows.
+
+        Only the new rows are used to grow the model, so the training time scales with the \
+            size of the delta. The updated model is checked on the whole testing dataset \
+                before it replaces the saved best model.
+
+        Args:
+            train_delta_matrix (FeatureMatrix): The features and target of the new training rows.
+            test_matrix (FeatureMatrix): The testing features and target.
+
+        Returns:
+            tuple: A tuple containing the R2 score of the updated model and its type name.
+
+        Raises:
+            CustomException: If the model cannot be trained incrementally, the updated model \
+                scores too low, or any exception occurs during the process.
+        """
+        try:
+            started = time.perf_counter()
+            x_train,y_train,x_test,y_test = (
+                train_delta_matrix.features,
+                train_delta_matrix.target,
+                test_matrix.features,
+                test_matrix.target
+            )
+            best_model = load_object(self.model_trainer_config.model_path)
+            model_name = type(best_model).__name__
+            logging.info(f"Warm-starting {model_name} on {len(y_train)} new rows.")
+            best_model = warm_start_model(
+                best_model,x_train,y_train,self.model_trainer_config.warm_start_rounds)
+
+            from sklearn.metrics import r2_score # pylint: disable=C0415
+            r2_square = r2_score(y_test,best_model.predict(x_test))
+            if r2_square < 0.6:
+                raise CustomException("Incrementally trained model scored too low",sys)
+
+            save_object(
+                filepath=self.model_trainer_config.model_path,
+                obj=best_model
+            )
+            self.export_compiled_model(best_model,x_test)
+            save_json_object(
+                file_path=self.model_trainer_config.incremental_training_report_path,
+                obj={
+                    'model':model_name,
+                    'new_rows':len(y_train),
+                    'rounds':self.model_trainer_config.warm_start_rounds,
+                    'test_score':r2_square,
+                    'wall_time':time.perf_counter() - started
+                })
+            logging.info(f"Incremental training of {model_name} done with r2score {r2_square}.")
+            return (r2_square,model_name)
+
+        except Exception as e:
+            raise CustomException(e,sys) from e
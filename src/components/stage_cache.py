@@ -0,0 +1,188 @@
+"""
+This module provides a content-addressed, on-disk cache for the stages of the training pipeline.
+
+Every stage result is stored under a key that is the hash of everything the stage depends \
+    on (input file contents, arrays, configuration and parameters), so a rerun with unchanged \
+        inputs reuses the stored result instead of recomputing it. The cache is bounded in \
+            size and evicts the least recently used entries first.
+"""
+import os
+import sys
+import json
+import glob
+import hashlib
+import functools
+import tempfile
+from dataclasses import dataclass
+import dill
+import numpy as np
+from src.exception import CustomException
+from src.logger import logging
+
+@dataclass
+class StageCacheConfig():
+    """
+    Configuration class for the stage cache.
+
+    Attributes:
+        cache_dir (str): Directory holding the cached stage results.
+        max_bytes (int): Size above which the least recently used entries are evicted.
+        enabled (bool): Whether results are looked up and stored at all.
+    """
+    cache_dir:str = os.path.join('artifacts','cache')
+    max_bytes:int = int(os.environ.get('STAGE_CACHE_MAX_BYTES',str(2*1024**3)))
+    enabled:bool = os.environ.get('STAGE_CACHE','1') != '0'
+
+def hash_file(path):
+    """
+    Hashes the content of an artifact file, or of every file of an artifact directory.
+
+    Args:
+        path (str): The file or directory to hash.
+
+    Returns:
+        str: The hex digest of the content.
+    """
+    digest = hashlib.sha256()
+    paths = sorted(glob.glob(os.path.join(path,'**','*'),recursive=True)) \
+        if os.path.isdir(path) else [path]
+    for file_path in paths:
+        if os.path.isdir(file_path):
+            continue
+        digest.update(os.path.relpath(file_path,path).encode())
+        with open(file_path,'rb') as f:
+            for block in iter(functools.partial(f.read,1 << 20),b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def hash_array(array):
+    """
+    Hashes the content, dtype and shape of a NumPy array.
+
+    Args:
+        array (np.ndarray): The array to hash.
+
+    Returns:
+        str: The hex digest of the array.
+    """
+    array = np.asarray(array)
+    digest = hashlib.sha256(f"{array.dtype.str}{array.shape}".encode())
+    if array.dtype == object:
+        digest.update(dill.dumps(array.tolist()))
+    else:
+        digest.update(memoryview(np.ascontiguousarray(array)).cast('B'))
+    return digest.hexdigest()
+
+def hash_key(*parts):
+    """
+    Hashes configuration values into a cache key.
+
+    Args:
+        *parts: JSON-serializable values; other objects are represented by their `repr`.
+
+    Returns:
+        str: The hex digest identifying the values.
+    """
+    payload = json.dumps(parts,sort_keys=True,default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class StageCache():
+    """
+    Size-bounded LRU cache of pipeline stage results keyed by content hashes.
+
+    Attributes:
+        stage_cache_config (StageCacheConfig): Configuration object holding the cache \
+            directory, size limit and switch.
+    """
+    def __init__(self,config=None):
+        self.stage_cache_config = config or StageCacheConfig()
+
+    def _entry_path(self,stage,key):
+        """Returns the file path of the entry of `stage` stored under `key`."""
+        return os.path.join(self.stage_cache_config.cache_dir,stage,f'{key}.pkl')
+
+    def get(self,stage,key):
+        """
+        Looks up a stage result.
+
+        Args:
+            stage (str): Name of the stage.
+            key (str): Content hash of the stage inputs.
+
+        Returns:
+            tuple: (True, result) on a hit, (False, None) on a miss.
+        """
+        path = self._entry_path(stage,key)
+        if not self.stage_cache_config.enabled or not os.path.exists(path):
+            return False,None
+        try:
+            with open(path,'rb') as f:
+                value = dill.load(f)
+            os.utime(path)
+            return True,value
+        except Exception as e: # pylint: disable=W0718
+            logging.info(f"Discarding unreadable cache entry {path}: {e}")
+            os.remove(path)
+            return False,None
+
+    def put(self,stage,key,value):
+        """
+        Stores a stage result atomically, then evicts old entries if the cache is too big.
+
+        Args:
+            stage (str): Name of the stage.
+            key (str): Content hash of the stage inputs.
+            value: The stage result, serializable with dill.
+
+        Raises:
+            CustomException: If the entry cannot be written.
+        """
+        if not self.stage_cache_config.enabled:
+            return
+        try:
+            path = self._entry_path(stage,key)
+            os.makedirs(os.path.dirname(path),exist_ok=True)
+            fd,tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),suffix='.tmp')
+            with os.fdopen(fd,'wb') as f:
+                dill.dump(value,f)
+            os.replace(tmp_path,path)
+            self.evict()
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def get_or_compute(self,stage,key,compute,validate=None):
+        """
+        Returns the cached result of a stage, computing and storing it on a miss.
+
+        Args:
+            stage (str): Name of the stage.
+            key (str): Content hash of the stage inputs.
+            compute (callable): Computes the stage result when it is not cached.
+            validate (callable): Optional check of a cached result (for example that the \
+                files it refers to still exist); a rejected result is recomputed.
+
+        Returns:
+            The stage result.
+        """
+        hit,value = self.get(stage,key)
+        if hit and (validate is None or validate(value)):
+            logging.info(f"Stage cache hit for {stage} ({key[:12]}).")
+            return value
+        logging.info(f"Stage cache miss for {stage} ({key[:12]}), computing it.")
+        value = compute()
+        self.put(stage,key,value)
+        return value
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        for path in glob.glob(os.path.join(self.stage_cache_config.cache_dir,'*','*.pkl')):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime,stat.st_size,path))
+        total = sum(size for _,size,_ in entries)
+        for _,size,path in sorted(entries):
+            if total <= self.stage_cache_config.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            logging.info(f"Evicted stage cache entry {path}.")
@@ -0,0 +1,70 @@
+"""
+Tests of the full and incremental ingestion into the Parquet datasets.
+"""
+import pandas as pd
+import pytest
+from src.exception import CustomException
+from src.utils import load_frame
+from src.components.feature_schema import CATEGORICAL_COLUMNS
+from src.components.data_ingestion import DataIngestion
+
+SOURCE_PATH = 'notebooks/cleaned_data.csv'
+
+@pytest.fixture(name='source')
+def fixture_source():
+    """The first rows of the cleaned dataset, as a history and a delta."""
+    df = pd.read_csv(SOURCE_PATH,nrows=240,dtype={column:str for column in CATEGORICAL_COLUMNS})
+    return df.iloc[:200],df.iloc[200:].copy()
+
+@pytest.fixture(name='ingestion')
+def fixture_ingestion(tmp_path,source):
+    """A data ingestion that ingested the history into a temporary directory."""
+    ingestion = DataIngestion()
+    config = ingestion.data_ingestion_config
+    config.source_path = str(tmp_path/'source.csv')
+    for name in ('raw','train','test','train_delta','test_delta'):
+        setattr(config,f"{name}_path",str(tmp_path/f"{name}.parquet"))
+    source[0].to_csv(config.source_path,index=False)
+    ingestion.initiate_data_ingestion()
+    return ingestion
+
+def _lengths(config):
+    """Number of rows of the raw, train and test datasets."""
+    return [len(load_frame(path)) for path in (config.raw_path,config.train_path,config.test_path)]
+
+def test_full_ingestion_stores_schema_dtypes(ingestion):
+    """The splits cover every row, with categorical and float64 columns."""
+    config = ingestion.data_ingestion_config
+    raw,train,test = _lengths(config)
+    assert raw == train + test == 200
+    df = load_frame(config.raw_path)
+    for column,dtype in df.dtypes.items():
+        assert dtype.name == ('category' if column in CATEGORICAL_COLUMNS else 'float64')
+
+def test_incremental_ingestion_appends_the_delta(ingestion,source,tmp_path):
+    """A delta, even with an all-empty categorical column, is appended and saved on its own."""
+    delta = source[1]
+    delta['suburb'] = None
+    delta.to_csv(tmp_path/'delta.csv',index=False)
+    config = ingestion.data_ingestion_config
+    train_delta_path,test_delta_path = ingestion.initiate_incremental_ingestion(
+        str(tmp_path/'delta.csv'))
+    train_delta,test_delta = load_frame(train_delta_path),load_frame(test_delta_path)
+    assert len(train_delta) + len(test_delta) == 40
+    assert _lengths(config)[0] == 240
+    raw = load_frame(config.raw_path)
+    assert raw['suburb'].dtype.name == 'category'
+    assert raw['suburb'].iloc[200:].isna().all()
+    assert list(raw.columns) == list(source[0].columns)
+
+@pytest.mark.parametrize('corrupt',[lambda df: df.assign(Qty='abc'),
+                                    lambda df: df.drop(columns=['Qty'])],
+                         ids=['text in a numeric column','missing column'])
+def test_malformed_delta_leaves_the_datasets_untouched(ingestion,source,tmp_path,corrupt):
+    """A malformed delta is rejected before anything is appended."""
+    config = ingestion.data_ingestion_config
+    before = _lengths(config)
+    corrupt(source[1]).to_csv(tmp_path/'delta.csv',index=False)
+    with pytest.raises(CustomException):
+        ingestion.initiate_incremental_ingestion(str(tmp_path/'delta.csv'))
+    assert _lengths(config) == before
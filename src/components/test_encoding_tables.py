@@ -0,0 +1,44 @@
+"""
+Tests that the target-encoding lookup tables give the results of the encoder they come from.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import category_encoders as ce
+from src.components.encoding_tables import TargetEncodingTable
+
+COLS = ['city','state']
+REQUESTS = pd.DataFrame({'city':['Perth','Cairns',None,np.nan,'Sydney'],
+                         'state':['WA','QLD',None,'TAS','NSW'],
+                         'Qty':[1.0,2.0,3.0,4.0,5.0]})
+
+@pytest.fixture(name='train')
+def fixture_train():
+    """Training rows with missing categories."""
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame({'city':rng.choice(['Brisbane','Sydney','Perth',None],200),
+                      'state':rng.choice(['QLD','NSW','WA'],200),
+                      'Qty':rng.normal(size=200)})
+    return x,pd.Series(rng.normal(loc=10,size=200))
+
+@pytest.mark.parametrize('options',[{},{'handle_unknown':'return_nan'},
+                                    {'handle_missing':'return_nan'}],
+                         ids=['default','unknown as NaN','missing as NaN'])
+def test_tables_are_bit_identical_to_the_encoder(train,options):
+    """Known, unseen and missing categories encode exactly like `TargetEncoder.transform`."""
+    encoder = ce.TargetEncoder(cols=COLS,**options).fit(*train)
+    table = TargetEncodingTable.from_encoder(encoder)
+    for x in (train[0],REQUESTS):
+        expected = encoder.transform(x)
+        actual = table.transform(x)
+        for col in COLS:
+            np.testing.assert_array_equal(actual[col].to_numpy(),expected[col].to_numpy())
+
+def test_unknown_categories_are_rejected_when_the_encoder_rejects_them(train):
+    """An encoder raising on unseen categories gives a table raising on them too."""
+    encoder = ce.TargetEncoder(cols=COLS,handle_unknown='error').fit(*train)
+    table = TargetEncodingTable.from_encoder(encoder)
+    assert table.encode_value('city','Perth') == encoder.transform(
+        pd.DataFrame({'city':['Perth'],'state':['WA'],'Qty':[0.0]}))['city'].iloc[0]
+    with pytest.raises(ValueError):
+        table.encode_value('city','Cairns')
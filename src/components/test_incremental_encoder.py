@@ -0,0 +1,48 @@
+"""
+Tests that the incrementally updated target encoder matches a fresh fit on all the rows.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import category_encoders as ce
+from src.components.incremental_encoder import TargetEncodingStatistics
+
+COLS = ['city','state']
+
+@pytest.fixture(name='frames')
+def fixture_frames():
+    """A history and a delta holding known, new and missing categories."""
+    rng = np.random.default_rng(0)
+    def frame(n,cities):
+        x = pd.DataFrame({'city':rng.choice(cities,n).astype(object),
+                          'state':rng.choice(['QLD','NSW',None],n),
+                          'Qty':rng.normal(size=n)})
+        x.loc[rng.random(n) < 0.1,'city'] = None
+        return x,pd.Series(rng.normal(loc=10,size=n))
+    return frame(200,['Brisbane','Sydney','Perth']),frame(60,['Perth','Darwin','Hobart'])
+
+def test_updated_encoder_matches_a_fresh_fit(frames):
+    """Folding in a delta gives the encodings of a fit on the history and the delta."""
+    (x_old,y_old),(x_new,y_new) = frames
+    encoder = ce.TargetEncoder(cols=COLS).fit(x_old,y_old)
+    stats = TargetEncodingStatistics.from_frame(x_old,y_old,COLS)
+    stats.update(x_new,y_new)
+    stats.apply_to(encoder)
+
+    x_all,y_all = pd.concat([x_old,x_new]),pd.concat([y_old,y_new])
+    fresh = ce.TargetEncoder(cols=COLS).fit(x_all,y_all)
+    unseen = pd.DataFrame({'city':['Cairns'],'state':['WA'],'Qty':[0.0]})
+    for x in (x_all,unseen):
+        pd.testing.assert_frame_equal(encoder.transform(x),fresh.transform(x),check_exact=False,
+                                      rtol=1e-12)
+
+def test_statistics_count_every_row(frames):
+    """The statistics hold the counts and target sums of every row folded in."""
+    (x_old,y_old),(x_new,y_new) = frames
+    stats = TargetEncodingStatistics.from_frame(x_old,y_old,COLS)
+    stats.update(x_new,y_new)
+    assert stats.n_rows == 260
+    assert stats.prior == pytest.approx(pd.concat([y_old,y_new]).mean())
+    for col in COLS:
+        assert sum(stats.counts[col].values()) == 260
+        assert sum(stats.sums[col].values()) == pytest.approx(stats.target_sum)
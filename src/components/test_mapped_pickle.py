@@ -0,0 +1,41 @@
+"""
+Tests of the memory-mapped artifact pickles and of the retention of their array files.
+"""
+import os
+import dill
+import numpy as np
+from src.components.mapped_pickle import save_mapped_object,load_mapped_object,arrays_dir
+
+def _prefixes(filepath):
+    """The prefixes of the array files saved next to a pickle."""
+    return {name.split('-')[0] for name in os.listdir(arrays_dir(filepath))
+            if name.endswith('.npy')}
+
+def test_large_arrays_are_memory_mapped(tmp_path):
+    """Large arrays load read-only mapped, small ones stay in the pickle."""
+    filepath = str(tmp_path/'model.pkl')
+    obj = {'large':np.arange(10000,dtype='float64'),'small':np.arange(3),'name':'tree'}
+    assert save_mapped_object(filepath,obj) == 1
+    loaded = load_mapped_object(filepath)
+    assert isinstance(loaded['large'],np.memmap) and not loaded['large'].flags.writeable
+    np.testing.assert_array_equal(loaded['large'],obj['large'])
+    assert loaded['name'] == 'tree'
+    assert not isinstance(load_mapped_object(filepath,mmap_mode=None)['large'],np.memmap)
+
+def test_previous_save_is_kept_until_the_next_one(tmp_path):
+    """A save keeps the arrays of the previous save and unlinks the older ones."""
+    filepath = str(tmp_path/'model.pkl')
+    seen = []
+    for i in range(3):
+        save_mapped_object(filepath,{'x':np.full(1000,i)})
+        seen.append(_prefixes(filepath) - set().union(*seen))
+    assert all(len(new) == 1 for new in seen)
+    assert _prefixes(filepath) == seen[1] | seen[2]
+    assert load_mapped_object(filepath)['x'][0] == 2
+
+def test_plain_dill_pickles_still_load(tmp_path):
+    """A pickle written by `dill` alone loads unchanged."""
+    filepath = str(tmp_path/'encoder.pkl')
+    with open(filepath,'wb') as f:
+        dill.dump({'a':1},f)
+    assert load_mapped_object(filepath) == {'a':1}
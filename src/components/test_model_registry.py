@@ -0,0 +1,87 @@
+"""
+Tests of the publication, promotion, rollback and retention of the model registry.
+"""
+import os
+import dill
+import pytest
+from src.exception import CustomException
+from src.components.model_registry import ModelRegistry,ModelRegistryConfig,REQUIRED_FILES
+
+def _publish(registry,source_dir,model):
+    """Writes a minimal set of artifacts holding `model` and publishes them."""
+    os.makedirs(source_dir,exist_ok=True)
+    paths = []
+    for name in REQUIRED_FILES:
+        path = os.path.join(source_dir,name)
+        if name.endswith('.pkl'):
+            with open(path,'wb') as f:
+                dill.dump({'model':model},f)
+        else:
+            with open(path,'w',encoding='utf-8') as f:
+                f.write('{}')
+        paths.append(path)
+    return registry.publish(paths,metrics={'r2':model})
+
+def _registry(tmp_path,keep):
+    """A registry in a temporary directory keeping `keep` versions."""
+    return ModelRegistry(ModelRegistryConfig(registry_dir=str(tmp_path/'registry'),
+                                             keep_versions=keep,auto_promote=False))
+
+def test_publish_writes_an_immutable_version(tmp_path):
+    """A published version holds its files and manifest and is not served yet."""
+    registry = _registry(tmp_path,keep=10)
+    version = _publish(registry,tmp_path/'models',1)
+    assert registry.versions() == [version]
+    assert registry.current_version() is None
+    manifest = registry.manifest(version)
+    assert set(manifest['files']) == set(REQUIRED_FILES)
+    assert manifest['metrics'] == {'r2':1}
+    assert set(manifest['load_seconds']) == {'best_model.pkl','categorical_encoder.pkl'}
+
+def test_publish_requires_the_model_files(tmp_path):
+    """A version cannot be published without its required files."""
+    with pytest.raises(CustomException):
+        _registry(tmp_path,keep=10).publish([str(tmp_path/'best_model.pkl')])
+
+def test_promote_and_rollback_walk_the_history(tmp_path):
+    """Rolling back repeatedly goes further back through the promotions."""
+    registry = _registry(tmp_path,keep=10)
+    versions = [_publish(registry,tmp_path/f"models{i}",i) for i in range(3)]
+    for version in versions:
+        registry.promote(version)
+    assert registry.current()['previous'] == versions[1]
+    assert registry.rollback()['version'] == versions[1]
+    assert registry.rollback()['version'] == versions[0]
+    assert [record['action'] for record in registry.history()] == \
+        ['promote']*3 + ['rollback']*2
+    with pytest.raises(CustomException):
+        registry.rollback()
+    with pytest.raises(CustomException):
+        registry.promote('unknown')
+
+@pytest.mark.parametrize('keep',[0,-1])
+def test_prune_keeps_everything_when_retention_is_off(tmp_path,keep):
+    """keep_versions of 0 or less never deletes a version."""
+    registry = _registry(tmp_path,keep=keep)
+    versions = [_publish(registry,tmp_path/f"models{i}",i) for i in range(3)]
+    assert registry.prune() == []
+    assert registry.versions() == versions
+
+def test_prune_keeps_the_newest_current_and_previous_versions(tmp_path):
+    """Only the unprotected versions beyond the retention are deleted."""
+    registry = _registry(tmp_path,keep=1)
+    versions = []
+    for i in range(2):
+        versions.append(_publish(registry,tmp_path/f"models{i}",i))
+        registry.promote(versions[-1])
+    versions += [_publish(registry,tmp_path/f"models{i}",i) for i in range(2,4)]
+    assert registry.versions() == [versions[0],versions[1],versions[3]]
+
+def test_prune_spares_the_protected_version(tmp_path):
+    """A protected version, such as the one being published, survives pruning."""
+    registry = _registry(tmp_path,keep=0)
+    versions = [_publish(registry,tmp_path/f"models{i}",i) for i in range(2)]
+    registry.model_registry_config.keep_versions = 1
+    assert registry.prune(protect=versions[0]) == []
+    assert registry.prune() == [versions[0]]
+    assert registry.versions() == [versions[1]]
@@ -0,0 +1,55 @@
+"""
+Tests of the latency-aware selection policies.
+"""
+import pytest
+from src.exception import CustomException
+from src.components.model_selection import ModelSelectionConfig,select_model,pareto_front
+
+SCORES = {'forest':0.92,'boosting':0.918,'tree':0.85,'linear':0.5}
+LATENCIES = {'forest':8.0,'boosting':1.5,'tree':0.2,'linear':0.05}
+PROFILES = {name:{'single_p99_ms':latency,'batch_p99_ms':10*latency}
+            for name,latency in LATENCIES.items()}
+
+def _select(**kwargs):
+    """Selects among the candidates above with the given configuration."""
+    return select_model(SCORES,PROFILES,ModelSelectionConfig(**kwargs))
+
+def test_pareto_front_drops_dominated_candidates():
+    """A candidate both worse and slower than another is not on the front."""
+    scores = {**SCORES,'slow':0.9}
+    costs = {**LATENCIES,'slow':9.0}
+    assert pareto_front(scores,costs) == ['linear','tree','boosting','forest']
+
+def test_best_score_ignores_latency():
+    """The best score wins whatever its cost."""
+    assert _select(policy='best_score')[0] == 'forest'
+
+@pytest.mark.parametrize('budget,expected',[(5.0,'boosting'),(1.0,'tree'),(0.01,'linear')])
+def test_latency_budget_selects_the_best_model_within_budget(budget,expected):
+    """The best eligible model within the budget wins, else the fastest one."""
+    assert _select(policy='latency_budget',latency_budget_ms=budget,min_score=0.4)[0] == expected
+
+def test_latency_budget_uses_the_configured_metric():
+    """The budget applies to the configured profile entry."""
+    assert _select(policy='latency_budget',latency_budget_ms=20.0,
+                   latency_metric='batch_p99_ms')[0] == 'boosting'
+
+@pytest.mark.parametrize('tolerance,expected',[(0.005,'boosting'),(0.1,'tree'),(0.0,'forest')])
+def test_pareto_trades_score_within_tolerance(tolerance,expected):
+    """The fastest model of the front within the tolerance of the best score wins."""
+    assert _select(policy='pareto',score_tolerance=tolerance)[0] == expected
+
+def test_report_flags_ineligible_and_over_budget_candidates():
+    """The report lists every candidate with its eligibility and budget status."""
+    selected,report = _select(policy='latency_budget',latency_budget_ms=1.0)
+    assert selected == 'tree'
+    assert report['pareto_front'] == ['tree','boosting','forest']
+    assert not report['candidates']['linear']['eligible']
+    assert not report['candidates']['forest']['within_budget']
+    assert report['candidates']['tree']['test_r2'] == 0.85
+
+@pytest.mark.parametrize('kwargs',[{'policy':'fastest'},{'min_score':0.99}])
+def test_invalid_selections_are_rejected(kwargs):
+    """An unknown policy or no candidate above the minimum score is an error."""
+    with pytest.raises(CustomException):
+        _select(**kwargs)
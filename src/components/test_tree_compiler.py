@@ -0,0 +1,68 @@
+"""
+Tests that the compiled tree ensembles predict like the models they were compiled from.
+"""
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor,RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+from src.exception import CustomException
+from src.components.tree_compiler import compile_model,check_parity
+
+@pytest.fixture(name='data',scope='module')
+def fixture_data():
+    """A small regression problem with some missing values."""
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(300,5))
+    y = 3*x[:,0] - 2*x[:,1]*x[:,2] + rng.normal(scale=0.1,size=300)
+    x[rng.random(x.shape) < 0.05] = np.nan
+    return x,y
+
+def _fit(model,data):
+    """Fits a model on the data, filling NaN for the models that do not accept them."""
+    x,y = data
+    if isinstance(model,GradientBoostingRegressor):
+        x = np.nan_to_num(x)
+    return model.fit(x,y),x
+
+@pytest.mark.parametrize('model',[
+    DecisionTreeRegressor(max_depth=6,random_state=0),
+    RandomForestRegressor(n_estimators=10,max_depth=5,random_state=0),
+    GradientBoostingRegressor(n_estimators=20,max_depth=3,random_state=0)],
+    ids=lambda model: type(model).__name__)
+def test_sklearn_models_match(data,model):
+    """Scikit-learn trees, forests and boosting compile to the same predictions."""
+    model,x = _fit(model,data)
+    compiled = compile_model(model)
+    assert compiled.n_features == x.shape[1]
+    assert check_parity(compiled,model,x)['passed']
+
+def test_xgboost_matches_including_missing_values(data):
+    """XGBoost's strict splits and default directions are reproduced."""
+    xgboost = pytest.importorskip('xgboost')
+    x,y = data
+    model = xgboost.XGBRegressor(n_estimators=20,max_depth=4,random_state=0).fit(x,y)
+    compiled = compile_model(model)
+    assert check_parity(compiled,model,x)['passed']
+    thresholds = compiled.threshold[compiled.left != np.arange(len(compiled.left))]
+    assert check_parity(compiled,model,np.repeat(thresholds[:,None],x.shape[1],axis=1))['passed']
+
+def test_catboost_matches(data):
+    """CatBoost oblivious trees are reproduced."""
+    catboost = pytest.importorskip('catboost')
+    x,y = data
+    model = catboost.CatBoostRegressor(iterations=20,depth=4,random_seed=0,verbose=False,
+                                       allow_writing_files=False).fit(x,y)
+    assert check_parity(compile_model(model),model,x)['passed']
+
+def test_single_row_and_batch_predictions_agree(data):
+    """A row predicts the same alone and inside a batch."""
+    model,x = _fit(DecisionTreeRegressor(max_depth=6,random_state=0),data)
+    compiled = compile_model(model)
+    batch = compiled.predict(x)
+    np.testing.assert_array_equal([compiled.predict(row)[0] for row in x],batch)
+
+def test_unsupported_models_are_rejected(data):
+    """Models that are not tree ensembles cannot be compiled."""
+    with pytest.raises(CustomException):
+        compile_model(LinearRegression().fit(np.nan_to_num(data[0]),data[1]))
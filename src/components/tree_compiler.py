@@ -0,0 +1,312 @@
+"""
+This module compiles the selected tree ensemble into flat NumPy node arrays for serving.
+
+Every supported model (scikit-learn decision trees, random forests and gradient boosting, \
+    XGBoost and CatBoost) is exported to the same array-of-nodes format: feature index, \
+        threshold, children, missing-value direction and leaf value per node, plus the root of \
+            every tree. The evaluator walks all the trees of all the rows together, one tree \
+                level per vectorized step, so it skips the per-call validation of `predict`.
+
+Features are compared as float32, like the original libraries do, and the strict `<` splits \
+    of XGBoost are turned into the equivalent `<=` splits on the previous float32 value, so \
+        every model follows the same `x <= threshold` rule.
+"""
+import sys
+import json
+import os
+import time
+import tempfile
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+from src.exception import CustomException
+
+IDENTITY_XGB_OBJECTIVES = ('reg:squarederror','reg:absoluteerror','reg:pseudohubererror',
+                           'reg:quantileerror')
+
+@dataclass
+class CompiledTreeEnsemble(): # pylint: disable=R0902
+    """
+    Tree ensemble stored as flat node arrays.
+
+    A row goes to the left child of a node when its feature is <= the threshold (or is NaN \
+        and the node sends missing values left). Leaves point to themselves, so walking \
+            `max_depth` levels always ends on a leaf. The prediction is \
+                `base + scale * sum(leaf values)`.
+
+    Attributes:
+        feature (np.ndarray): Feature index tested by every node (0 for leaves).
+        threshold (np.ndarray): Split threshold of every node (+inf for leaves).
+        left (np.ndarray): Left child of every node.
+        right (np.ndarray): Right child of every node.
+        missing_left (np.ndarray): Whether NaN features go to the left child.
+        value (np.ndarray): Leaf value of every node (0 for inner nodes).
+        roots (np.ndarray): Root node of every tree.
+        max_depth (int): Depth of the deepest tree.
+        base (float): Constant added to the sum of the trees.
+        scale (float): Factor applied to the sum of the trees.
+        n_features (int): Number of input features.
+        source_type (str): Type name of the compiled model.
+        source_digest (str): Hash of the model file the ensemble was compiled from.
+        report (dict): Parity and benchmark results recorded at export.
+    """
+    feature:np.ndarray
+    threshold:np.ndarray
+    left:np.ndarray
+    right:np.ndarray
+    missing_left:np.ndarray
+    value:np.ndarray
+    roots:np.ndarray
+    max_depth:int
+    base:float = 0.0
+    scale:float = 1.0
+    n_features:int = 0
+    source_type:str = ''
+    source_digest:Optional[str] = None
+    report:dict = field(default_factory=dict)
+
+    @property
+    def n_trees(self):
+        """int: Number of trees."""
+        return len(self.roots)
+
+    def predict(self,x):
+        """
+        Predicts a batch of rows, or a single row given as a 1-D array.
+
+        Args:
+            x (np.ndarray): Rows of shape (n_rows, n_features), or one row.
+
+        Returns:
+            np.ndarray: One prediction per row.
+        """
+        x = np.asarray(x,dtype='float32')
+        if x.ndim == 1:
+            x = x.reshape(1,-1)
+        x = x.astype('float64')
+        rows = np.arange(len(x))[:,None]
+        node = np.broadcast_to(self.roots,(len(x),self.n_trees))
+        for _ in range(self.max_depth):
+            values = x[rows,self.feature[node]]
+            go_left = (values <= self.threshold[node]) | \
+                (np.isnan(values) & self.missing_left[node])
+            node = np.where(go_left,self.left[node],self.right[node])
+        return self.base + self.scale*self.value[node].sum(axis=1)
+
+class _TreeBuilder():
+    """Accumulates trees given as per-tree node arrays into one flat ensemble."""
+    def __init__(self):
+        self.parts = []
+        self.roots = []
+        self.max_depth = 0
+        self.n_nodes = 0
+
+    def add(self,feature,threshold,left,right,missing_left,value): # pylint: disable=R0913,R0917
+        """
+        Appends one tree; children are indices local to the tree, -1 marking a leaf.
+        """
+        left = np.asarray(left,dtype='int64')
+        right = np.asarray(right,dtype='int64')
+        is_leaf = left < 0
+        local = np.arange(len(left))
+        offset = self.n_nodes
+        self.parts.append((
+            np.where(is_leaf,0,feature).astype('int64'),
+            np.where(is_leaf,np.inf,threshold).astype('float64'),
+            np.where(is_leaf,local,left) + offset,
+            np.where(is_leaf,local,right) + offset,
+            np.where(is_leaf,False,missing_left).astype(bool),
+            np.where(is_leaf,value,0.0).astype('float64')
+        ))
+        self.roots.append(offset)
+        self.max_depth = max(self.max_depth,_depth(left,right))
+        self.n_nodes += len(left)
+
+    def build(self,**kwargs):
+        """Returns the accumulated trees as a `CompiledTreeEnsemble`."""
+        columns = [np.concatenate(arrays) for arrays in zip(*self.parts)]
+        return CompiledTreeEnsemble(*columns,roots=np.array(self.roots,dtype='int64'),
+                                    max_depth=self.max_depth,**kwargs)
+
+def _depth(left,right):
+    """Returns the depth of a tree given by its child arrays."""
+    depth,level = 0,[0]
+    while True:
+        level = [c for n in level if left[n] >= 0 for c in (left[n],right[n])]
+        if not level:
+            return depth
+        depth += 1
+
+def _add_sklearn_tree(builder,tree):
+    """Appends a fitted scikit-learn `tree_` to the builder."""
+    missing_left = getattr(tree,'missing_go_to_left',np.zeros(tree.node_count,dtype=bool))
+    builder.add(tree.feature,tree.threshold,tree.children_left,tree.children_right,
+                np.asarray(missing_left,dtype=bool),tree.value[:,0,0])
+
+def _compile_sklearn(model):
+    """Compiles a scikit-learn decision tree, random forest or gradient boosting regressor."""
+    from sklearn.ensemble import GradientBoostingRegressor,RandomForestRegressor # pylint: disable=C0415
+    from sklearn.tree import DecisionTreeRegressor # pylint: disable=C0415
+    builder = _TreeBuilder()
+    if isinstance(model,DecisionTreeRegressor):
+        _add_sklearn_tree(builder,model.tree_)
+        return builder.build(n_features=model.n_features_in_)
+    if isinstance(model,RandomForestRegressor):
+        for estimator in model.estimators_:
+            _add_sklearn_tree(builder,estimator.tree_)
+        return builder.build(scale=1.0/len(model.estimators_),n_features=model.n_features_in_)
+    if isinstance(model,GradientBoostingRegressor):
+        for estimator in model.estimators_[:,0]:
+            _add_sklearn_tree(builder,estimator.tree_)
+        base = 0.0 if model.init_ == 'zero' else \
+            float(np.ravel(model.init_.predict(np.zeros((1,model.n_features_in_))))[0])
+        return builder.build(base=base,scale=model.learning_rate,n_features=model.n_features_in_)
+    raise ValueError(f"{type(model).__name__} is not a supported tree ensemble.")
+
+def _compile_xgboost(model):
+    """Compiles a gradient-boosted tree XGBoost regressor from its JSON model dump."""
+    learner = json.loads(model.get_booster().save_raw('json'))['learner']
+    booster = learner['gradient_booster']
+    if booster['name'] != 'gbtree' or learner['objective']['name'] not in IDENTITY_XGB_OBJECTIVES:
+        raise ValueError(f"XGBoost {booster['name']} with objective "
+                         f"{learner['objective']['name']} is not supported.")
+    builder = _TreeBuilder()
+    for tree in booster['model']['trees']:
+        # XGBoost sends x < t left; on float32 values that is x <= the float32 before t.
+        condition = np.asarray(tree['split_conditions'],dtype='float32')
+        threshold = np.nextafter(condition,np.float32(-np.inf)).astype('float64')
+        builder.add(tree['split_indices'],threshold,tree['left_children'],
+                    tree['right_children'],np.asarray(tree['default_left'],dtype=bool),
+                    condition.astype('float64'))
+    base = float(learner['learner_model_param']['base_score'].strip('[]'))
+    return builder.build(base=base,n_features=int(learner['learner_model_param']['num_feature']))
+
+def _compile_catboost(model): # pylint: disable=R0914
+    """Compiles a CatBoost regressor with numeric features from its JSON export."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir,'model.json')
+        model.save_model(path,format='json')
+        with open(path,encoding='utf-8') as f:
+            exported = json.load(f)
+    float_features = exported['features_info']['float_features']
+    flat_index = {f['feature_index']:f['flat_feature_index'] for f in float_features}
+    nan_left = {f['feature_index']:f.get('nan_value_treatment') != 'AsTrue'
+                for f in float_features}
+    builder = _TreeBuilder()
+    for tree in exported['oblivious_trees']:
+        splits = tree['splits']
+        if any(split['split_type'] != 'FloatFeature' for split in splits):
+            raise ValueError("CatBoost models with categorical splits are not supported.")
+        depth = len(splits)
+        # Oblivious tree: level i tests split i, and going right sets bit i of the leaf index.
+        n_inner = 2**depth - 1
+        feature,threshold,missing_left = [],[],[]
+        for level in range(depth):
+            split = splits[level]
+            feature += [flat_index[split['float_feature_index']]]*2**level
+            threshold += [split['border']]*2**level
+            missing_left += [nan_left[split['float_feature_index']]]*2**level
+        inner = np.arange(n_inner)
+        left = np.concatenate([2*inner + 1,-np.ones(2**depth,dtype='int64')])
+        right = np.concatenate([2*inner + 2,-np.ones(2**depth,dtype='int64')])
+        leaf_of_node = [_oblivious_leaf(position,depth) for position in range(2**depth)]
+        value = np.concatenate([np.zeros(n_inner),np.asarray(tree['leaf_values'])[leaf_of_node]])
+        pad = np.zeros(2**depth)
+        builder.add(np.concatenate([feature,pad]),np.concatenate([threshold,pad]),left,right,
+                    np.concatenate([missing_left,pad]).astype(bool),value)
+    scale,bias = exported['scale_and_bias']
+    return builder.build(base=float(np.ravel(bias)[0]) if len(bias) else 0.0,scale=float(scale),
+                         n_features=len(float_features))
+
+def _oblivious_leaf(position,depth):
+    """Maps the breadth-first position of a leaf to the CatBoost leaf index (bit i = level i)."""
+    return sum(((position >> (depth - 1 - level)) & 1) << level for level in range(depth))
+
+def compile_model(model):
+    """
+    Compiles a fitted tree ensemble into a `CompiledTreeEnsemble`.
+
+    Args:
+        model: A fitted DecisionTree, RandomForest or GradientBoosting regressor, \
+            XGBRegressor or CatBoostRegressor.
+
+    Returns:
+        CompiledTreeEnsemble: The compiled ensemble.
+
+    Raises:
+        CustomException: If the model type (or its configuration) is not supported.
+    """
+    try:
+        model_type = type(model).__name__
+        if model_type == 'XGBRegressor':
+            compiled = _compile_xgboost(model)
+        elif model_type == 'CatBoostRegressor':
+            compiled = _compile_catboost(model)
+        else:
+            compiled = _compile_sklearn(model)
+        compiled.source_type = model_type
+        return compiled
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def check_parity(compiled,model,x,rtol=1e-5,atol=1e-6):
+    """
+    Compares the compiled ensemble with the original model on the same rows.
+
+    Args:
+        compiled (CompiledTreeEnsemble): The compiled ensemble.
+        model: The original fitted model.
+        x (np.ndarray): The rows to predict.
+        rtol (float): Allowed relative difference.
+        atol (float): Allowed absolute difference.
+
+    Returns:
+        dict: Whether the predictions match, and the largest absolute and relative differences.
+    """
+    expected = np.asarray(model.predict(x),dtype='float64')
+    actual = compiled.predict(x)
+    difference = np.abs(actual - expected)
+    return {
+        'passed':bool(np.allclose(actual,expected,rtol=rtol,atol=atol)),
+        'rows':len(expected),
+        'max_abs_diff':float(difference.max()),
+        'max_rel_diff':float((difference/np.maximum(np.abs(expected),atol)).max())
+    }
+
+def latencies_ms(predict,x,repeats):
+    """Returns the wall time of each of `repeats` calls of `predict(x)`, in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        predict(x)
+        timings.append((time.perf_counter() - started)*1000)
+    return timings
+
+def _median_latency_ms(predict,x,repeats):
+    """Returns the median wall time of `predict(x)` over `repeats` calls, in milliseconds."""
+    return float(np.median(latencies_ms(predict,x,repeats)))
+
+def benchmark(compiled,model,x,repeats=50):
+    """
+    Measures single-row and batch latency of the compiled ensemble and the original model.
+
+    Args:
+        compiled (CompiledTreeEnsemble): The compiled ensemble.
+        model: The original fitted model.
+        x (np.ndarray): The rows used as the batch; the first one is the single row.
+        repeats (int): Number of timed calls per measurement.
+
+    Returns:
+        dict: Median latencies in milliseconds and the speed-ups of the compiled ensemble.
+    """
+    single = x[:1]
+    report = {
+        'batch_rows':len(x),
+        'original_single_ms':_median_latency_ms(model.predict,single,repeats),
+        'compiled_single_ms':_median_latency_ms(compiled.predict,single,repeats),
+        'original_batch_ms':_median_latency_ms(model.predict,x,max(repeats//10,3)),
+        'compiled_batch_ms':_median_latency_ms(compiled.predict,x,max(repeats//10,3))
+    }
+    report['single_speedup'] = report['original_single_ms']/report['compiled_single_ms']
+    report['batch_speedup'] = report['original_batch_ms']/report['compiled_batch_ms']
+    return report
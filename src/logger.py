@@ -1,35 +1,173 @@
 """
 This module sets up logging functionality for an application.
 
-It creates a unique log file in the 'logs' directory within the current working directory. 
-The log file is named using the current timestamp in the format `MM_DD_YYYY_HH_MM_SS.log`, 
-ensuring that each execution generates a separate log file.
+Log records are never written on the caller's thread. The root logger only has a queue \
+    handler that puts records on an in-memory queue, and a background listener thread \
+        formats them and writes them to a rotating file. When the queue is full the records \
+            are dropped and counted instead of blocking the caller, so logging never sits on \
+                the prediction critical path.
 
-The logging configuration writes log messages to the generated file in a specific format:
-`[timestamp] line_number logger_name - log_level - message`.
+Every process logs into the single directory `LOG_DIR` (default `logs/` in the current \
+    working directory):
+- the main process writes `app.log`; worker processes (multiprocessing children and forked \
+    servers) write `app.<pid>.log`, so that two processes never rotate the same file;
+- files rotate by size (`LOG_MAX_BYTES`, `LOG_BACKUP_COUNT`), or by time when \
+    `LOG_ROTATE_WHEN` is set (for example `midnight`);
+- records are JSON objects by default, and fields passed with `extra=` are kept as \
+    structured fields; `LOG_FORMAT=text` writes \
+        `[timestamp] line_number logger_name - log_level - message` lines instead.
 
-Modules and scripts that import and use this module can log messages with various severity levels 
-(INFO, WARNING, ERROR, etc.), which will be recorded in the generated log file.
+High-volume request logs go through `request_logger`, whose records below WARNING are \
+    sampled at `LOG_REQUEST_SAMPLE_RATE`.
 
-Main components:
-- `LOG_FILE`: Filename of the log file based on the current timestamp.
-- `log_path`: Directory path where the log file will be stored.
-- `LOG_FILE_PATH`: Full path to the log file.
-- `logging.basicConfig`: Configures logging with the specified file, format, and log level.
+Modules and scripts keep using `from src.logger import logging` and the standard \
+    `logging.info(...)` calls.
 """
-
 import os
+import copy
+import json
+import queue
+import atexit
+import random
 import logging
-from datetime import datetime
+import logging.handlers
+import multiprocessing
+from datetime import datetime, timezone
+
+LOG_DIR = os.environ.get('LOG_DIR',os.path.join(os.getcwd(),'logs'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL','INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT','json')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES',str(50*1024**2)))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT','5'))
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE','10000'))
+LOG_REQUEST_SAMPLE_RATE = float(os.environ.get('LOG_REQUEST_SAMPLE_RATE','0.01'))
+TEXT_FORMAT = "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s"
+
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('',0,'',0,'',(),None))) | {'message','asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object, keeping the fields passed with `extra=`."""
+    def format(self,record):
+        entry = {
+            'time':datetime.fromtimestamp(record.created,timezone.utc).isoformat(
+                timespec='milliseconds'),
+            'level':record.levelname,
+            'logger':record.name,
+            'module':record.module,
+            'line':record.lineno,
+            'process':record.process,
+            'thread':record.threadName,
+            'message':record.getMessage()
+        }
+        entry.update({key:value for key,value in vars(record).items()
+                      if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry,default=str)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that drops records when the queue is full instead of blocking.
+
+    Attributes:
+        dropped (int): Number of records dropped so far.
+    """
+    def __init__(self,log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self,record):
+        """Renders the message and traceback now, as the arguments may change later."""
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self,record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class SamplingFilter(logging.Filter): # pylint: disable=R0903
+    """
+    Keeps a random fraction of the records below WARNING.
+
+    Attributes:
+        rate (float): Fraction of the records kept, between 0 and 1.
+    """
+    def __init__(self,rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self,record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+def _log_file_path(worker):
+    """Returns the log file of this process."""
+    return os.path.join(LOG_DIR,f"app.{os.getpid()}.log" if worker else 'app.log')
+
+def _file_handler(path):
+    """Creates the rotating file handler the listener writes to."""
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path,when=LOG_ROTATE_WHEN,backupCount=LOG_BACKUP_COUNT,encoding='utf-8',delay=True)
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path,maxBytes=LOG_MAX_BYTES,backupCount=LOG_BACKUP_COUNT,encoding='utf-8',delay=True)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json'
+                         else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+_listener = None # pylint: disable=C0103
+
+def _start_listener(worker):
+    """Starts the background thread writing the queued records to this process's file."""
+    global _listener # pylint: disable=W0603
+    os.makedirs(LOG_DIR,exist_ok=True)
+    _listener = logging.handlers.QueueListener(queue_handler.queue,
+                                               _file_handler(_log_file_path(worker)))
+    _listener.start()
+
+def stop_logging():
+    """Writes out the queued records and stops the listener thread (run at exit)."""
+    if _listener is not None and _listener._thread is not None: # pylint: disable=W0212
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass
+
+def _restart_after_fork():
+    """
+    Gives a forked child its own queue, listener thread and log file, as the parent's \
+        listener thread does not survive the fork.
+    """
+    queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler.dropped = 0
+    _start_listener(worker=True)
 
-LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
+def dropped_records():
+    """
+    Returns the number of records dropped because the queue was full.
 
-log_path = os.path.join(os.getcwd(),'logs',LOG_FILE)
-os.makedirs(log_path,exist_ok=True)
+    Returns:
+        int: The number of dropped records.
+    """
+    return queue_handler.dropped
 
-LOG_FILE_PATH = os.path.join(log_path,LOG_FILE)
+_start_listener(worker=multiprocessing.parent_process() is not None)
+logging.getLogger().setLevel(LOG_LEVEL)
+logging.getLogger().addHandler(queue_handler)
+atexit.register(stop_logging)
+if hasattr(os,'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
 
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format= "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO)
+request_logger = logging.getLogger('serving.requests')
+request_logger.addFilter(SamplingFilter(LOG_REQUEST_SAMPLE_RATE))
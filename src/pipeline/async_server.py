@@ -0,0 +1,323 @@
+"""
+This module provides the production serving mode of the prediction endpoints.
+
+An asyncio (aiohttp) front end accepts the requests and hands the CPU-bound parsing and \
+    scoring off to a bounded thread pool sharing the preloaded inference service. Admission \
+        control caps the requests being scored or waiting for a worker at `workers + \
+            max_queue_depth`; above that, requests are rejected at once with a 503 instead of \
+                piling up. On SIGTERM/SIGINT the server stops accepting requests, waits for the \
+                    admitted ones to finish (up to `drain_timeout_s`) and shuts the pool down.
+
+A single-row request only holds a worker while it is parsed: its row is queued to the \
+    micro-batcher from the event loop and awaited there, so the rows coalesced into one batch \
+        are not limited to the number of workers.
+
+Run it with `python -m src.pipeline.async_server`.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from aiohttp import web
+from src.exception import CustomException
+from src.logger import logging
+from src.pipeline.request_parser import RequestValidationError
+from src.pipeline.metrics import REGISTRY,CallbackMetric
+from src.pipeline import predict_pipeline
+
+@dataclass
+class AsyncServerConfig():
+    """
+    Configuration class for the asynchronous inference server.
+
+    Attributes:
+        host (str): Interface to listen on.
+        port (int): Port to listen on.
+        workers (int): Number of scoring threads.
+        max_queue_depth (int): Number of admitted requests allowed to wait for a free worker.
+        drain_timeout_s (float): Longest wait for admitted requests on shutdown.
+        max_body_bytes (int): Largest accepted request body, sized for `MAX_BATCH_SIZE` rows.
+        retry_after_s (int): Value of the Retry-After header of a 503 response.
+    """
+    host:str = os.environ.get('SERVE_HOST','0.0.0.0')
+    port:int = int(os.environ.get('SERVE_PORT','5000'))
+    workers:int = int(os.environ.get('SERVE_WORKERS',str(os.cpu_count() or 1)))
+    max_queue_depth:int = int(os.environ.get('SERVE_MAX_QUEUE_DEPTH','256'))
+    drain_timeout_s:float = float(os.environ.get('SERVE_DRAIN_TIMEOUT_S','30'))
+    max_body_bytes:int = int(os.environ.get('SERVE_MAX_BODY_BYTES',str(64*1024**2)))
+    retry_after_s:int = 1
+
+class AdmissionController():
+    """
+    Counts the admitted requests and rejects new ones when the server is saturated or draining.
+
+    Only the event loop thread touches the counters, so no lock is needed.
+
+    Attributes:
+        capacity (int): Largest number of requests admitted at the same time.
+    """
+    def __init__(self,capacity):
+        self.capacity = capacity
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def try_admit(self):
+        """
+        Admits a request if there is room for it.
+
+        Returns:
+            bool: True if the request was admitted and must be released when done.
+        """
+        if self.draining or self.in_flight >= self.capacity:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.admitted += 1
+        self._idle.clear()
+        return True
+
+    def release(self):
+        """Marks an admitted request as done."""
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self,timeout):
+        """
+        Stops admitting requests and waits for the admitted ones to finish.
+
+        Args:
+            timeout (float): Longest wait in seconds.
+
+        Returns:
+            bool: True if every admitted request finished in time.
+        """
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(),timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+class AsyncInferenceServer():
+    """
+    aiohttp application serving the prediction endpoints from a bounded thread pool.
+
+    Attributes:
+        async_server_config (AsyncServerConfig): Configuration object holding the address, \
+            pool size, queue depth and drain timeout.
+    """
+    def __init__(self,config=None):
+        self.async_server_config = config or AsyncServerConfig()
+        self.executor = None
+        self.admission = None
+        self.started = time.time()
+
+    def build_app(self):
+        """
+        Builds the aiohttp application with its routes and lifecycle hooks.
+
+        Returns:
+            web.Application: The application.
+        """
+        application = web.Application(middlewares=[self._metrics_middleware,
+                                                   self._admission_middleware],
+                                      client_max_size=self.async_server_config.max_body_bytes)
+        application.router.add_get('/',self.read_main)
+        application.router.add_get('/predict',self.generate_output)
+        application.router.add_post('/predict/batch',self.generate_batch_output)
+        application.router.add_get('/predict/stats',self.generate_stats)
+        application.router.add_get('/health',self.health)
+        application.router.add_get('/metrics',self.generate_metrics)
+        application.on_startup.append(self._start)
+        application.on_shutdown.append(self._drain)
+        application.on_cleanup.append(self._stop)
+        return application
+
+    async def _start(self,_application):
+        """
+        Creates the worker pool and loads the model artifacts before serving, unless they \
+            were preloaded by the pre-fork launcher.
+        """
+        config = self.async_server_config
+        self.executor = ThreadPoolExecutor(max_workers=config.workers,
+                                           thread_name_prefix='scoring')
+        self.admission = AdmissionController(config.workers + config.max_queue_depth)
+        CallbackMetric('server_in_flight_requests','Prediction requests admitted and not done.',
+                       lambda: self.admission.in_flight)
+        CallbackMetric('server_rejected_requests','Prediction requests rejected with a 503.',
+                       lambda: self.admission.rejected,kind='counter')
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor,predict_pipeline.inference_service.get_artifacts)
+        logging.info(f"Async server ready with {config.workers} workers and a queue depth "
+                     f"of {config.max_queue_depth}.")
+        threading.Thread(target=predict_pipeline.inference_service.warm_up,name='model-warm-up',
+                         daemon=True).start()
+
+    async def _drain(self,_application):
+        """Waits for the admitted requests to finish before the connections are closed."""
+        logging.info(f"Draining {self.admission.in_flight} in-flight requests.")
+        if not await self.admission.drain(self.async_server_config.drain_timeout_s):
+            logging.error(f"Drain timed out with {self.admission.in_flight} requests in flight.")
+
+    async def _stop(self,_application):
+        """Shuts the worker pool down once the server has drained."""
+        self.executor.shutdown(wait=True)
+        logging.info("Async server stopped.")
+
+    @web.middleware
+    async def _metrics_middleware(self,request,handler):
+        """Counts the prediction requests by status (503 rejections included) and times them."""
+        if request.path not in predict_pipeline.INSTRUMENTED_ENDPOINTS:
+            return await handler(request)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            predict_pipeline.record_request(request.path,request.method,status,
+                                     time.perf_counter() - start)
+
+    @web.middleware
+    async def _admission_middleware(self,request,handler):
+        """Rejects scoring requests with a 503 when the server is saturated or draining."""
+        if not request.path.startswith('/predict') or request.path == '/predict/stats':
+            return await handler(request)
+        if not self.admission.try_admit():
+            reason = 'draining' if self.admission.draining else 'saturated'
+            return web.json_response(
+                {'error':f"Server is {reason}, retry later."},status=503,
+                headers={'Retry-After':str(self.async_server_config.retry_after_s)})
+        try:
+            return await handler(request)
+        finally:
+            self.admission.release()
+
+    async def _run(self,function,*args):
+        """Runs a blocking function on the worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor,function,*args)
+
+    async def read_main(self,_request):
+        """Serve the main index page."""
+        return web.FileResponse(os.path.join('templates','index.html'))
+
+    async def generate_output(self,request):
+        """Predict the cost of one row given as `data` in the query string or a JSON body."""
+        input_data = request.query.get('data')
+        json_data = input_data is None
+        try:
+            if json_data:
+                input_data = await request.json()
+            pcos = await self._predict_row(input_data,json_data)
+        except RequestValidationError as e:
+            return web.json_response(e.to_dict(),status=400)
+        except ValueError as e:
+            return web.json_response({'error':str(e)},status=400)
+        return await self._json_response({'predicted':pcos})
+
+    async def generate_batch_output(self,request):
+        """Predict a batch given as a JSON body {"data": [[...]]} or an uploaded CSV `file`."""
+        try:
+            if request.content_type == 'multipart/form-data':
+                form = await request.post()
+                if 'file' not in form:
+                    raise RequestValidationError(
+                        'Expected a JSON body {"data": [[...], ...]} or a CSV file.')
+                batch = await self._run(predict_pipeline.parse_batch_file,form['file'].file)
+            else:
+                payload = await request.json()
+                batch = await self._run(predict_pipeline.parse_batch_body,payload)
+            if batch.n_rows > predict_pipeline.MAX_BATCH_SIZE:
+                return web.json_response(
+                    {'error':f"Batch of {batch.n_rows} rows exceeds the maximum of "
+                              f"{predict_pipeline.MAX_BATCH_SIZE}."},status=413)
+            prices = await self._run(predict_pipeline.process_batch,batch)
+        except RequestValidationError as e:
+            return web.json_response(e.to_dict(),status=400)
+        except ValueError as e:
+            return web.json_response({'error':str(e)},status=400)
+        return await self._json_response({'predicted':prices,'count':len(prices)})
+
+    async def _predict_row(self,input_data,json_data):
+        """
+        Parses a single-row request on the worker pool and awaits its micro-batched price \
+            on the event loop.
+
+        Args:
+            input_data (str or dict): The `data` query parameter or the JSON body.
+            json_data (bool): Whether the input is the JSON body.
+
+        Returns:
+            str: The predicted construction cost.
+        """
+        micro_batcher = predict_pipeline.micro_batcher
+        with micro_batcher.pending():
+            batch,key,cached = await self._run(predict_pipeline.prepare_prediction,input_data,
+                                               json_data)
+            if cached is not None:
+                return str(cached)
+            price = await asyncio.wrap_future(micro_batcher.enqueue(batch))
+            return predict_pipeline.finish_prediction(key,price)
+
+    async def _json_response(self,payload):
+        """Serializes a prediction response on the worker pool, timing the serialization."""
+        def serialize():
+            with predict_pipeline.stage_timer('serialize'):
+                return json.dumps(payload)
+        return web.json_response(text=await self._run(serialize))
+
+    async def generate_stats(self,_request):
+        """Report the micro-batching, prediction cache and admission statistics."""
+        return web.json_response({**predict_pipeline.collect_stats(),'server':self.server_stats()})
+
+    async def generate_metrics(self,_request):
+        """Expose the metrics in the Prometheus text format."""
+        return web.Response(text=REGISTRY.render(),content_type='text/plain',charset='utf-8')
+
+    async def health(self,_request):
+        """Report whether the server accepts requests (503 while draining)."""
+        status = 503 if self.admission.draining else 200
+        return web.json_response({'status':'draining' if status == 503 else 'ok',
+                                  **self.server_stats()},status=status)
+
+    def server_stats(self):
+        """
+        Returns the admission statistics of the server.
+
+        Returns:
+            dict: Requests in flight, capacity, and totals of admitted and rejected requests.
+        """
+        return {
+            'in_flight':self.admission.in_flight,
+            'capacity':self.admission.capacity,
+            'workers':self.async_server_config.workers,
+            'admitted':self.admission.admitted,
+            'rejected':self.admission.rejected,
+            'uptime_s':time.time() - self.started
+        }
+
+def main():
+    """Command-line entry point of the asynchronous inference server."""
+    try:
+        server = AsyncInferenceServer()
+        config = server.async_server_config
+        web.run_app(server.build_app(),host=config.host,port=config.port,
+                    shutdown_timeout=config.drain_timeout_s,print=None)
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+if __name__ == '__main__':
+    main()
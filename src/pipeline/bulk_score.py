@@ -0,0 +1,371 @@
+"""
+This module provides the offline bulk scorer used to re-price whole portfolios of estimate \
+    rows shaped like `notebooks/cleaned_data.csv`.
+
+The input CSV or Parquet file is streamed in chunks, so its size is not bounded by memory. \
+    The chunks are scored by a process pool whose workers each load the model artifacts \
+        once, and the predictions are written in input order. Columns may use the training or \
+            the serving names; the target and any other column are ignored unless kept with \
+                `--keep-columns`.
+
+Every scored chunk is written atomically as a part file next to a manifest in \
+    `<output>.parts/`, which doubles as the checkpoint: a rerun of the same command on the \
+        same input and model skips the chunks already written. Once every chunk is scored the \
+            parts are merged into the output (a CSV file, or a directory of Parquet part files \
+                like the pipeline artifacts) and the checkpoint is removed.
+
+Run it with `python -m src.pipeline.bulk_score INPUT OUTPUT`.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from src.exception import CustomException
+from src.logger import logging
+from src.pipeline.inference_service import InferenceService,InferenceServiceConfig
+
+PARTS_SUFFIX = '.parts'
+MANIFEST_FILE = 'manifest.json'
+PREDICTION_COLUMN = 'predicted'
+
+@dataclass
+class BulkScoreConfig():
+    """
+    Configuration class for the bulk scorer.
+
+    Attributes:
+        chunk_size (int): Number of input rows read and scored per chunk.
+        workers (int): Number of scoring processes; 1 scores in the main process.
+        chunks_per_worker (int): Chunks read ahead per worker, which bounds the memory held \
+            by chunks waiting to be scored or written.
+        progress_interval_s (float): Seconds between two progress reports.
+        keep_columns (list): Input columns copied to the output next to the predictions.
+    """
+    chunk_size:int = int(os.environ.get('BULK_CHUNK_SIZE','50000'))
+    workers:int = int(os.environ.get('BULK_WORKERS',str(os.cpu_count() or 1)))
+    chunks_per_worker:int = 2
+    progress_interval_s:float = 5.0
+    keep_columns:list = field(default_factory=list)
+
+_worker_service = None # pylint: disable=C0103
+
+def _load_service(model_version=None):
+    """
+    Loads the inference service used to score chunks, with the native model preloaded.
+
+    Args:
+        model_version (str): Registry version to load, so that every worker scores with the \
+            version of the main process even if the current version changes meanwhile.
+    """
+    config = InferenceServiceConfig(reload_check_interval=-1,lazy_model_load=False)
+    if model_version is not None:
+        config.model_version = model_version
+    service = InferenceService(config)
+    service.load()
+    return service
+
+def _init_worker(model_version):
+    """Loads the model artifacts once per worker process."""
+    global _worker_service # pylint: disable=W0603
+    _worker_service = _load_service(model_version)
+
+def _score_in_worker(features):
+    """Scores the feature columns of one chunk with the artifacts of this worker."""
+    return _worker_service.predict(features)
+
+def input_format(path):
+    """
+    Returns the format of the input from its extension.
+
+    Args:
+        path (str): The input file (or Parquet directory).
+
+    Returns:
+        str: 'csv' or 'parquet'.
+
+    Raises:
+        ValueError: If the format cannot be streamed.
+    """
+    extension = os.path.splitext(path.rstrip(os.sep))[1].lstrip('.').lower()
+    if extension not in ('csv','parquet'):
+        raise ValueError(f"Unsupported bulk scoring format {extension!r} for {path}, "
+                         "expected .csv or .parquet.")
+    return extension
+
+class BulkScorer():
+    """
+    Streams an input file through a pool of scoring processes into an output file.
+
+    Attributes:
+        bulk_score_config (BulkScoreConfig): Chunking, parallelism and output settings.
+        service (InferenceService): Service of the main process, which provides the feature \
+            schema and the model version, and scores the chunks itself with a single worker.
+    """
+    def __init__(self,config=None):
+        self.bulk_score_config = config or BulkScoreConfig()
+        self.service = InferenceService(InferenceServiceConfig(reload_check_interval=-1))
+
+    def read_chunks(self,input_path,columns):
+        """
+        Streams the input in chunks of `chunk_size` rows.
+
+        Args:
+            input_path (str): The input CSV file, or Parquet file or directory.
+            columns (list): The input columns to read.
+
+        Yields:
+            pd.DataFrame: The next chunk.
+        """
+        chunk_size = self.bulk_score_config.chunk_size
+        if input_format(input_path) == 'csv':
+            schema = self.service.get_artifacts().feature_schema
+            dtypes = {}
+            for column in schema.columns:
+                dtype = str if column in schema.categorical_columns else 'float64'
+                dtypes[column] = dtypes[schema.serving_name(column)] = dtype
+            yield from pd.read_csv(input_path,usecols=columns,dtype=dtypes,chunksize=chunk_size)
+            return
+        import pyarrow.dataset as ds # pylint: disable=C0415
+        for batch in ds.dataset(input_path,format='parquet').to_batches(columns=columns,
+                                                                         batch_size=chunk_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def input_columns(self,input_path):
+        """
+        Finds the input columns to read: the features (under either name) and the kept columns.
+
+        Args:
+            input_path (str): The input file.
+
+        Returns:
+            list: The columns to read.
+
+        Raises:
+            ValueError: If a feature or kept column is missing.
+        """
+        if input_format(input_path) == 'csv':
+            available = list(pd.read_csv(input_path,nrows=0).columns)
+        else:
+            import pyarrow.dataset as ds # pylint: disable=C0415
+            available = ds.dataset(input_path,format='parquet').schema.names
+        schema = self.service.get_artifacts().feature_schema
+        columns,missing = [],[]
+        for column in schema.columns:
+            if column in available:
+                columns.append(column)
+            elif schema.serving_name(column) in available:
+                columns.append(schema.serving_name(column))
+            else:
+                missing.append(column)
+        missing += [c for c in self.bulk_score_config.keep_columns if c not in available]
+        if missing:
+            raise ValueError(f"The input {input_path} has no column {missing}.")
+        return columns + [c for c in self.bulk_score_config.keep_columns if c not in columns]
+
+    def _manifest(self,input_path,output_path):
+        """Describes the run, so that a checkpoint is only resumed by the same run."""
+        stat = os.stat(input_path)
+        return {'input':os.path.abspath(input_path),'input_size':stat.st_size,
+                'input_mtime_ns':stat.st_mtime_ns,'output':os.path.abspath(output_path),
+                'chunk_size':self.bulk_score_config.chunk_size,
+                'keep_columns':self.bulk_score_config.keep_columns,
+                'model_version':self.service.get_artifacts().version}
+
+    def _open_checkpoint(self,input_path,output_path,restart):
+        """
+        Creates the parts directory, or checks that an existing one belongs to this run.
+
+        Returns:
+            str: The parts directory.
+
+        Raises:
+            ValueError: If the checkpoint was written by another input, model or chunk size.
+        """
+        parts_dir = output_path.rstrip(os.sep) + PARTS_SUFFIX
+        manifest = self._manifest(input_path,output_path)
+        manifest_path = os.path.join(parts_dir,MANIFEST_FILE)
+        if restart and os.path.isdir(parts_dir):
+            shutil.rmtree(parts_dir)
+        if os.path.exists(manifest_path):
+            with open(manifest_path,encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous != manifest:
+                raise ValueError(f"The checkpoint {parts_dir} was written for another input, "
+                                 "model or chunk size; rerun with --restart to discard it.")
+            logging.info(f"Resuming bulk scoring from the checkpoint {parts_dir}.")
+            return parts_dir
+        os.makedirs(parts_dir,exist_ok=True)
+        with open(manifest_path,'w',encoding='utf-8') as f:
+            json.dump(manifest,f,indent=4)
+        return parts_dir
+
+    @staticmethod
+    def _part_path(parts_dir,index,output_format):
+        """Returns the path of the part file of a chunk."""
+        return os.path.join(parts_dir,f"part-{index:06d}.{output_format}")
+
+    def _write_part(self,parts_dir,index,chunk,predictions,output_format): # pylint: disable=R0913,R0917
+        """Writes the predictions of a chunk (and its kept columns) atomically."""
+        part = chunk[self.bulk_score_config.keep_columns].reset_index(drop=True)
+        part[PREDICTION_COLUMN] = np.asarray(predictions,dtype='float64')
+        path = self._part_path(parts_dir,index,output_format)
+        tmp_path = path + '.tmp'
+        if output_format == 'csv':
+            part.to_csv(tmp_path,index=False)
+        else:
+            part.to_parquet(tmp_path,index=False)
+        os.replace(tmp_path,path)
+
+    def _merge(self,parts_dir,n_chunks,output_path,output_format):
+        """Merges the part files into the output in input order and removes the checkpoint."""
+        if output_format == 'parquet':
+            if os.path.isdir(output_path):
+                shutil.rmtree(output_path)
+            os.makedirs(output_path)
+            for index in range(n_chunks):
+                os.replace(self._part_path(parts_dir,index,output_format),
+                           os.path.join(output_path,f"part-{index:06d}.parquet"))
+        else:
+            tmp_path = output_path + '.tmp'
+            with open(tmp_path,'wb') as out:
+                if n_chunks == 0:
+                    columns = self.bulk_score_config.keep_columns + [PREDICTION_COLUMN]
+                    out.write((','.join(columns) + '\n').encode())
+                for index in range(n_chunks):
+                    with open(self._part_path(parts_dir,index,output_format),'rb') as part:
+                        header = part.readline()
+                        if index == 0:
+                            out.write(header)
+                        shutil.copyfileobj(part,out)
+            os.replace(tmp_path,output_path)
+        shutil.rmtree(parts_dir)
+
+    def score_file(self,input_path,output_path,restart=False): # pylint: disable=R0914
+        """
+        Scores every row of the input file and writes the predictions in input order.
+
+        Args:
+            input_path (str): The input CSV file, or Parquet file or directory.
+            output_path (str): The output CSV file or Parquet directory.
+            restart (bool): Discard an existing checkpoint instead of resuming from it.
+
+        Returns:
+            dict: The number of rows scored and skipped, the wall time and the rows per second.
+
+        Raises:
+            CustomException: If the input cannot be read or a chunk cannot be scored.
+        """
+        try:
+            config = self.bulk_score_config
+            output_format = input_format(output_path)
+            feature_columns = self.input_columns(input_path)
+            artifacts = self.service.get_artifacts()
+            schema = artifacts.feature_schema
+            parts_dir = self._open_checkpoint(input_path,output_path,restart)
+            logging.info(f"Bulk scoring {input_path} into {output_path} with {config.workers} "
+                         f"workers and chunks of {config.chunk_size} rows.")
+
+            progress = _Progress(config.progress_interval_s)
+            pending = deque()
+            n_chunks = 0
+            executor = None
+            if config.workers > 1:
+                executor = ProcessPoolExecutor(max_workers=config.workers,
+                                               mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=_init_worker,
+                                               initargs=(artifacts.registry_version,))
+            try:
+                for index,chunk in enumerate(self.read_chunks(input_path,feature_columns)):
+                    n_chunks = index + 1
+                    if os.path.exists(self._part_path(parts_dir,index,output_format)):
+                        progress.skipped(len(chunk))
+                        continue
+                    features = schema.align_frame(chunk)
+                    if executor is None:
+                        predictions = self.service.predict(features)
+                        self._write_part(parts_dir,index,chunk,predictions,output_format)
+                        progress.scored(len(chunk))
+                        continue
+                    pending.append((index,chunk,executor.submit(_score_in_worker,features)))
+                    while len(pending) >= config.workers*config.chunks_per_worker:
+                        self._write_next(pending,parts_dir,output_format,progress)
+                while pending:
+                    self._write_next(pending,parts_dir,output_format,progress)
+            finally:
+                if executor is not None:
+                    for _,_,future in pending:
+                        future.cancel()
+                    executor.shutdown(wait=True)
+
+            self._merge(parts_dir,n_chunks,output_path,output_format)
+            summary = progress.summary()
+            logging.info(f"Bulk scoring finished: {summary}.")
+            return summary
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def _write_next(self,pending,parts_dir,output_format,progress):
+        """Waits for the oldest pending chunk and writes its predictions."""
+        index,chunk,future = pending.popleft()
+        self._write_part(parts_dir,index,chunk,future.result(),output_format)
+        progress.scored(len(chunk))
+
+class _Progress():
+    """Counts the scored rows and reports the throughput at a fixed interval."""
+    def __init__(self,interval_s):
+        self.interval_s = interval_s
+        self.started = self.last_report = time.perf_counter()
+        self.rows = 0
+        self.skipped_rows = 0
+
+    def scored(self,n_rows):
+        """Records a scored chunk and reports the progress if the interval elapsed."""
+        self.rows += n_rows
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval_s:
+            self.last_report = now
+            print(f"Scored {self.rows} rows ({self.rows/(now - self.started):.0f} rows/s).",
+                  file=sys.stderr,flush=True)
+
+    def skipped(self,n_rows):
+        """Records a chunk already scored by a previous run."""
+        self.skipped_rows += n_rows
+
+    def summary(self):
+        """Returns the totals of the run."""
+        elapsed = time.perf_counter() - self.started
+        return {'rows':self.rows,'skipped_rows':self.skipped_rows,'seconds':round(elapsed,3),
+                'rows_per_s':round(self.rows/elapsed,1) if elapsed > 0 else None}
+
+def main(argv=None):
+    """Command-line entry point of the bulk scorer."""
+    parser = argparse.ArgumentParser(description='Score a CSV or Parquet file of estimate rows.')
+    parser.add_argument('input',help='Input .csv file, or .parquet file or directory.')
+    parser.add_argument('output',help='Output .csv file or .parquet directory.')
+    parser.add_argument('--chunk-size',type=int,default=BulkScoreConfig.chunk_size,
+                        help='Rows per chunk (default BULK_CHUNK_SIZE or 50000).')
+    parser.add_argument('--workers',type=int,default=BulkScoreConfig.workers,
+                        help='Scoring processes (default BULK_WORKERS or the number of cores).')
+    parser.add_argument('--keep-columns',nargs='+',default=[],
+                        help='Input columns copied to the output, such as an identifier.')
+    parser.add_argument('--restart',action='store_true',
+                        help='Discard the checkpoint of a previous run instead of resuming.')
+    args = parser.parse_args(argv)
+    config = BulkScoreConfig(chunk_size=args.chunk_size,workers=args.workers,
+                             keep_columns=args.keep_columns)
+    summary = BulkScorer(config).score_file(args.input,args.output,restart=args.restart)
+    print(f"Scored {summary['rows']} rows in {summary['seconds']}s "
+          f"({summary['rows_per_s']} rows/s); {summary['skipped_rows']} rows were resumed "
+          f"from the checkpoint. Predictions written to {args.output}.")
+
+if __name__ == '__main__':
+    main()
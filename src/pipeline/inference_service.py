@@ -0,0 +1,470 @@
+"""
+This module provides a resident inference service that keeps the trained model and the \
+    categorical encoder in memory for the lifetime of the serving process.
+
+The artifacts are loaded once (eagerly at startup or lazily on first use) and shared by \
+    every Flask worker thread through an immutable snapshot. The service periodically \
+        checks the artifact files on disk and hot-reloads them when they change; requests \
+            that are already in flight keep scoring with the snapshot they started with.
+
+When the model registry has a current version, the artifacts are read from that immutable \
+    version directory and the registry pointer is what the service watches: promoting or \
+        rolling back a version switches the service over on its next check. Without a \
+            registry version, the configured paths in `src/models` are served.
+
+Requests are encoded with the lookup tables exported from the categorical encoder \
+    (`TargetEncodingTable`) instead of running the encoder through pandas.
+
+Startup only deserializes what scoring needs: the encoding tables, the feature schema and \
+    the compiled model. The original model and the encoder are deserialized on first use \
+        (the encoder only when the tables must be exported again), so the serving process \
+            imports neither category_encoders nor the model library (XGBoost, CatBoost or \
+                scikit-learn) until a large batch needs the native model.
+"""
+import os
+import sys
+import hashlib
+import dataclasses
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import dill
+import numpy as np
+from src.exception import CustomException
+from src.logger import logging
+from src.components.encoding_tables import TargetEncodingTable
+from src.components.stage_cache import hash_file
+from src.components.tree_compiler import CompiledTreeEnsemble
+from src.components.mapped_pickle import load_mapped_object
+from src.components.model_registry import ModelRegistry,ModelRegistryConfig
+from src.components.feature_schema import FeatureSchema
+from src.pipeline.request_parser import RequestParser
+from src.pipeline.metrics import STAGE_SECONDS,MODEL_INFO,MODEL_LOAD_SECONDS
+
+@dataclass
+class InferenceServiceConfig(): # pylint: disable=R0902
+    """
+    Configuration class for the inference service.
+
+    Attributes:
+        model_path (str): Path of the persisted best model.
+        categorical_encoder_path (str): Path of the persisted categorical (target) encoder.
+        encoding_table_path (str): Path of the lookup tables exported from the encoder.
+        compiled_model_path (str): Path of the best model compiled into flat node arrays.
+        feature_schema_path (str): Path of the feature schema saved by the training pipeline.
+        compiled_max_rows (int): Largest number of rows scored with the compiled model; \
+            bigger batches go to the original model, whose native batch path is faster.
+        reload_check_interval (float): Minimum number of seconds between two checks of the \
+            artifact files for changes. A negative value disables hot-reloading.
+        lazy_model_load (bool): Deserialize the original model on first use when a compiled \
+            model can score the small batches; otherwise it is loaded with the snapshot.
+        mmap_model_arrays (bool): Memory-map the node arrays of the compiled model read-only, \
+            so that all the serving processes share one copy of them.
+        registry_dir (str): Directory of the model registry whose current version is served.
+        model_version (str): Registry version to serve instead of the current one \
+            (set through `MODEL_VERSION`); it is not switched when the pointer moves.
+    """
+    model_path:str = os.path.join('src/models','best_model.pkl')
+    categorical_encoder_path:str = os.path.join('src/models','categorical_encoder.pkl')
+    encoding_table_path:str = os.path.join('src/models','encoding_table.pkl')
+    compiled_model_path:str = os.path.join('src/models','compiled_model.pkl')
+    feature_schema_path:str = os.path.join('src/models','feature_schema.json')
+    compiled_max_rows:int = int(os.environ.get('COMPILED_MAX_ROWS','64'))
+    reload_check_interval:float = 2.0
+    lazy_model_load:bool = os.environ.get('LAZY_MODEL_LOAD','1') != '0'
+    mmap_model_arrays:bool = os.environ.get('MMAP_MODEL_ARRAYS','1') != '0'
+    registry_dir:str = ModelRegistryConfig.registry_dir
+    model_version:Optional[str] = os.environ.get('MODEL_VERSION')
+
+ARTIFACT_PATH_FIELDS = ('model_path','categorical_encoder_path','encoding_table_path',
+                        'compiled_model_path','feature_schema_path')
+
+class LazyArtifact():
+    """
+    A pickled artifact deserialized on first use, once, whichever thread asks first.
+
+    The file signature is recorded when the snapshot is built; a file replaced before the \
+        first use is refused instead of silently mixing two artifact versions (the next \
+            hot-reload picks the new file up).
+
+    Attributes:
+        path (str): Path of the pickled artifact.
+        signature (tuple): Modification time and size of the file when the snapshot was built.
+        validate (callable): Optional check called with the deserialized object.
+    """
+    def __init__(self,path,validate=None):
+        self.path = path
+        stat = os.stat(path)
+        self.signature = (stat.st_mtime_ns,stat.st_size)
+        self.validate = validate
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Whether the artifact was deserialized already."""
+        return self._value is not None
+
+    def get(self):
+        """
+        Returns the artifact, deserializing it on the first call.
+
+        Returns:
+            The deserialized artifact.
+
+        Raises:
+            RuntimeError: If the file changed since the snapshot was built.
+        """
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._load()
+        return self._value
+
+    def _load(self):
+        """Deserializes and validates the artifact file."""
+        started = time.perf_counter()
+        stat = os.stat(self.path)
+        if (stat.st_mtime_ns,stat.st_size) != self.signature:
+            raise RuntimeError(f"{self.path} changed since the model artifacts were loaded.")
+        with open(self.path,'rb') as f:
+            value = dill.load(f)
+        if self.validate is not None:
+            self.validate(value)
+        logging.info(f"Loaded {self.path} in {time.perf_counter() - started:.3f}s.")
+        return value
+
+@dataclass(frozen=True)
+class ModelArtifacts(): # pylint: disable=R0902
+    """
+    Immutable snapshot of the artifacts used to score a request.
+
+    Attributes:
+        model (LazyArtifact): The best model, deserialized on first use unless it was \
+            loaded with the snapshot.
+        encoder (LazyArtifact): The categorical encoder, deserialized on first use.
+        encoding_table (TargetEncodingTable): The lookup tables used to encode requests.
+        compiled_model (CompiledTreeEnsemble): The compiled best model, or None when the \
+            model was not compiled.
+        feature_schema (FeatureSchema): The column order, dtypes and roles of the features.
+        request_parser (RequestParser): The request parser built from the feature schema.
+        version (str): Registry version of the snapshot, or fingerprint of the artifact files \
+            it was loaded from.
+        registry_version (str): Registry version of the snapshot, or None when it was loaded \
+            from the configured paths.
+        loaded_at (float): Unix timestamp at which the snapshot was loaded.
+        load_seconds (float): Time taken to load the snapshot, the original model excluded \
+            while it is lazy.
+    """
+    model:LazyArtifact
+    encoder:LazyArtifact
+    encoding_table:TargetEncodingTable
+    compiled_model:Optional[CompiledTreeEnsemble]
+    feature_schema:FeatureSchema
+    request_parser:RequestParser
+    version:str
+    registry_version:Optional[str]
+    loaded_at:float
+    load_seconds:float
+
+class InferenceService():
+    """
+    Resident, thread-safe holder of the model and encoder used by the prediction endpoints.
+
+    Readers never take a lock: they grab the current `ModelArtifacts` snapshot and use it \
+        until they are done. A reload builds a completely new snapshot and swaps the reference \
+            in one assignment, so in-flight requests are never affected by a reload.
+
+    Attributes:
+        inference_service_config (InferenceServiceConfig): Configuration object holding the \
+            artifact paths and the reload policy.
+        registry (ModelRegistry): The model registry whose current version is served.
+    """
+    def __init__(self,config=None):
+        self.inference_service_config = config or InferenceServiceConfig()
+        self.registry = ModelRegistry(ModelRegistryConfig(
+            registry_dir=self.inference_service_config.registry_dir))
+        self._artifacts = None
+        self._reload_lock = threading.Lock()
+        self._last_check = 0.0
+
+    def _artifact_paths(self):
+        """
+        Resolves the artifact files to serve: those of the pinned or current registry \
+            version, or the configured paths when the registry has no current version.
+
+        Returns:
+            tuple: The registry version (None for the configured paths) and a configuration \
+                holding the paths of its files.
+        """
+        config = self.inference_service_config
+        version = config.model_version or self.registry.current_version()
+        if version is None:
+            return None,config
+        directory = self.registry.version_dir(version)
+        return version,dataclasses.replace(config,**{
+            name:os.path.join(directory,os.path.basename(getattr(config,name)))
+            for name in ARTIFACT_PATH_FIELDS})
+
+    def _fingerprint(self):
+        """
+        Identifies the artifacts on disk: the registry version, whose files never change, or \
+            a fingerprint of the configured files.
+
+        Returns:
+            str: The version of the artifacts to serve, which also labels the metrics.
+        """
+        version,config = self._artifact_paths()
+        return version or self._file_fingerprint(config)
+
+    @staticmethod
+    def _file_fingerprint(config):
+        """
+        Builds a cheap fingerprint of the artifact files from their modification time and size.
+
+        The fingerprint is hashed to a short digest.
+
+        Args:
+            config (InferenceServiceConfig): The configuration holding the artifact paths.
+
+        Returns:
+            str: The fingerprint.
+        """
+        parts = []
+        for path in (config.model_path,config.categorical_encoder_path,
+                     config.feature_schema_path,config.encoding_table_path,
+                     config.compiled_model_path):
+            if path in (config.encoding_table_path,config.compiled_model_path) \
+                    and not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        return hashlib.sha256('.'.join(parts).encode()).hexdigest()[:16]
+
+    def _load_artifacts(self):
+        """
+        Deserializes the artifacts needed to score into a new snapshot.
+
+        The feature schema is checked against the encoding tables and the model (the compiled \
+            one, or the original one once it is loaded), so a model trained on another feature \
+                layout is never served.
+
+        Files outside the registry are fingerprinted before and after reading so that a file \
+            replaced while it is being read is detected and reported instead of being served \
+                half-written; registry versions are immutable and need no such check.
+
+        Returns:
+            ModelArtifacts: The freshly loaded snapshot.
+        """
+        started = time.perf_counter()
+        registry_version,config = self._artifact_paths()
+        version = registry_version or self._file_fingerprint(config)
+        feature_schema = FeatureSchema.load(config.feature_schema_path)
+        encoder = LazyArtifact(config.categorical_encoder_path)
+        encoding_table = self._load_encoding_table(config,encoder)
+        model = LazyArtifact(config.model_path,validate=lambda model: feature_schema.check(
+            encoding_table.cols,getattr(model,'n_features_in_',None)))
+        compiled_model = self._load_compiled_model(config)
+        if compiled_model is None or not config.lazy_model_load:
+            model.get()
+        else:
+            feature_schema.check(encoding_table.cols,compiled_model.n_features or None)
+        if registry_version is None and self._file_fingerprint(config) != version:
+            raise RuntimeError("Model artifacts changed while they were being loaded.")
+        return ModelArtifacts(model=model,encoder=encoder,encoding_table=encoding_table,
+                              compiled_model=compiled_model,feature_schema=feature_schema,
+                              request_parser=RequestParser(feature_schema),version=version,
+                              registry_version=registry_version,loaded_at=time.time(),
+                              load_seconds=time.perf_counter() - started)
+
+    @staticmethod
+    def _load_compiled_model(config):
+        """
+        Loads the compiled model if it was compiled from the current model file.
+
+        Its node arrays are memory-mapped from the `.npy` files saved next to the pickle \
+            unless `mmap_model_arrays` is off.
+
+        Args:
+            config (InferenceServiceConfig): The configuration holding the artifact paths.
+
+        Returns:
+            CompiledTreeEnsemble: The compiled model, or None when it is missing or stale.
+        """
+        if not os.path.exists(config.compiled_model_path):
+            return None
+        compiled_model = load_mapped_object(config.compiled_model_path,
+                                            mmap_mode='r' if config.mmap_model_arrays else None)
+        if compiled_model.source_digest != hash_file(config.model_path):
+            logging.info("Compiled model is stale, serving the original model.")
+            return None
+        return compiled_model
+
+    @staticmethod
+    def _load_encoding_table(config,encoder):
+        """
+        Loads the exported encoding tables, or exports them again when they are missing or \
+            were exported from another encoder file.
+
+        Args:
+            config (InferenceServiceConfig): The configuration holding the artifact paths.
+            encoder (LazyArtifact): The categorical encoder, only deserialized to export the \
+                tables again.
+
+        Returns:
+            TargetEncodingTable: Lookup tables matching the encoder.
+        """
+        digest = hash_file(config.categorical_encoder_path)
+        if os.path.exists(config.encoding_table_path):
+            with open(config.encoding_table_path,'rb') as t:
+                encoding_table = dill.load(t)
+            if encoding_table.source_digest == digest:
+                return encoding_table
+        logging.info("Encoding tables are missing or stale, exporting them from the encoder.")
+        return TargetEncodingTable.from_encoder(encoder.get(),source_digest=digest)
+
+    def load(self):
+        """
+        Loads (or reloads) the artifacts and makes them the current snapshot.
+
+        Returns:
+            ModelArtifacts: The snapshot that is now being served.
+
+        Raises:
+            CustomException: If the artifacts cannot be loaded.
+        """
+        try:
+            with self._reload_lock:
+                artifacts = self._load_artifacts()
+                self._publish(artifacts)
+                self._last_check = time.monotonic()
+            logging.info(f"Loaded model artifacts version {artifacts.version} in "
+                         f"{artifacts.load_seconds:.3f}s.")
+            return artifacts
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def warm_up(self):
+        """
+        Deserializes the original model of the current snapshot if it is still lazy, so that \
+            the first large batch does not pay for it. Meant to run on a background thread \
+                once the service is ready; a failure is logged and left to the first use.
+        """
+        try:
+            self.get_artifacts().model.get()
+        except Exception as e: # pylint: disable=W0718
+            logging.error(f"Warm-up of the original model failed: {e}")
+
+    def _publish(self,artifacts):
+        """
+        Makes a loaded snapshot the current one and reports its version and load time in the \
+            metrics.
+        """
+        self._artifacts = artifacts
+        MODEL_INFO.clear()
+        MODEL_INFO.labels(artifacts.version).set(1)
+        MODEL_LOAD_SECONDS.clear()
+        MODEL_LOAD_SECONDS.labels(artifacts.version).set(artifacts.load_seconds)
+
+    def _maybe_reload(self):
+        """
+        Reloads the artifacts if the files on disk changed since the last check.
+
+        Only one thread performs the check at a time; the others keep serving the current \
+            snapshot instead of waiting. A failed reload keeps the previous snapshot in service.
+        """
+        interval = self.inference_service_config.reload_check_interval
+        if interval < 0 or time.monotonic() - self._last_check < interval:
+            return
+        if not self._reload_lock.acquire(blocking=False): # pylint: disable=R1732
+            return
+        try:
+            self._last_check = time.monotonic()
+            if self._fingerprint() == self._artifacts.version:
+                return
+            self._publish(self._load_artifacts())
+            logging.info(f"Hot-reloaded model artifacts version {self._artifacts.version} in "
+                         f"{self._artifacts.load_seconds:.3f}s.")
+        except Exception as e: # pylint: disable=W0718
+            logging.error(f"Hot-reload of model artifacts failed, keeping current version: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def get_artifacts(self):
+        """
+        Returns the snapshot to score the current request with, loading it on first use.
+
+        Returns:
+            ModelArtifacts: The current snapshot.
+        """
+        if self._artifacts is None:
+            with self._reload_lock:
+                if self._artifacts is None:
+                    self._publish(self._load_artifacts())
+                    self._last_check = time.monotonic()
+                    logging.info(f"Loaded model artifacts version {self._artifacts.version} "
+                                 f"in {self._artifacts.load_seconds:.3f}s.")
+            return self._artifacts
+        self._maybe_reload()
+        return self._artifacts
+
+    def predict(self,input_df):
+        """
+        Encodes the categorical columns of the input frame and predicts the construction cost.
+
+        Args:
+            input_df (pd.DataFrame): Input rows holding the feature columns under their \
+                training or serving names; they are put in model order.
+
+        Returns:
+            np.ndarray: One predicted cost per input row.
+        """
+        artifacts = self.get_artifacts()
+        with STAGE_SECONDS.labels('encode',artifacts.version).time():
+            input_df = artifacts.feature_schema.align_frame(input_df)
+            input_df = artifacts.encoding_table.transform(input_df)
+            input_array = np.array(input_df).reshape(len(input_df),-1)
+        with STAGE_SECONDS.labels('predict',artifacts.version).time():
+            return self._score(artifacts,input_array)
+
+    def _score(self,artifacts,input_array):
+        """
+        Scores encoded rows with the compiled model for small batches, else the original model.
+
+        Args:
+            artifacts (ModelArtifacts): The snapshot to score with.
+            input_array (np.ndarray): The encoded rows.
+
+        Returns:
+            np.ndarray: One predicted cost per row.
+        """
+        if artifacts.compiled_model is not None and \
+                len(input_array) <= self.inference_service_config.compiled_max_rows:
+            return artifacts.compiled_model.predict(input_array)
+        return artifacts.model.get().predict(input_array)
+
+    def predict_parsed(self,batch):
+        """
+        Encodes and scores rows parsed by a `RequestParser`, without building a DataFrame.
+
+        The rows are scored with the snapshot they were parsed with, so a hot reload between \
+            parsing and scoring never pairs them with another schema or encoder.
+
+        Args:
+            batch (ParsedBatch): The parsed rows; their categorical columns are encoded in place.
+
+        Returns:
+            np.ndarray: One predicted cost per input row.
+
+        Raises:
+            ValueError: If a category is rejected by the encoder.
+        """
+        artifacts = batch.artifacts or self.get_artifacts()
+        encoding_table = artifacts.encoding_table
+        positions = artifacts.feature_schema.positions
+        with STAGE_SECONDS.labels('encode',artifacts.version).time():
+            for column,values in batch.categories.items():
+                batch.features[:,positions[column]] = encoding_table.encode_column(column,values)
+        with STAGE_SECONDS.labels('predict',artifacts.version).time():
+            return self._score(artifacts,batch.features)
@@ -0,0 +1,293 @@
+"""
+This module provides the in-process metrics of the serving path, exposed on `/metrics` in \
+    the Prometheus text format.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock per label set, so \
+    recording a sample costs about a microsecond and never touches a file. The metrics of the \
+        prediction hot path are defined here once and shared by the Flask app, the asynchronous \
+            server and the inference service. Every worker process keeps its own values, as \
+                with the default registry of the Prometheus client libraries.
+"""
+import abc
+import time
+import bisect
+import threading
+
+LATENCY_BUCKETS_S = (0.00005,0.0001,0.00025,0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,
+                     0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+BATCH_ROWS_BUCKETS = (1,2,4,8,16,32,64,128,256,512,1024,2048,4096,8192,16384)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    """Escapes a label value for the text format."""
+    return str(value).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n')
+
+def _format_value(value):
+    """Formats a sample value for the text format."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value,float) else str(value)
+
+def _format_labels(names,values,extra=''):
+    """Formats a label set, with an optional extra pre-formatted label (such as `le`)."""
+    pairs = [f'{name}="{_escape(value)}"' for name,value in zip(names,values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Timer():
+    """
+    Context manager observing the seconds spent in its block into a histogram.
+
+    Attributes:
+        histogram (_HistogramChild): The histogram the duration is recorded in.
+    """
+    __slots__ = ('histogram','start')
+
+    def __init__(self,histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class _CounterChild(): # pylint: disable=R0903
+    """Value of a counter for one label set."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self,amount=1):
+        """Increments the counter."""
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild(_CounterChild):
+    """Value of a gauge for one label set."""
+    def set(self,value):
+        """Sets the gauge."""
+        with self._lock:
+            self.value = value
+
+    def dec(self,amount=1):
+        """Decrements the gauge."""
+        self.inc(-amount)
+
+class _HistogramChild():
+    """Buckets, sum and count of a histogram for one label set."""
+    def __init__(self,buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self,value):
+        """Records one sample."""
+        index = bisect.bisect_left(self.buckets,value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """
+        Returns a context manager timing its block into this histogram.
+
+        Returns:
+            Timer: The timer.
+        """
+        return Timer(self)
+
+class Metric(abc.ABC):
+    """
+    Metric family with a fixed set of label names; subclasses define the value holder of a \
+        label set.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The HELP text.
+        labelnames (tuple): The label names; values are given to `labels` in this order.
+    """
+    kind = 'untyped'
+
+    def __init__(self,name,documentation,labelnames=(),registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Creates the value holder of a new label set."""
+
+    def labels(self,*values):
+        """
+        Returns the value holder of a label set, creating it on first use.
+
+        Args:
+            *values: One value per label name.
+
+        Returns:
+            The child counter, gauge or histogram.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects the labels {self.labelnames}.")
+            with self._lock:
+                child = self._children.setdefault(values,self._new_child())
+        return child
+
+    def clear(self):
+        """Removes every label set."""
+        with self._lock:
+            self._children = {}
+
+    def samples(self):
+        """
+        Returns the samples of every label set.
+
+        Returns:
+            list: Tuples of (sample name suffix, label values, extra label, value).
+        """
+        return [('',values,'',child.value) for values,child in list(self._children.items())]
+
+    def render(self):
+        """
+        Renders the metric family in the Prometheus text format.
+
+        Returns:
+            list: The lines of the family.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}",f"# TYPE {self.name} {self.kind}"]
+        for suffix,values,extra,value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames,values,extra)} "
+                         f"{_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def samples(self):
+        return [('_total',values,'',value) for _,values,_,value in super().samples()]
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, in increasing order.
+    """
+    kind = 'histogram'
+
+    def __init__(self,name,documentation,labelnames=(),buckets=LATENCY_BUCKETS_S,registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name,documentation,labelnames,registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def samples(self):
+        samples = []
+        for values,child in list(self._children.items()):
+            with child._lock: # pylint: disable=W0212
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound,count in zip(self.buckets + (float('inf'),),counts):
+                cumulative += count
+                samples.append(('_bucket',values,f'le="{_format_value(float(bound))}"',
+                                cumulative))
+            samples.append(('_sum',values,'',total))
+            samples.append(('_count',values,'',cumulative))
+        return samples
+
+class CallbackMetric(Metric):
+    """
+    Gauge or counter whose values are read from a function when the metrics are scraped, \
+        for values another component already keeps (such as the cache counters).
+
+    Attributes:
+        function (callable): Returns a number, or a dictionary from label-value tuples to \
+            numbers when the metric has labels.
+    """
+    def __init__(self,name,documentation,function,labelnames=(),kind='gauge',registry=None): # pylint: disable=R0913,R0917
+        self.function = function
+        self.kind = kind
+        super().__init__(name,documentation,labelnames,registry)
+
+    def _new_child(self):
+        raise TypeError(f"The values of {self.name} are read from its function.")
+
+    def samples(self):
+        values = self.function()
+        if not isinstance(values,dict):
+            values = {():values}
+        suffix = '_total' if self.kind == 'counter' else ''
+        return [(suffix,labels,'',value) for labels,value in values.items()]
+
+class Registry():
+    """Collection of the metric families rendered on `/metrics`."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self,metric):
+        """
+        Adds a metric family, replacing a previous family of the same name.
+
+        Args:
+            metric (Metric): The family.
+        """
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """
+        Renders every family in the Prometheus text format.
+
+        Returns:
+            str: The body of a `/metrics` response.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines += metric.render()
+            except Exception: # pylint: disable=W0718
+                continue
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+REQUESTS = Counter('predict_requests','Prediction requests by endpoint and response status.',
+                   ('endpoint','status'))
+REQUEST_SECONDS = Histogram('predict_request_seconds',
+                            'End-to-end latency of the prediction requests.',('endpoint',))
+STAGE_SECONDS = Histogram('predict_stage_seconds',
+                          'Time spent in each stage of the prediction path (parse, encode, '
+                          'predict, serialize).',('stage','model_version'))
+BATCH_ROWS = Histogram('predict_batch_rows',
+                       'Rows per scored batch: coalesced single-row requests (micro_batch) '
+                       'or /predict/batch requests (batch).',('source',),buckets=BATCH_ROWS_BUCKETS)
+MODEL_INFO = Gauge('model_info','Version of the model artifacts loaded by the service '
+                   '(1 for the version being served).',('model_version',))
+MODEL_LOAD_SECONDS = Gauge('model_load_seconds','Time taken to load the model artifacts being '
+                           'served.',('model_version',))
@@ -0,0 +1,249 @@
+"""
+This module provides a dynamic micro-batching scheduler for single-row prediction requests.
+
+Concurrent callers submit one row each; a background thread collects the rows that arrive \
+    within a short window (or until a maximum batch size is reached), scores them together \
+        with one call and hands every caller its own result. The scheduler also keeps \
+            statistics on the batch-size distribution and on the time rows spent queued.
+
+Callers announce themselves with `pending()` while they prepare and submit their row. A batch \
+    whose queue is empty is scored at once when every announced caller already has its row in \
+        it, so a lone request, or a full round of a fixed pool of callers, does not wait for \
+            rows that cannot arrive; the window only holds a batch open for announced callers.
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future
+from dataclasses import dataclass
+from src.logger import logging
+
+QUEUE_DELAY_BUCKETS_MS = (0.5,1.0,2.0,5.0,10.0,20.0,50.0,100.0,250.0,float('inf'))
+
+@dataclass
+class MicroBatcherConfig():
+    """
+    Configuration class for the micro-batching scheduler.
+
+    Attributes:
+        max_wait_ms (float): Longest time the first row of a batch waits for more rows.
+        max_batch_size (int): Number of rows after which a batch is scored immediately.
+    """
+    max_wait_ms:float = float(os.environ.get('PREDICT_MAX_WAIT_MS','5'))
+    max_batch_size:int = int(os.environ.get('PREDICT_MICRO_BATCH_SIZE','64'))
+
+class MicroBatcher(): # pylint: disable=R0902
+    """
+    Request coalescer that scores concurrently submitted rows in small batches.
+
+    Attributes:
+        score_batch (callable): Function taking a list of rows and returning one result per row.
+        micro_batcher_config (MicroBatcherConfig): Configuration object holding the \
+            batching window and the maximum batch size.
+    """
+    def __init__(self,score_batch,config=None):
+        self.score_batch = score_batch
+        self.micro_batcher_config = config or MicroBatcherConfig()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = {}
+        self._delay_buckets = [0]*len(QUEUE_DELAY_BUCKETS_MS)
+        self._delay_sum_ms = 0.0
+        self._delay_max_ms = 0.0
+        self._rows = 0
+        self._early_flushes = 0
+        self._pending_lock = threading.Lock()
+        self._pending = 0
+
+    def _ensure_started(self):
+        """Starts the background scoring thread on first use."""
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                worker = threading.Thread(target=self._run,name='micro-batcher',daemon=True)
+                worker.start()
+                self._worker = worker
+
+    @contextmanager
+    def pending(self):
+        """
+        Counts the caller as a submitter in flight while it prepares and submits its row.
+
+        A batch is held open for the window only while some announced caller has not \
+            submitted its row yet; rows submitted outside this context are scored as soon as \
+                the queue is empty.
+        """
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def submit(self,row):
+        """
+        Queues one row for scoring and blocks until its result is available.
+
+        Args:
+            row: The row to score, in whatever form `score_batch` expects.
+
+        Returns:
+            The result `score_batch` produced for this row.
+
+        Raises:
+            Exception: The exception raised while scoring this row, if any.
+        """
+        return self.enqueue(row).result()
+
+    def enqueue(self,row):
+        """
+        Queues one row for scoring without waiting for it, for callers such as an event \
+            loop that must not block on the result.
+
+        Args:
+            row: The row to score, in whatever form `score_batch` expects.
+
+        Returns:
+            Future: Resolved with the result `score_batch` produced for this row, or with \
+                the exception raised while scoring it.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((row,future,time.perf_counter()))
+        return future
+
+    def _collect(self):
+        """
+        Blocks for the first queued row, then gathers more until the window closes, or \
+            until the queue is empty and no announced caller is still to submit its row.
+
+        Returns:
+            list: The (row, future, enqueue time) entries of the next batch.
+        """
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.micro_batcher_config.max_wait_ms/1000
+        while len(batch) < self.micro_batcher_config.max_batch_size:
+            if self._queue.empty() and self._pending <= len(batch):
+                if time.perf_counter() < deadline:
+                    with self._stats_lock:
+                        self._early_flushes += 1
+                break
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(block=remaining > 0,timeout=max(remaining,0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """
+        Scores batches forever; runs on the background thread.
+
+        Whatever happens while a batch is scored, every caller of the batch gets a result or \
+            an exception, so no request waits forever, and the thread goes on with the next \
+                batch.
+        """
+        while True:
+            batch = self._collect()
+            try:
+                self._score(batch)
+            except BaseException as e: # pylint: disable=W0718
+                logging.error(f"Scoring a batch of {len(batch)} rows failed: {e!r}")
+            finally:
+                for _,future,_ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("The micro-batcher failed to score "
+                                                          "this row."))
+
+    def _score(self,batch):
+        """
+        Scores one batch and resolves the future of every row.
+
+        Args:
+            batch (list): The (row, future, enqueue time) entries of the batch.
+        """
+        started = time.perf_counter()
+        self._record(len(batch),[(started - enqueued)*1000 for _,_,enqueued in batch])
+        rows = [row for row,_,_ in batch]
+        try:
+            results = list(self.score_batch(rows))
+            if len(results) != len(batch):
+                raise ValueError(f"Scoring {len(batch)} rows returned {len(results)} results.")
+        except Exception as e: # pylint: disable=W0718
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            logging.info(f"Batch of {len(batch)} rows failed, scoring rows one by one: {e}")
+            self._score_individually(batch)
+            return
+        for (_,future,_),result in zip(batch,results):
+            future.set_result(result)
+
+    def _score_individually(self,batch):
+        """
+        Scores every row of a failed batch on its own so only the offending callers see an error.
+
+        Args:
+            batch (list): The (row, future, enqueue time) entries of the failed batch.
+        """
+        for row,future,_ in batch:
+            try:
+                results = list(self.score_batch([row]))
+                if len(results) != 1:
+                    raise ValueError(f"Scoring 1 row returned {len(results)} results.")
+                future.set_result(results[0])
+            except Exception as e: # pylint: disable=W0718
+                future.set_exception(e)
+
+    def _record(self,batch_size,delays_ms):
+        """
+        Updates the batch-size distribution and the queueing-delay histogram.
+
+        Args:
+            batch_size (int): Number of rows in the batch about to be scored.
+            delays_ms (list): Time each row of the batch spent queued, in milliseconds.
+        """
+        with self._stats_lock:
+            self._batch_sizes[batch_size] = self._batch_sizes.get(batch_size,0) + 1
+            self._rows += batch_size
+            for delay in delays_ms:
+                self._delay_sum_ms += delay
+                self._delay_max_ms = max(self._delay_max_ms,delay)
+                for i,bound in enumerate(QUEUE_DELAY_BUCKETS_MS):
+                    if delay <= bound:
+                        self._delay_buckets[i] += 1
+                        break
+
+    def stats(self):
+        """
+        Returns a snapshot of the batching statistics.
+
+        Returns:
+            dict: The batch-size distribution, the number of batches and rows scored, \
+                the number of batches scored before the window closed, and the \
+                    queueing-delay histogram (non-cumulative counts per upper bound in ms), \
+                        mean and max.
+        """
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                'batches':batches,
+                'rows':self._rows,
+                'mean_batch_size':self._rows/batches if batches else 0.0,
+                'batch_size_distribution':dict(sorted(self._batch_sizes.items())),
+                'early_flushes':self._early_flushes,
+                'queue_delay_ms':{
+                    'buckets':{str(bound):count for bound,count in
+                               zip(QUEUE_DELAY_BUCKETS_MS,self._delay_buckets)},
+                    'mean':self._delay_sum_ms/self._rows if self._rows else 0.0,
+                    'max':self._delay_max_ms
+                },
+                'max_wait_ms':self.micro_batcher_config.max_wait_ms,
+                'max_batch_size':self.micro_batcher_config.max_batch_size
+            }
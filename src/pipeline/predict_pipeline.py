@@ -0,0 +1,237 @@
+"""
+This module holds the prediction path shared by the serving front ends: the Flask app, the \
+    asynchronous server and the pre-fork launcher.
+
+It owns the resident inference service, the prediction cache and the micro-batcher of the \
+    single-row endpoint, and provides the parsing, scoring and request accounting that the \
+        front ends call; the front ends only deal with HTTP.
+"""
+import os
+from src.logger import request_logger,dropped_records
+from src.pipeline.inference_service import InferenceService
+from src.pipeline.micro_batcher import MicroBatcher
+from src.pipeline.prediction_cache import PredictionCache,canonical_key
+from src.pipeline.request_parser import RequestValidationError,ParsedBatch
+from src.pipeline.metrics import (REQUESTS,REQUEST_SECONDS,STAGE_SECONDS,BATCH_ROWS,
+                                  CallbackMetric)
+
+MAX_BATCH_SIZE = int(os.environ.get('PREDICT_MAX_BATCH_SIZE','10000'))
+INSTRUMENTED_ENDPOINTS = ('/predict','/predict/batch')
+
+inference_service = InferenceService()
+prediction_cache = PredictionCache()
+CallbackMetric('prediction_cache_lookups','Prediction cache lookups by result.',
+               lambda: {('hit',):prediction_cache.stats()['hits'],
+                        ('miss',):prediction_cache.stats()['misses']},
+               ('result',),kind='counter')
+CallbackMetric('prediction_cache_entries','Entries held by the prediction cache.',
+               lambda: prediction_cache.stats()['entries'])
+CallbackMetric('log_records_dropped','Log records dropped because the log queue was full.',
+               dropped_records,kind='counter')
+
+def record_request(endpoint,method,status,elapsed):
+    """
+    Counts a prediction request, records its latency and logs a sampled access record.
+
+    Args:
+        endpoint (str): The request path.
+        method (str): The HTTP method.
+        status (int): The response status.
+        elapsed (float): The request latency in seconds.
+    """
+    REQUESTS.labels(endpoint,str(status)).inc()
+    REQUEST_SECONDS.labels(endpoint).observe(elapsed)
+    request_logger.info('request',extra={'endpoint':endpoint,'method':method,'status':status,
+                                         'latency_ms':round(1000*elapsed,3)})
+
+def collect_stats():
+    """
+    Collect the statistics of the single-row scoring path.
+
+    Returns:
+        dict: The micro-batching statistics, with the prediction cache counters \
+            under 'prediction_cache'.
+    """
+    return {**micro_batcher.stats(),'prediction_cache':prediction_cache.stats()}
+
+def stage_timer(stage):
+    """
+    Return a timer recording the duration of a stage of the prediction path.
+
+    Args:
+        stage (str): The stage ('parse' or 'serialize'; encoding and prediction are timed \
+            by the inference service).
+
+    Returns:
+        Timer: Context manager observing into `predict_stage_seconds`.
+    """
+    return STAGE_SECONDS.labels(stage,inference_service.get_artifacts().version).time()
+
+def parse_request(parse):
+    """
+    Parse a request with the request parser of the model currently served.
+
+    The parser is built once per model version from its feature schema. The snapshot it \
+        belongs to is recorded on the parsed rows, so they are encoded and scored with the \
+            same schema and encoder even if the artifacts are hot-reloaded in between.
+
+    Args:
+        parse (callable): Function taking the RequestParser and returning the ParsedBatch.
+
+    Returns:
+        ParsedBatch: The parsed rows.
+    """
+    artifacts = inference_service.get_artifacts()
+    with STAGE_SECONDS.labels('parse',artifacts.version).time():
+        batch = parse(artifacts.request_parser)
+    batch.artifacts = artifacts
+    return batch
+
+def process_and_predict(input_text,json_data):
+    """
+    Process input text and make a prediction.
+
+    Args:
+        input_text (str or dict): The input data for prediction.
+        json_data (bool): Flag indicating if the input is in JSON format.
+
+    Returns:
+        str: Construction cost
+
+    Raises:
+        RequestValidationError: If the input does not have one valid value per input column.
+    """
+    # The request counts as a pending submitter of the micro-batcher until it has its price.
+    with micro_batcher.pending():
+        batch,key,cached = prepare_prediction(input_text,json_data)
+        if cached is not None:
+            return str(cached)
+        return finish_prediction(key,micro_batcher.submit(batch))
+
+def prepare_prediction(input_text,json_data):
+    """
+    Parse a single-row request and look its row up in the prediction cache.
+
+    Args:
+        input_text (str or dict): The input data for prediction.
+        json_data (bool): Flag indicating if the input is in JSON format.
+
+    Returns:
+        tuple: The parsed row (ParsedBatch), its cache key (None when caching is off) and \
+            the cached price (None on a miss).
+
+    Raises:
+        RequestValidationError: If the input does not have one valid value per input column.
+    """
+    if json_data is True:
+        if not isinstance(input_text,dict) or 'data' not in input_text:
+            raise RequestValidationError(
+                'Expected a `data` query parameter or a JSON body {"data": [...]}.')
+        batch = parse_request(lambda parser: parser.parse_rows([input_text['data']]))
+    else:
+        batch = parse_request(lambda parser: parser.parse_text(input_text))
+    key = cache_key(batch)
+    cached = prediction_cache.get(key) if key is not None else None
+    return batch,key,cached
+
+def finish_prediction(key,price):
+    """
+    Cache the price scored for a single-row request.
+
+    Args:
+        key (str): The cache key of the row, or None when caching is off.
+        price (float): The predicted construction cost.
+
+    Returns:
+        str: Construction cost
+    """
+    if key is not None:
+        prediction_cache.put(key,price)
+    return str(price)
+
+def cache_key(batch):
+    """
+    Build the prediction cache key of a parsed row for the model version it was parsed with.
+
+    Args:
+        batch (ParsedBatch): The parsed row.
+
+    Returns:
+        str: The cache key, or None when caching is off.
+    """
+    if not prediction_cache.enabled:
+        return None
+    return canonical_key(batch.row_key(0),batch.artifacts.version)
+
+def score_rows(rows):
+    """
+    Score the single-row requests coalesced by the micro-batcher in one pass.
+
+    Rows parsed before and after a hot reload are scored in one pass per artifact snapshot.
+
+    Args:
+        rows (list): One parsed row (ParsedBatch) per request.
+
+    Returns:
+        list: The predicted construction cost of every row, in input order.
+    """
+    BATCH_ROWS.labels('micro_batch').observe(len(rows))
+    groups = {}
+    for index,row in enumerate(rows):
+        groups.setdefault(id(row.artifacts),[]).append(index)
+    prices = [None]*len(rows)
+    for indices in groups.values():
+        scored = inference_service.predict_parsed(
+            ParsedBatch.concatenate([rows[index] for index in indices]))
+        for index,price in zip(indices,scored.tolist()):
+            prices[index] = price
+    return prices
+
+micro_batcher = MicroBatcher(score_batch=score_rows)
+
+def parse_batch_body(payload):
+    """
+    Validate and parse the JSON body of a batch request.
+
+    Args:
+        payload (dict): The body {"data": [[...], ...]}, one list of input values per row \
+            in the order of the feature schema.
+
+    Returns:
+        ParsedBatch: The parsed rows.
+
+    Raises:
+        RequestValidationError: If the body is malformed or a row is invalid.
+    """
+    if not isinstance(payload,dict) or not isinstance(payload.get('data'),list):
+        raise RequestValidationError('Expected a JSON body {"data": [[...], ...]} or a CSV file.')
+    return parse_request(lambda parser: parser.parse_rows(payload['data']))
+
+def parse_batch_file(file):
+    """
+    Parse an uploaded CSV batch whose header names the input columns.
+
+    Args:
+        file: The uploaded file object.
+
+    Returns:
+        ParsedBatch: The parsed rows.
+
+    Raises:
+        RequestValidationError: If the CSV cannot be parsed, misses columns or holds \
+            invalid rows.
+    """
+    return parse_request(lambda parser: parser.parse_csv(file))
+
+def process_batch(batch):
+    """
+    Encode and score a parsed batch with a single encoder pass and a single predict call.
+
+    Args:
+        batch (ParsedBatch): The batch parsed by `parse_batch_body` or `RequestParser.parse_csv`.
+
+    Returns:
+        list: The predicted construction cost of every row, in input order.
+    """
+    BATCH_ROWS.labels('batch').observe(batch.n_rows)
+    return inference_service.predict_parsed(batch).tolist()
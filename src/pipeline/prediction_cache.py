@@ -0,0 +1,275 @@
+"""
+This module provides a bounded cache of single-row predictions.
+
+Estimators re-price the same line items many times while iterating on a bid, so the result \
+    of every scored row is kept under a canonical hash of its parsed input fields and the \
+        version of the model artifacts. Replacing `best_model.pkl` or `categorical_encoder.pkl` \
+            changes that version (see `InferenceService`), so stale entries are never served.
+
+Two backends are available: an in-process LRU with a time-to-live, and a SQLite file that \
+    is shared by every worker process on the host.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from src.exception import CustomException
+from src.logger import logging
+
+@dataclass
+class PredictionCacheConfig():
+    """
+    Configuration class for the prediction cache.
+
+    Attributes:
+        backend (str): 'memory', 'sqlite' or 'off'.
+        max_entries (int): Number of entries kept before the least recently used are evicted.
+        ttl_s (float): Lifetime of an entry in seconds.
+        sqlite_path (str): Database file of the 'sqlite' backend.
+    """
+    backend:str = os.environ.get('PREDICTION_CACHE_BACKEND','memory')
+    max_entries:int = int(os.environ.get('PREDICTION_CACHE_SIZE','10000'))
+    ttl_s:float = float(os.environ.get('PREDICTION_CACHE_TTL_S','3600'))
+    sqlite_path:str = os.path.join('artifacts','prediction_cache.sqlite')
+
+def canonical_key(values,version):
+    """
+    Hashes a parsed input row and the model version into a cache key.
+
+    The numeric fields have already been converted by the `RequestParser`, so '5', '5.0' \
+        and 5 share an entry; categorical fields are compared as exact strings.
+
+    Args:
+        values (list): The parsed values of the row, as returned by `ParsedBatch.row_key`.
+        version (str): Version of the model artifacts that score the row.
+
+    Returns:
+        str: The cache key.
+    """
+    payload = json.dumps([version,values],separators=(',',':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class MemoryBackend():
+    """
+    Thread-safe in-process LRU store with a per-entry expiry time.
+
+    Attributes:
+        max_entries (int): Number of entries kept.
+    """
+    def __init__(self,max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self,key,now):
+        """Returns the value stored under `key`, or None when it is absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value,expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self,key,value,expires_at):
+        """
+        Stores a value and evicts the least recently used entries beyond `max_entries`.
+
+        Returns:
+            int: Number of evicted entries.
+        """
+        with self._lock:
+            self._entries[key] = (value,expires_at)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def size(self):
+        """Returns the number of stored entries."""
+        with self._lock:
+            return len(self._entries)
+
+class SqliteBackend():
+    """
+    SQLite store shared by the worker processes of a host.
+
+    Every thread uses its own connection; the database runs in WAL mode so readers do not \
+        block the writer.
+
+    Attributes:
+        path (str): The database file.
+        max_entries (int): Number of entries kept.
+    """
+    def __init__(self,path,max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path,exist_ok=True)
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, "
+                               "value REAL NOT NULL, expires_at REAL NOT NULL, "
+                               "last_used REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS predictions_last_used "
+                               "ON predictions (last_used)")
+
+    def _connection(self):
+        """Returns the connection of the calling thread, opening it on first use."""
+        connection = getattr(self._local,'connection',None)
+        if connection is None:
+            connection = sqlite3.connect(self.path,timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self,key,now):
+        """Returns the value stored under `key`, or None when it is absent or expired."""
+        with self._connection() as connection:
+            found = connection.execute(
+                "SELECT value FROM predictions WHERE key = ? AND expires_at > ?",
+                (key,now)).fetchone()
+            if found is None:
+                return None
+            connection.execute("UPDATE predictions SET last_used = ? WHERE key = ?",(now,key))
+            return found[0]
+
+    def put(self,key,value,expires_at):
+        """
+        Stores a value and evicts expired and least recently used entries beyond `max_entries`.
+
+        Returns:
+            int: Number of evicted entries.
+        """
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                               (key,value,expires_at,now))
+            evicted = connection.execute(
+                "DELETE FROM predictions WHERE expires_at <= ?",(now,)).rowcount
+            excess = connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - \
+                self.max_entries
+            if excess > 0:
+                evicted += connection.execute(
+                    "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions "
+                    "ORDER BY last_used LIMIT ?)",(excess,)).rowcount
+            return evicted
+
+    def size(self):
+        """Returns the number of stored entries."""
+        with self._connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+class PredictionCache():
+    """
+    Bounded LRU/TTL cache of single-row predictions with hit and miss counters.
+
+    Attributes:
+        prediction_cache_config (PredictionCacheConfig): Configuration object holding the \
+            backend, size and time-to-live.
+    """
+    def __init__(self,config=None):
+        self.prediction_cache_config = config or PredictionCacheConfig()
+        self._backend = self._create_backend()
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _create_backend(self):
+        """
+        Creates the configured storage backend.
+
+        Returns:
+            MemoryBackend or SqliteBackend: The backend, or None when caching is off.
+
+        Raises:
+            CustomException: If the backend is unknown or cannot be opened.
+        """
+        config = self.prediction_cache_config
+        try:
+            if config.backend == 'off':
+                return None
+            if config.backend == 'memory':
+                return MemoryBackend(config.max_entries)
+            if config.backend == 'sqlite':
+                return SqliteBackend(config.sqlite_path,config.max_entries)
+            raise ValueError(f"Unknown prediction cache backend {config.backend!r}, "
+                             "expected 'memory', 'sqlite' or 'off'.")
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    @property
+    def enabled(self):
+        """bool: Whether predictions are cached at all."""
+        return self._backend is not None
+
+    def get(self,key):
+        """
+        Looks up a prediction and counts the hit or miss.
+
+        Args:
+            key (str): Key built by `canonical_key`.
+
+        Returns:
+            float: The cached prediction, or None on a miss.
+        """
+        try:
+            value = self._backend.get(key,time.time())
+        except sqlite3.Error as e:
+            logging.error(f"Prediction cache lookup failed: {e}")
+            value = None
+        with self._stats_lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return value
+
+    def put(self,key,value):
+        """
+        Stores a prediction.
+
+        Args:
+            key (str): Key built by `canonical_key`.
+            value (float): The prediction.
+        """
+        try:
+            evicted = self._backend.put(
+                key,float(value),time.time() + self.prediction_cache_config.ttl_s)
+        except sqlite3.Error as e:
+            logging.error(f"Prediction cache store failed: {e}")
+            return
+        if evicted:
+            with self._stats_lock:
+                self._evictions += evicted
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The backend, number of entries, hits, misses, hit rate and evictions.
+        """
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend':self.prediction_cache_config.backend,
+                'entries':self._backend.size() if self.enabled else 0,
+                'hits':self._hits,
+                'misses':self._misses,
+                'hit_rate':self._hits/lookups if lookups else 0.0,
+                'evictions':self._evictions
+            }
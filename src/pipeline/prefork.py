@@ -0,0 +1,173 @@
+"""
+This module provides the pre-fork launcher of the asynchronous inference server.
+
+The launcher loads the model artifacts once (the original model and its native library \
+    included), binds the listening socket and only then forks the server processes, which \
+        accept connections on the inherited socket. The workers share the pages of the loaded \
+            model copy-on-write, and `gc.freeze()` keeps the garbage collector from touching \
+                (and so copying) them. The compiled node arrays are memory-mapped, so they stay \
+                    shared even after a worker hot-reloads the artifacts.
+
+Connections are spread over the processes, so each micro-batcher only sees its own share of \
+    the concurrent requests. The batching window is therefore disabled by default \
+        (`PREFORK_MAX_WAIT_MS=0`): a process scores the rows queued while its previous batch was \
+            being scored, without holding a batch open for rows that went to other processes.
+
+The launcher forwards SIGTERM/SIGINT to the workers, which drain their admitted requests \
+    before exiting, and replaces a worker that dies unexpectedly. Every worker logs to its \
+        own `app.<pid>.log` file and exposes its own metrics.
+
+Run it with `python -m src.pipeline.prefork` (POSIX only).
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+from dataclasses import dataclass
+from aiohttp import web
+from src.exception import CustomException
+from src.logger import logging,stop_logging
+from src.pipeline.async_server import AsyncInferenceServer,AsyncServerConfig
+from src.pipeline import predict_pipeline
+
+@dataclass
+class PreforkConfig():
+    """
+    Configuration class for the pre-fork launcher.
+
+    Attributes:
+        processes (int): Number of forked server processes.
+        threads (int): Number of parsing and scoring threads of every server process; \
+            single-row requests only hold one while they are parsed.
+        max_wait_ms (float): Batching window of the micro-batcher of every server process.
+        backlog (int): Length of the listen queue shared by the processes.
+        restart_delay_s (float): Pause before a worker that died is replaced.
+    """
+    processes:int = int(os.environ.get('PREFORK_WORKERS',str(os.cpu_count() or 1)))
+    threads:int = int(os.environ.get('PREFORK_THREADS','2'))
+    max_wait_ms:float = float(os.environ.get('PREFORK_MAX_WAIT_MS','0'))
+    backlog:int = int(os.environ.get('PREFORK_BACKLOG','1024'))
+    restart_delay_s:float = 1.0
+
+class PreforkLauncher():
+    """
+    Parent process loading the artifacts, then forking and supervising the server processes.
+
+    Attributes:
+        prefork_config (PreforkConfig): Configuration object holding the number of processes \
+            and threads.
+        server_config (AsyncServerConfig): Configuration of the server run by every process.
+        workers (dict): Slot number of every running worker, keyed by process id.
+    """
+    def __init__(self,config=None,server_config=None):
+        self.prefork_config = config or PreforkConfig()
+        self.server_config = server_config or AsyncServerConfig(
+            workers=self.prefork_config.threads)
+        self.workers = {}
+        self.stopping = False
+        self.sock = None
+
+    def preload(self):
+        """
+        Loads the artifacts and the original model and sets the batching window of the \
+            workers, then freezes the heap before forking.
+
+        Returns:
+            ModelArtifacts: The snapshot inherited by the workers.
+        """
+        started = time.perf_counter()
+        artifacts = predict_pipeline.inference_service.get_artifacts()
+        artifacts.model.get()
+        batcher_config = predict_pipeline.micro_batcher.micro_batcher_config
+        batcher_config.max_wait_ms = self.prefork_config.max_wait_ms
+        gc.collect()
+        gc.freeze()
+        logging.info(f"Preloaded model artifacts version {artifacts.version} in "
+                     f"{time.perf_counter() - started:.3f}s; {gc.get_freeze_count()} objects "
+                     "frozen.")
+        return artifacts
+
+    def bind(self):
+        """Opens the listening socket shared by the workers."""
+        config = self.server_config
+        self.sock = socket.create_server((config.host,config.port),
+                                         backlog=self.prefork_config.backlog)
+
+    def spawn(self,slot):
+        """
+        Forks one server process.
+
+        Args:
+            slot (int): Number of the worker, kept when the worker is replaced.
+        """
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                self._serve()
+            except BaseException as e: # pylint: disable=W0718
+                logging.error(f"Worker {os.getpid()} failed: {e}")
+                status = 1
+            finally:
+                stop_logging()
+                os._exit(status) # pylint: disable=W0212
+        self.workers[pid] = slot
+        logging.info(f"Started worker {slot} as process {pid}.")
+
+    def _serve(self):
+        """Runs the asynchronous server on the inherited socket (in a worker)."""
+        signal.signal(signal.SIGTERM,signal.SIG_DFL)
+        signal.signal(signal.SIGINT,signal.SIG_DFL)
+        server = AsyncInferenceServer(self.server_config)
+        web.run_app(server.build_app(),sock=self.sock,
+                    shutdown_timeout=self.server_config.drain_timeout_s,print=None)
+
+    def stop(self,signum,_frame):
+        """Forwards a termination signal to the workers so that they drain and exit."""
+        logging.info(f"Received signal {signum}, stopping {len(self.workers)} workers.")
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid,signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """Preloads the artifacts, forks the workers and waits for them, replacing dead ones."""
+        self.preload()
+        self.bind()
+        signal.signal(signal.SIGTERM,self.stop)
+        signal.signal(signal.SIGINT,self.stop)
+        for slot in range(self.prefork_config.processes):
+            self.spawn(slot)
+        logging.info(f"Pre-fork server listening on {self.server_config.host}:"
+                     f"{self.server_config.port} with {self.prefork_config.processes} processes "
+                     f"of {self.server_config.workers} threads and a batching window of "
+                     f"{self.prefork_config.max_wait_ms}ms.")
+        while self.workers:
+            try:
+                pid,status = os.wait()
+            except ChildProcessError:
+                break
+            slot = self.workers.pop(pid,None)
+            if slot is None or self.stopping:
+                continue
+            logging.error(f"Worker {slot} (process {pid}) exited with status {status}, "
+                          "replacing it.")
+            time.sleep(self.prefork_config.restart_delay_s)
+            if not self.stopping:
+                self.spawn(slot)
+        self.sock.close()
+        logging.info("Pre-fork server stopped.")
+
+def main():
+    """Command-line entry point of the pre-fork launcher."""
+    try:
+        PreforkLauncher().run()
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+if __name__ == '__main__':
+    main()
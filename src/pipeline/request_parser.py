@@ -0,0 +1,239 @@
+"""
+This module parses and validates prediction requests against the feature schema.
+
+The raw values of a request (a comma-separated query string, a JSON list per row or an \
+    uploaded CSV file) are converted straight into a preallocated float64 feature buffer, \
+        while the categorical values are interned and kept aside for the target encoding. \
+            Quoted values containing commas (such as the `coordinates` "-27.40222, 152.98697") \
+                are handled by the `csv` module. Invalid requests raise a \
+                    `RequestValidationError` that lists every offending row and column, so the \
+                        endpoints can answer with a structured 400 instead of failing later.
+"""
+import io
+import csv
+import sys
+from dataclasses import dataclass, field
+from typing import Any
+import numpy as np
+
+MAX_REPORTED_ERRORS = 10
+
+class RequestValidationError(ValueError):
+    """
+    Raised when a request does not match the serving schema.
+
+    Attributes:
+        errors (list): One dictionary per problem, with the row, column, value and reason.
+    """
+    def __init__(self,message,errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+    def to_dict(self):
+        """
+        Returns the body of the 400 response.
+
+        Returns:
+            dict: The error message and the individual problems.
+        """
+        return {'error':str(self),'details':self.errors}
+
+@dataclass
+class ParsedBatch():
+    """
+    Rows parsed into a float feature buffer and their raw categorical values.
+
+    Attributes:
+        features (np.ndarray): Float64 array of shape (n_rows, n_columns); the categorical \
+            columns hold NaN until they are encoded.
+        categories (dict): The interned categorical values of every row, keyed by the \
+            training name of their column.
+        artifacts (ModelArtifacts): The snapshot of the served artifacts whose parser read \
+            the rows; they must be encoded and scored with the same snapshot.
+    """
+    features:np.ndarray
+    categories:dict
+    artifacts:Any = field(default=None,repr=False,compare=False)
+
+    @property
+    def n_rows(self):
+        """int: Number of rows."""
+        return len(self.features)
+
+    @classmethod
+    def concatenate(cls,batches):
+        """
+        Stacks several parsed batches (for example coalesced single-row requests).
+
+        Args:
+            batches (list): The batches to stack, all parsed by the same parser.
+
+        Returns:
+            ParsedBatch: One batch holding every row, in order.
+
+        Raises:
+            ValueError: If the batches were parsed with different artifact snapshots.
+        """
+        if len(batches) == 1:
+            return batches[0]
+        artifacts = batches[0].artifacts
+        if any(batch.artifacts is not artifacts for batch in batches):
+            raise ValueError("Cannot stack rows parsed with different model artifacts.")
+        return cls(features=np.concatenate([batch.features for batch in batches]),
+                   categories={column:[value for batch in batches
+                                       for value in batch.categories[column]]
+                               for column in batches[0].categories},
+                   artifacts=artifacts)
+
+    def row_key(self,index):
+        """
+        Returns the normalized values of one row, used to build its prediction cache key.
+
+        Args:
+            index (int): The row.
+
+        Returns:
+            list: The parsed numeric values followed by the categorical values.
+        """
+        return [None if np.isnan(value) else value for value in self.features[index].tolist()] \
+            + [values[index] for values in self.categories.values()]
+
+class RequestParser():
+    """
+    Schema-driven parser of prediction requests.
+
+    The positions of the numeric and categorical columns are resolved once from the \
+        feature schema, so parsing a row never looks a column up by name.
+
+    Attributes:
+        feature_schema (FeatureSchema): The schema of the served model.
+        columns (list): The serving names of the feature columns, in model order.
+    """
+    def __init__(self,feature_schema):
+        self.feature_schema = feature_schema
+        self.columns = feature_schema.serving_columns
+        categorical = set(feature_schema.categorical_columns)
+        self._categorical_index = [(i,c) for i,c in enumerate(feature_schema.columns)
+                                   if c in categorical]
+        self._numeric_index = [i for i,c in enumerate(feature_schema.columns)
+                               if c not in categorical]
+
+    @staticmethod
+    def split_text(text):
+        """
+        Splits a comma-separated row, honouring double-quoted values that contain commas.
+
+        Args:
+            text (str): The raw row.
+
+        Returns:
+            list: The raw values.
+        """
+        return next(csv.reader([text]),[])
+
+    def parse_rows(self,rows):
+        """
+        Parses rows given as lists of raw values in model order.
+
+        Args:
+            rows (list): One list of raw values per row. Numbers may be given as numbers or \
+                strings; None is a missing value.
+
+        Returns:
+            ParsedBatch: The parsed rows.
+
+        Raises:
+            RequestValidationError: If the batch is empty, a row has the wrong number of \
+                values or a numeric value is not a number.
+        """
+        if not isinstance(rows,list) or len(rows) == 0:
+            raise RequestValidationError('The batch is empty.')
+        n_columns = len(self.columns)
+        errors = [{'row':i,'error':f"expected {n_columns} values, got "
+                   f"{len(row) if isinstance(row,list) else type(row).__name__}"}
+                  for i,row in enumerate(rows) if not isinstance(row,list) or len(row) != n_columns]
+        if errors:
+            raise RequestValidationError(f"Found {len(errors)} rows without {n_columns} values.",
+                                         errors[:MAX_REPORTED_ERRORS])
+        features = np.full((len(rows),n_columns),np.nan)
+        for j in self._numeric_index:
+            values = [row[j] for row in rows]
+            try:
+                features[:,j] = np.array([np.nan if v is None else v for v in values],
+                                         dtype='float64')
+            except (TypeError,ValueError):
+                errors += self._numeric_errors(j,values)
+        if errors:
+            raise RequestValidationError(
+                f"Found {len(errors)} non-numeric values in numeric columns.",
+                errors[:MAX_REPORTED_ERRORS])
+        categories = {column:[None if row[j] is None else sys.intern(str(row[j]))
+                              for row in rows]
+                      for j,column in self._categorical_index}
+        return ParsedBatch(features=features,categories=categories)
+
+    def _numeric_errors(self,j,values):
+        """Lists the values of numeric column `j` that cannot be converted to a float."""
+        errors = []
+        for i,value in enumerate(values):
+            if value is None:
+                continue
+            try:
+                float(value)
+            except (TypeError,ValueError):
+                errors.append({'row':i,'column':self.columns[j],'value':repr(value)[:80],
+                               'error':'not a number'})
+        return errors
+
+    def parse_text(self,text):
+        """
+        Parses one comma-separated row.
+
+        Args:
+            text (str): The raw row, in model order.
+
+        Returns:
+            ParsedBatch: The parsed row.
+        """
+        return self.parse_rows([self.split_text(text)])
+
+    def parse_csv(self,file):
+        """
+        Parses an uploaded CSV file whose header names the feature columns.
+
+        The header may use the serving or the training names (so the training CSV can be \
+            scored as is). Extra columns are ignored and empty fields are missing values.
+
+        Args:
+            file: The binary or text file object.
+
+        Returns:
+            ParsedBatch: The parsed rows.
+
+        Raises:
+            RequestValidationError: If the file cannot be decoded, misses serving columns or \
+                holds invalid rows.
+        """
+        try:
+            text = file.read()
+            if isinstance(text,bytes):
+                text = text.decode('utf-8')
+            reader = csv.reader(io.StringIO(text,newline=''))
+            header = next(reader,None)
+            if header is None:
+                raise RequestValidationError('The batch is empty.')
+            indexes = [None]*len(self.columns)
+            for i,name in enumerate(header):
+                position = self.feature_schema.positions.get(name)
+                if position is not None and indexes[position] is None:
+                    indexes[position] = i
+            missing = [column for column,i in zip(self.columns,indexes) if i is None]
+            if missing:
+                raise RequestValidationError(f"The uploaded CSV is missing the columns {missing}.",
+                                             [{'column':column,'error':'missing column'}
+                                              for column in missing])
+            rows = [[record[i] if i < len(record) and record[i] != '' else None for i in indexes]
+                    for record in reader if record]
+        except (UnicodeDecodeError,csv.Error) as e:
+            raise RequestValidationError(f"Could not parse the uploaded CSV: {e}") from e
+        return self.parse_rows(rows)
@@ -0,0 +1,59 @@
+"""
+Tests that the batch, micro-batched and CSV paths give the same predictions as single rows, \
+    and that parsed rows are scored with the artifact snapshot they were parsed with.
+"""
+import io
+import json
+import pandas as pd
+import pytest
+from src.pipeline import predict_pipeline
+
+SOURCE_PATH = 'notebooks/cleaned_data.csv'
+
+@pytest.fixture(name='rows',scope='module')
+def fixture_rows():
+    """The first input rows of the cleaned dataset, in model order."""
+    df = pd.read_csv(SOURCE_PATH,nrows=20)
+    features = df.drop(columns=['Total','Attribute 4'])
+    return json.loads(features.to_json(orient='values'))
+
+def _single(rows):
+    """Scores every row in its own batch."""
+    return [predict_pipeline.process_batch(predict_pipeline.parse_batch_body({'data':[row]}))[0]
+            for row in rows]
+
+def test_batch_predictions_are_bit_identical_to_single_rows(rows):
+    """Scoring rows together gives exactly the predictions of scoring them one by one."""
+    batch = predict_pipeline.process_batch(predict_pipeline.parse_batch_body({'data':rows}))
+    assert batch == _single(rows)
+
+def test_micro_batches_are_bit_identical_to_single_rows(rows):
+    """The coalesced single-row requests keep their order and predictions."""
+    parsed = [predict_pipeline.parse_batch_body({'data':[row]}) for row in rows]
+    assert predict_pipeline.score_rows(parsed) == _single(rows)
+
+def test_csv_upload_matches_the_json_batch(rows):
+    """An uploaded CSV scores like the same rows sent as JSON."""
+    columns = predict_pipeline.inference_service.get_artifacts().feature_schema.serving_columns
+    body = pd.DataFrame(rows,columns=columns).to_csv(index=False).encode()
+    batch = predict_pipeline.parse_batch_file(io.BytesIO(body))
+    assert predict_pipeline.process_batch(batch) == _single(rows)
+
+def test_parsed_rows_are_scored_with_their_own_snapshot(rows,monkeypatch):
+    """Scoring never takes a second snapshot of the served artifacts."""
+    expected = _single(rows[:2])
+    batch = predict_pipeline.parse_batch_body({'data':rows[:2]})
+    def reloaded():
+        raise AssertionError('the artifacts were read again after parsing')
+    monkeypatch.setattr(predict_pipeline.inference_service,'get_artifacts',reloaded)
+    assert predict_pipeline.process_batch(batch) == expected
+
+def test_micro_batches_spanning_a_reload_are_scored_per_snapshot(rows):
+    """Rows parsed before and after a reload are scored with their own snapshot, in order."""
+    expected = _single(rows[:4])
+    before = [predict_pipeline.parse_batch_body({'data':[row]}) for row in rows[:2]]
+    predict_pipeline.inference_service.load()
+    after = [predict_pipeline.parse_batch_body({'data':[row]}) for row in rows[2:4]]
+    assert before[0].artifacts is not after[0].artifacts
+    assert predict_pipeline.score_rows([before[0],after[0],before[1],after[1]]) == \
+        [expected[0],expected[2],expected[1],expected[3]]
@@ -0,0 +1,88 @@
+"""
+Tests of the schema-driven request parser and of the 400 answers of the prediction endpoints.
+"""
+import io
+import numpy as np
+import pytest
+from src.components.feature_schema import FeatureSchema
+from src.pipeline.request_parser import RequestParser,RequestValidationError,ParsedBatch
+
+@pytest.fixture(name='parser')
+def fixture_parser():
+    """A parser of two numeric columns around two categorical ones."""
+    schema = FeatureSchema(columns=['Qty','coordinates','Lat','city'],
+                           dtypes={'Qty':'float64','coordinates':'category','Lat':'float64',
+                                   'city':'category'},
+                           categorical_columns=['coordinates','city'])
+    return RequestParser(schema)
+
+def test_parse_text_keeps_quoted_commas(parser):
+    """A quoted value containing a comma stays one value."""
+    batch = parser.parse_text('3,"-27.40222, 152.98697",-27.4,Brisbane')
+    assert batch.n_rows == 1
+    np.testing.assert_array_equal(batch.features[0,[0,2]],[3.0,-27.4])
+    assert np.isnan(batch.features[0,[1,3]]).all()
+    assert batch.categories == {'coordinates':['-27.40222, 152.98697'],'city':['Brisbane']}
+
+def test_parse_rows_accepts_numbers_strings_and_missing_values(parser):
+    """Numbers may be strings, None is missing and categories are kept as strings."""
+    batch = parser.parse_rows([[1,'a','2.5',7],[None,None,'-1',None]])
+    np.testing.assert_array_equal(batch.features[:,2],[2.5,-1.0])
+    assert np.isnan(batch.features[1,0])
+    assert batch.categories == {'coordinates':['a',None],'city':['7',None]}
+
+@pytest.mark.parametrize('rows',[[],'1,2',[[1,'a',2]],[[1,'a',2,'b'],'row']])
+def test_parse_rows_rejects_malformed_batches(parser,rows):
+    """Empty batches and rows of the wrong length are rejected."""
+    with pytest.raises(RequestValidationError):
+        parser.parse_rows(rows)
+
+def test_parse_rows_lists_every_non_numeric_value(parser):
+    """Every non-numeric value is reported with its row and serving column name."""
+    with pytest.raises(RequestValidationError) as excinfo:
+        parser.parse_rows([[1,'a','north','b'],['x','a',2,'b']])
+    details = excinfo.value.to_dict()['details']
+    assert [(d['row'],d['column']) for d in details] == [(1,'Qty'),(0,'Latitude')]
+
+def test_parse_csv_maps_serving_and_training_names(parser):
+    """The header may use either name, in any order; extra columns are ignored."""
+    body = b'city,Extra,Latitude,Qty,coordinates\nPerth,x,-31.9,4,"-31.9, 115.8"\nAdelaide,y,,,\n'
+    batch = parser.parse_csv(io.BytesIO(body))
+    np.testing.assert_array_equal(batch.features[0,[0,2]],[4.0,-31.9])
+    assert np.isnan(batch.features[1,[0,2]]).all()
+    assert batch.categories == {'coordinates':['-31.9, 115.8',None],'city':['Perth','Adelaide']}
+
+def test_parse_csv_reports_missing_columns(parser):
+    """A header without a serving column is rejected."""
+    with pytest.raises(RequestValidationError) as excinfo:
+        parser.parse_csv(io.BytesIO(b'Qty,city\n1,Perth\n'))
+    assert [d['column'] for d in excinfo.value.errors] == ['coordinates','Latitude']
+
+def test_concatenate_refuses_rows_of_different_snapshots(parser):
+    """Rows parsed with different artifact snapshots are never stacked."""
+    first,second = parser.parse_text('1,a,2,b'),parser.parse_text('3,c,4,d')
+    first.artifacts,second.artifacts = object(),object()
+    with pytest.raises(ValueError):
+        ParsedBatch.concatenate([first,second])
+    second.artifacts = first.artifacts
+    assert ParsedBatch.concatenate([first,second]).n_rows == 2
+
+@pytest.fixture(name='client',scope='module')
+def fixture_client():
+    """A test client of the Flask app serving the committed model artifacts."""
+    app = pytest.importorskip('app')
+    return app.app.test_client()
+
+@pytest.mark.parametrize('query',[{'data':'1,2'},{}])
+def test_predict_answers_invalid_requests_with_400(client,query):
+    """A row of the wrong length or a missing row is a structured 400."""
+    response = client.get('/predict',query_string=query)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+@pytest.mark.parametrize('body',[{'data':[['1']]},{'rows':[]},[1,2]])
+def test_batch_answers_invalid_requests_with_400(client,body):
+    """A malformed batch body is a structured 400."""
+    response = client.post('/predict/batch',json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
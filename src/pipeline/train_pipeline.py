@@ -0,0 +1,245 @@
+"""
+This module runs the training pipeline: data ingestion, data transformation and model training.
+
+Each stage is keyed by a hash of its inputs and configuration in the content-addressed \
+    stage cache, so a rerun with an unchanged source dataset skips ingestion and encoding, \
+        and a change to one model's parameter grid only searches that model again.
+
+A successful run publishes its model, encoder, schema and reports as a new immutable version \
+    of the model registry and, unless `MODEL_AUTO_PROMOTE=0`, makes it the served version.
+"""
+import os
+import sys
+import argparse
+import tempfile
+from dataclasses import asdict
+from src.exception import CustomException
+from src.logger import logging
+from src.components.data_ingestion import DataIngestion
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+from src.components.fold_encoding import FoldEncoding
+from src.components.model_registry import ModelRegistry
+from src.components.stage_cache import StageCache, hash_file, hash_key
+
+PIPELINE_CACHE_VERSION = 2
+
+def _read_file(path):
+    """Returns the content of a file as bytes."""
+    with open(path,'rb') as f:
+        return f.read()
+
+def _write_file_atomically(path,content):
+    """
+    Replaces a file with the given bytes without exposing a partially written file.
+
+    Args:
+        path (str): The file to write.
+        content (bytes): The new content.
+    """
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    fd,tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),suffix='.tmp')
+    with os.fdopen(fd,'wb') as f:
+        f.write(content)
+    os.replace(tmp_path,path)
+
+class TrainPipeline():
+    """
+    Runs the training stages, reusing cached stage results whose inputs did not change.
+
+    Attributes:
+        stage_cache (StageCache): The content-addressed cache of stage results.
+        data_ingestion (DataIngestion): The ingestion stage.
+        data_transformation (DataTransformation): The transformation stage.
+        model_trainer (ModelTrainer): The training stage.
+        model_registry (ModelRegistry): The registry the trained models are published to.
+    """
+    def __init__(self,stage_cache=None,model_registry=None):
+        self.stage_cache = stage_cache or StageCache()
+        self.data_ingestion = DataIngestion()
+        self.data_transformation = DataTransformation()
+        self.model_trainer = ModelTrainer(stage_cache=self.stage_cache)
+        self.model_registry = model_registry or ModelRegistry()
+
+    def run_ingestion(self):
+        """
+        Runs the ingestion stage unless the source dataset and its configuration are unchanged \
+            and the split artifacts they produced are still on disk.
+
+        Returns:
+            tuple: Paths to the training and testing datasets.
+        """
+        config = self.data_ingestion.data_ingestion_config
+        key = hash_key(PIPELINE_CACHE_VERSION,'ingestion',hash_file(config.source_path),
+                       asdict(config))
+
+        def compute():
+            train_path,test_path = self.data_ingestion.initiate_data_ingestion()
+            return {
+                'train_path':train_path,
+                'test_path':test_path,
+                'hashes':{path:hash_file(path) for path in (train_path,test_path)}
+            }
+
+        def validate(value):
+            return all(os.path.exists(path) and hash_file(path) == digest
+                       for path,digest in value['hashes'].items())
+
+        value = self.stage_cache.get_or_compute('ingestion',key,compute,validate)
+        return value['train_path'],value['test_path']
+
+    def run_transformation(self,train_path,test_path):
+        """
+        Runs the transformation stage unless the train and test splits or the transformation \
+            settings (feature type, matrix directories and number of encoding folds) changed.
+
+        The fitted encoder and its statistics are cached with the feature matrices and written \
+            back to the model directory on a hit, so the saved encoder always matches the \
+                matrices. The matrices and the out-of-fold encoding are memory-mapped from their \
+                    own directories and only reused while those files are unchanged.
+
+        Args:
+            train_path (str): The file path to the training dataset.
+            test_path (str): The file path to the testing dataset.
+
+        Returns:
+            tuple: The transformed training and testing feature matrices and the out-of-fold \
+                encoding of the training rows.
+        """
+        config = self.data_transformation.data_transformation_config
+        saved_files = (config.categorical_encoder_obj_file_path,
+                       config.target_encoding_stats_obj_file_path,
+                       config.encoding_table_obj_file_path,
+                       config.feature_schema_file_path)
+        settings = {'feature_dtype':config.feature_dtype,
+                    'train_matrix_path':config.train_matrix_path,
+                    'test_matrix_path':config.test_matrix_path,
+                    'fold_encoding_path':config.fold_encoding_path,
+                    'fold_encoding_n_splits':config.fold_encoding_n_splits}
+        key = hash_key(PIPELINE_CACHE_VERSION,'transformation',hash_file(train_path),
+                       hash_file(test_path),saved_files,settings)
+
+        def compute():
+            train_matrix,test_matrix,_ = self.data_transformation.initiate_data_transformation(
+                train_path=train_path,test_path=test_path)
+            fold_encoding = FoldEncoding.load(config.fold_encoding_path)
+            files = {path:_read_file(path) for path in saved_files}
+            hashes = {artifact.path:hash_file(artifact.path)
+                      for artifact in (train_matrix,test_matrix,fold_encoding)}
+            return {'train_matrix':train_matrix,'test_matrix':test_matrix,
+                    'fold_encoding':fold_encoding,'files':files,'hashes':hashes}
+
+        def validate(value):
+            return all(os.path.exists(path) and hash_file(path) == digest
+                       for path,digest in value['hashes'].items())
+
+        value = self.stage_cache.get_or_compute('transformation',key,compute,validate)
+        for path,content in value['files'].items():
+            if not os.path.exists(path) or _read_file(path) != content:
+                _write_file_atomically(path,content)
+        return value['train_matrix'],value['test_matrix'],value['fold_encoding']
+
+    def publish_model(self,result,source):
+        """
+        Publishes the artifacts of a training run as a new registry version, and promotes it \
+            when `auto_promote` is on. The incremental training report is only published with \
+                the version of the incremental run that wrote it.
+
+        Args:
+            result (tuple): The R2 score and the name of the trained model.
+            source (str): 'training' or 'incremental'.
+
+        Returns:
+            str: The published version.
+        """
+        transformation_config = self.data_transformation.data_transformation_config
+        trainer_config = self.model_trainer.model_trainer_config
+        files = [trainer_config.model_path,trainer_config.compiled_model_path,
+                 trainer_config.compiled_model_report_path,
+                 transformation_config.categorical_encoder_obj_file_path,
+                 transformation_config.target_encoding_stats_obj_file_path,
+                 transformation_config.encoding_table_obj_file_path,
+                 transformation_config.feature_schema_file_path,
+                 trainer_config.train_model_report_score_path,
+                 trainer_config.train_model_report_mae_path,
+                 trainer_config.train_model_report_mse_path,
+                 trainer_config.test_model_report_score_path,
+                 trainer_config.test_model_report_mae_path,
+                 trainer_config.test_model_report_mse_path,
+                 trainer_config.training_time_report_path,
+                 trainer_config.model_selection_report_path]
+        if source == 'incremental':
+            files.append(trainer_config.incremental_training_report_path)
+        r2_square,model_name = result
+        version = self.model_registry.publish(files,metrics={'model':model_name,
+                                                             'test_r2':r2_square},
+                                              source=source)
+        if self.model_registry.model_registry_config.auto_promote:
+            self.model_registry.promote(version)
+        return version
+
+    def run(self):
+        """
+        Runs the full training pipeline and publishes the trained model.
+
+        Returns:
+            tuple: The R2 score and the name of the best model.
+
+        Raises:
+            CustomException: If any stage fails.
+        """
+        try:
+            train_path,test_path = self.run_ingestion()
+            train_matrix,test_matrix,fold_encoding = self.run_transformation(train_path,test_path)
+            result = self.model_trainer.initiate_model_trainer(train_matrix=train_matrix,
+                                                               test_matrix=test_matrix,
+                                                               fold_encoding=fold_encoding)
+            self.publish_model(result,source='training')
+            return result
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+    def run_incremental(self,new_data_path):
+        """
+        Folds a delta of new rows into the splits, the encoder and the best model, and \
+            publishes the updated model.
+
+        Args:
+            new_data_path (str): Path of a CSV file holding only the new rows.
+
+        Returns:
+            tuple: The R2 score and the type name of the updated model.
+
+        Raises:
+            CustomException: If any stage fails.
+        """
+        try:
+            ingestion_config = self.data_ingestion.data_ingestion_config
+            train_delta,_ = self.data_ingestion.initiate_incremental_ingestion(
+                new_data_path=new_data_path)
+            train_delta_matrix,test_matrix,_ = \
+                self.data_transformation.initiate_incremental_transformation(
+                    train_delta_path=train_delta,test_path=ingestion_config.test_path,
+                    train_path=ingestion_config.train_path)
+            result = self.model_trainer.initiate_incremental_training(
+                train_delta_matrix=train_delta_matrix,test_matrix=test_matrix)
+            self.publish_model(result,source='incremental')
+            return result
+        except Exception as e:
+            raise CustomException(e,sys) from e
+
+def main():
+    """Command-line entry point of the training pipeline."""
+    parser = argparse.ArgumentParser(description='Run the training pipeline.')
+    parser.add_argument('--incremental',metavar='NEW_DATA_CSV',
+                        help='Only ingest the new rows of this CSV and warm-start the model.')
+    args = parser.parse_args()
+    pipeline = TrainPipeline()
+    if args.incremental:
+        result = pipeline.run_incremental(new_data_path=args.incremental)
+    else:
+        result = pipeline.run()
+    logging.info(f"Training pipeline finished: {result}.")
+
+if __name__ == '__main__':
+    main()
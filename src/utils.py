@@ -4,17 +4,20 @@ It includes functions to save machine learning models, evaluate their \
     performance using various metrics, and save the evaluation results in JSON format.\
           The module also handles exceptions by raising custom exceptions with \
             detailed error messages.
+It also reads and writes the tabular artifacts handed between the pipeline stages \
+    (Parquet, Feather or CSV, chosen by file extension).
 """
 import os
 import sys
 import json
+import time
+import glob
+import shutil
 import dill
-from sklearn.metrics import r2_score
-from sklearn.metrics import mean_absolute_error
-from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import GridSearchCV
+import pandas as pd
 from src.exception import CustomException
 from src.logger import logging
+from src.components.feature_schema import CATEGORICAL_COLUMNS
 
 def save_object(filepath,obj):
     """
@@ -35,11 +38,242 @@ def save_object(filepath,obj):
     except Exception as e:
         raise CustomException(e,sys) from e
 
-def evaluate_models(x_train,y_train,x_test,y_test,models,params): # pylint: disable=R0913,R0917,R0914
+def load_object(filepath):
     """
-    Evaluates multiple machine learning models using Grid Search for hyperparameter tuning, 
+    Loads a Python object saved with `save_object`.
+
+    Args:
+        filepath (str): The path of the saved object.
+
+    Returns:
+        The deserialized object.
+
+    Raises:
+        CustomException: If the file cannot be read or deserialized.
+    """
+    try:
+        with open(filepath,'rb') as fileobj:
+            return dill.load(fileobj)
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def _frame_format(path):
+    """
+    Returns the storage format of a tabular artifact from its extension.
+
+    Args:
+        path (str): The artifact path.
+
+    Returns:
+        str: One of 'parquet', 'feather' or 'csv'.
+
+    Raises:
+        ValueError: If the extension is not a supported format.
+    """
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension not in ('parquet','feather','csv'):
+        raise ValueError(f"Unsupported artifact format {extension!r} for {path}.")
+    return extension
+
+def _categorical(values):
+    """Casts a column to a categorical of strings, keeping its missing values."""
+    return values.astype(object).where(values.isna(),values.astype(str)).astype('category')
+
+def with_explicit_dtypes(df):
+    """
+    Casts a frame to the dtypes used for the stored artifacts.
+
+    The columns of `CATEGORICAL_COLUMNS` become dictionary-encoded categoricals of strings \
+        and all other columns float64, whatever a given frame holds (an empty categorical \
+            column, a code that looks like a number), so every stage and every part of an \
+                artifact has the same types.
+
+    Args:
+        df (pd.DataFrame): The frame to cast.
+
+    Returns:
+        pd.DataFrame: The cast frame.
+    """
+    df = df.astype({column:'float64' for column in df.columns
+                    if column not in CATEGORICAL_COLUMNS})
+    return df.assign(**{column:_categorical(df[column]) for column in df.columns
+                        if column in CATEGORICAL_COLUMNS})
+
+def _parquet_table(df):
+    """
+    Converts a frame cast by `with_explicit_dtypes` to the Arrow table of a Parquet part.
+
+    The categorical columns are stored as dictionaries of strings with 32-bit indices: \
+        pandas picks the smallest code type that fits the categories of each frame, and \
+            parts written with different types cannot be read back as one dataset.
+
+    Args:
+        df (pd.DataFrame): The cast frame.
+
+    Returns:
+        pyarrow.Table: The table to write.
+    """
+    import pyarrow as pa # pylint: disable=C0415
+    table = pa.Table.from_pandas(df,preserve_index=False)
+    schema = pa.schema([field.with_type(pa.dictionary(pa.int32(),pa.string()))
+                        if pa.types.is_dictionary(field.type) else field
+                        for field in table.schema],metadata=table.schema.metadata)
+    return table.cast(schema)
+
+def check_append(filepath,df):
+    """
+    Checks that rows can be appended to a tabular artifact without changing its schema.
+
+    Args:
+        filepath (str): The artifact path ending in .parquet, .feather or .csv.
+        df (pd.DataFrame): The rows to append.
+
+    Raises:
+        ValueError: If the columns, or for Parquet the stored types, differ from those of \
+            the artifact.
+    """
+    if not os.path.exists(filepath):
+        return
+    columns = load_frame_columns(filepath)
+    if list(df.columns) != columns:
+        raise ValueError(f"Cannot append to {filepath}: the columns {list(df.columns)} "
+                         f"differ from the stored columns {columns}.")
+    if _frame_format(filepath) != 'parquet':
+        return
+    import pyarrow.parquet as pq # pylint: disable=C0415
+    stored = pq.read_schema(sorted(glob.glob(os.path.join(filepath,'part-*.parquet')))[0])
+    new = _parquet_table(with_explicit_dtypes(df)).schema
+    changed = [f"{field.name} ({stored.field(field.name).type} -> {field.type})"
+               for field in new if not field.type.equals(stored.field(field.name).type)]
+    if changed:
+        raise ValueError(f"Cannot append to {filepath}: the types of {changed} differ from "
+                         "the stored parts.")
+
+def save_frame(filepath,df):
+    """
+    Saves a DataFrame as a tabular artifact in the format given by the file extension.
+
+    A Parquet artifact is a directory of part files, so that rows can later be appended \
+        by `append_frame` without rewriting the existing parts.
+
+    Args:
+        filepath (str): The artifact path ending in .parquet, .feather or .csv.
+        df (pd.DataFrame): The frame to save.
+
+    Raises:
+        CustomException: If there is an error while writing the artifact.
+    """
+    try:
+        frame_format = _frame_format(filepath)
+        dir_path = os.path.dirname(filepath)
+        if dir_path:
+            os.makedirs(dir_path,exist_ok=True)
+        if frame_format == 'csv':
+            df.to_csv(filepath,index=False,header=True)
+            return
+        df = with_explicit_dtypes(df).reset_index(drop=True)
+        if frame_format == 'feather':
+            df.to_feather(filepath)
+            return
+        if os.path.isdir(filepath):
+            shutil.rmtree(filepath)
+        os.makedirs(filepath)
+        import pyarrow.parquet as pq # pylint: disable=C0415
+        pq.write_table(_parquet_table(df),os.path.join(filepath,'part-00000.parquet'))
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def append_frame(filepath,df):
+    """
+    Appends rows to a tabular artifact, creating it if it does not exist yet.
+
+    CSV and Parquet artifacts only write the new rows; a Feather file has to be rewritten. \
+        Rows whose columns or stored types differ from the artifact's are rejected.
+
+    Args:
+        filepath (str): The artifact path ending in .parquet, .feather or .csv.
+        df (pd.DataFrame): The rows to append, with the columns of the artifact.
+
+    Raises:
+        CustomException: If the rows do not match the artifact or cannot be written.
+    """
+    try:
+        if not os.path.exists(filepath):
+            save_frame(filepath,df)
+            return
+        check_append(filepath,df)
+        frame_format = _frame_format(filepath)
+        if frame_format == 'csv':
+            df.to_csv(filepath,mode='a',index=False,header=False)
+        elif frame_format == 'feather':
+            save_frame(filepath,pd.concat([load_frame(filepath),df],ignore_index=True))
+        else:
+            import pyarrow.parquet as pq # pylint: disable=C0415
+            part = len(glob.glob(os.path.join(filepath,'part-*.parquet')))
+            pq.write_table(_parquet_table(with_explicit_dtypes(df).reset_index(drop=True)),
+                           os.path.join(filepath,f'part-{part:05d}.parquet'))
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def load_frame(filepath,columns=None):
+    """
+    Loads a tabular artifact saved with `save_frame`, optionally reading only some columns.
+
+    Args:
+        filepath (str): The artifact path ending in .parquet, .feather or .csv.
+        columns (list): The columns to read, or None to read them all.
+
+    Returns:
+        pd.DataFrame: The loaded frame.
+
+    Raises:
+        CustomException: If there is an error while reading the artifact.
+    """
+    try:
+        frame_format = _frame_format(filepath)
+        if frame_format == 'csv':
+            return pd.read_csv(filepath,usecols=columns)
+        if frame_format == 'feather':
+            return pd.read_feather(filepath,columns=columns)
+        return pd.read_parquet(filepath,columns=columns)
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def load_frame_columns(filepath):
+    """
+    Returns the column names of a tabular artifact without reading its rows.
+
+    Args:
+        filepath (str): The artifact path ending in .parquet, .feather or .csv.
+
+    Returns:
+        list: The column names, in stored order.
+
+    Raises:
+        CustomException: If there is an error while reading the artifact.
+    """
+    try:
+        frame_format = _frame_format(filepath)
+        if frame_format == 'csv':
+            return list(pd.read_csv(filepath,nrows=0).columns)
+        import pyarrow.parquet as pq # pylint: disable=C0415
+        if frame_format == 'feather':
+            from pyarrow import feather # pylint: disable=C0415
+            return list(feather.read_table(filepath,memory_map=True).schema.names)
+        part = sorted(glob.glob(os.path.join(filepath,'part-*.parquet')))[0]
+        return [name for name in pq.read_schema(part).names if not name.startswith('__')]
+    except Exception as e:
+        raise CustomException(e,sys) from e
+
+def evaluate_models(x_train,y_train,x_test,y_test,models,params,search_config=None,stage_cache=None,fold_encoding=None): # pylint: disable=R0913,R0917,R0914,C0301
+    """
+    Evaluates multiple machine learning models using the hyperparameter search engine, 
     and computes various performance metrics for both training and testing datasets.
 
+    Every estimator is fit exactly once per configuration: the search engine already refits \
+        the best candidate on the whole training set, and that estimator is the one that is \
+            evaluated and returned. Predictions are computed once and reused for all metrics.
+
     Args:
         x_train (np.ndarray): The feature set for the training data.
         y_train (np.ndarray): The target values for the training data.
@@ -47,14 +281,23 @@ def evaluate_models(x_train,y_train,x_test,y_test,models,params): # pylint: disa
         y_test (np.ndarray): The target values for the testing data.
         models (dict): A dictionary of models to evaluate.
         params (dict): A dictionary of hyperparameter grids for the respective models.
+        search_config (HyperparameterSearchConfig): Strategy, parallelism and budget of the \
+            hyperparameter search. Defaults to an exhaustive grid search on all cores.
+        stage_cache (StageCache): Optional cache of per-model search results, so that only \
+            models whose data, grid or settings changed are searched again.
+        fold_encoding (FoldEncoding): Optional out-of-fold target-encoded matrices of the \
+            training rows, on which the candidates are cross-validated without leakage.
 
     Returns:
-        tuple: A tuple containing training and testing performance metrics (MAE, MSE, R2 scores).
+        tuple: A tuple containing training and testing performance metrics (MAE, MSE, R2 scores), \
+            the fitted best estimator of every model and a report of the wall time spent per \
+                model and per phase (search, refit, predict, metrics).
 
     Raises:
         CustomException: If an error occurs during model evaluation or fitting.
     """
     try:
+        started = time.perf_counter()
         train_report_score = {}
         train_report_mae = {}
         train_report_mse = {}
@@ -63,21 +306,29 @@ def evaluate_models(x_train,y_train,x_test,y_test,models,params): # pylint: disa
         test_report_mae = {}
         test_report_mse = {}
 
+        fitted_models = {}
+        timing_report = {}
+
+        from sklearn.metrics import r2_score,mean_absolute_error,mean_squared_error # pylint: disable=C0415
+        from src.components.hyperparameter_search import run_model_searches # pylint: disable=C0415
+        logging.info(f"Hyperparameter search initiated for {list(models)}.")
+        search_results = run_model_searches(
+            models=models,params=params,x=x_train,y=y_train,config=search_config,
+            cache=stage_cache,fold_encoding=fold_encoding)
+
+        search_wall_time = time.perf_counter() - started
+
         for i in range(len(list(models))):
-            model = list(models.values())[i]
-            logging.info(f"Evaluation initiated for {model}.")
-            para = params[list(models.keys())[i]]
-            gs = GridSearchCV(model,para,cv=3)
-            logging.info(f"GridSearchCV initiated for {model}.")
-            gs.fit(x_train,y_train)
-            logging.info(f"GridSearchCV fit done and set_params initiated for {model}.")
-            model.set_params(**gs.best_params_)
-            logging.info(f"setting parameters completed and fitting initiated for {model}.")
-            model.fit(x_train,y_train)
+            search_result = search_results[list(models.keys())[i]]
+            model = search_result.best_estimator
+            fitted_models[list(models.keys())[i]] = model
             logging.info(f"prediction initiated for {model}.")
+            phase_started = time.perf_counter()
             y_train_pred = model.predict(x_train)
             y_test_pred = model.predict(x_test)
+            predict_time = time.perf_counter() - phase_started
             logging.info(f"Getting the r2score for train and test data for {model}")
+            phase_started = time.perf_counter()
 
             train_model_mae = mean_absolute_error(y_train,y_train_pred)
             test_model_mae = mean_absolute_error(y_test,y_test_pred)
@@ -87,6 +338,7 @@ def evaluate_models(x_train,y_train,x_test,y_test,models,params): # pylint: disa
 
             train_model_score = r2_score(y_train,y_train_pred)
             test_model_score = r2_score(y_test,y_test_pred)
+            metrics_time = time.perf_counter() - phase_started
 
             train_report_score[list(models.keys())[i]] = train_model_score
             train_report_mae[list(models.keys())[i]] = train_model_mae
@@ -96,10 +348,27 @@ def evaluate_models(x_train,y_train,x_test,y_test,models,params): # pylint: disa
             test_report_mae[list(models.keys())[i]] = test_model_mae
             test_report_mse[list(models.keys())[i]] = test_model_mse
 
+            timing_report[list(models.keys())[i]] = {
+                'search':search_result.search_s,
+                'refit':search_result.refit_s,
+                'predict':predict_time,
+                'metrics':metrics_time,
+                'total':(search_result.search_s + search_result.refit_s
+                         + predict_time + metrics_time),
+                'candidates':search_result.n_candidates,
+                'stopped_reason':search_result.stopped_reason
+            }
+
             logging.info(f"Obtained r2score of {test_model_score} and completed with {model}.")
+        timing_report = {
+            'wall_time':time.perf_counter() - started,
+            'search_wall_time':search_wall_time,
+            'models':timing_report
+        }
         return (
             train_report_mae,train_report_mse,train_report_score,
-            test_report_mae,test_report_mse,test_report_score
+            test_report_mae,test_report_mse,test_report_score,
+            fitted_models,timing_report
         )
     except Exception as e:
         raise CustomException(e,sys) from e